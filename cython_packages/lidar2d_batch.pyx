@@ -0,0 +1,254 @@
+# distutils: language=c++
+# cython: boundscheck=False, wraparound=False, cdivision=True
+
+cimport cython
+from cython.parallel cimport prange
+from libc.math cimport cosf, sinf
+from libc.float cimport FLT_MIN
+from libc.stdlib cimport malloc, free
+
+
+def cast_rays_batch(
+    float[:, ::1] poses,
+    double[::1] angles,
+    float[:, ::1] boxes,
+    float max_range,
+    float[:, ::1] out,
+):
+    """
+    Casts the LiDAR rays of a batch of robots against axis-aligned boxes,
+    robots are scanned in parallel with OpenMP threads.
+
+    poses: ndarray (n_robots, 3)   [x, y, theta] of each robot
+    angles: ndarray (n_angles,)   rays angles relative to the robot heading
+    boxes: ndarray (n_boxes, 4)   [xmin, ymin, xmax, ymax] of each obstacle
+    max_range: range of rays hitting no obstacle
+    out: ndarray (n_robots, n_angles)   float32 ranges, overwritten
+    """
+    cdef Py_ssize_t n_robots = poses.shape[0]
+    cdef Py_ssize_t n_angles = angles.shape[0]
+    cdef Py_ssize_t n_boxes = boxes.shape[0]
+    if poses.shape[1] != 3 or boxes.shape[1] != 4:
+        raise ValueError("Poses must have 3 columns and boxes 4 columns")
+    if out.shape[0] != n_robots or out.shape[1] != n_angles:
+        raise ValueError(
+            f"Output must have shape ({n_robots}, {n_angles}), "
+            f"got ({out.shape[0]}, {out.shape[1]})"
+        )
+    cdef Py_ssize_t robot_idx
+    with nogil:
+        for robot_idx in prange(n_robots, schedule="static"):
+            _scan_robot(poses, angles, boxes, max_range, out, robot_idx)
+
+
+cdef void _scan_robot(
+    float[:, ::1] poses,
+    double[::1] angles,
+    float[:, ::1] boxes,
+    float max_range,
+    float[:, ::1] out,
+    Py_ssize_t robot_idx,
+) noexcept nogil:
+    """Scans the rays of one robot against the boxes in its range"""
+    cdef Py_ssize_t n_angles = angles.shape[0]
+    cdef Py_ssize_t angle_idx, n_in_range
+    # Boxes farther than the max range are skipped for all the rays
+    cdef Py_ssize_t *in_range = <Py_ssize_t *> malloc(
+        (boxes.shape[0] + 1) * sizeof(Py_ssize_t)
+    )
+    if in_range == NULL:
+        for angle_idx in range(n_angles):
+            out[robot_idx, angle_idx] = max_range
+        return
+    n_in_range = _cull_boxes(poses, boxes, max_range, robot_idx, in_range)
+    for angle_idx in range(n_angles):
+        out[robot_idx, angle_idx] = _cast_ray(
+            poses, angles[angle_idx], boxes, max_range, robot_idx, in_range, n_in_range
+        )
+    free(in_range)
+
+
+ctypedef fused ring_t:
+    unsigned char
+    float
+
+
+def cast_rings_batch(
+    float[:, ::1] poses,
+    double[::1] angles,
+    const Py_ssize_t[::1] sector_starts,
+    float[:, ::1] boxes,
+    float max_range,
+    const float[::1] range_level_mins,
+    const float[::1] range_level_maxs,
+    ring_t[:, :, ::1] rings,
+    float cell_scale=1.0,
+):
+    """
+    Rasterizes the rings of a batch of robots straight from the obstacle
+    boxes, robots are handled in parallel with OpenMP threads. Each ray is
+    binned as soon as it is cast, with the semantics of
+    lidar2d_fast.fast_lidar_to_rings for a scan of the same rays.
+
+    poses: ndarray (n_robots, 3)   [x, y, theta] of each robot
+    angles: ndarray (n_angles,)   rays angles relative to the robot heading
+    sector_starts: ndarray (angle_levels + 1,)   rays of the angle level j
+                   are angles[sector_starts[j]:sector_starts[j + 1]]
+    boxes: ndarray (n_boxes, 4)   [xmin, ymin, xmax, ymax] of each obstacle
+    max_range: range of rays hitting no obstacle
+    range_level_mins, range_level_maxs: ndarray (range_levels,)   ascending
+    rings: ndarray (n_robots, angle_levels, range_levels), overwritten
+    cell_scale: value of one unit of the cells (0: free, 1: unseen, 2: hit)
+    """
+    cdef Py_ssize_t n_robots = poses.shape[0]
+    if poses.shape[1] != 3 or boxes.shape[1] != 4:
+        raise ValueError("Poses must have 3 columns and boxes 4 columns")
+    if (
+        rings.shape[0] != n_robots
+        or rings.shape[1] != sector_starts.shape[0] - 1
+        or rings.shape[2] != range_level_mins.shape[0]
+        or rings.shape[2] != range_level_maxs.shape[0]
+    ):
+        raise ValueError(
+            f"Rings must have shape ({n_robots}, {sector_starts.shape[0] - 1}, "
+            f"{range_level_mins.shape[0]})"
+        )
+    if sector_starts[0] < 0 or sector_starts[sector_starts.shape[0] - 1] > angles.shape[0]:
+        raise ValueError("Sectors must index the angles")
+    cdef Py_ssize_t robot_idx
+    with nogil:
+        for robot_idx in prange(n_robots, schedule="static"):
+            _rasterize_robot(
+                poses,
+                angles,
+                sector_starts,
+                boxes,
+                max_range,
+                range_level_mins,
+                range_level_maxs,
+                rings,
+                cell_scale,
+                robot_idx,
+            )
+
+
+cdef void _rasterize_robot(
+    float[:, ::1] poses,
+    double[::1] angles,
+    const Py_ssize_t[::1] sector_starts,
+    float[:, ::1] boxes,
+    float max_range,
+    const float[::1] range_level_mins,
+    const float[::1] range_level_maxs,
+    ring_t[:, :, ::1] rings,
+    float cell_scale,
+    Py_ssize_t robot_idx,
+) noexcept nogil:
+    """Fills the rings of one robot, sector by sector"""
+    cdef Py_ssize_t angle_levels = rings.shape[1]
+    cdef Py_ssize_t range_levels = rings.shape[2]
+    cdef ring_t unseen = <ring_t>(1 * cell_scale)
+    cdef ring_t hit = <ring_t>(2 * cell_scale)
+    cdef Py_ssize_t sector_idx, range_idx, angle_idx, n_in_range
+    cdef Py_ssize_t low, high, middle, first_unseen
+    cdef float dist
+    cdef Py_ssize_t *in_range = <Py_ssize_t *> malloc(
+        (boxes.shape[0] + 1) * sizeof(Py_ssize_t)
+    )
+    # Without memory, every ray misses like in an empty map
+    n_in_range = 0
+    if in_range != NULL:
+        n_in_range = _cull_boxes(poses, boxes, max_range, robot_idx, in_range)
+    for sector_idx in range(angle_levels):
+        for range_idx in range(range_levels):
+            rings[robot_idx, sector_idx, range_idx] = 0
+        # levels from first_unseen on have at least one ray falling short
+        first_unseen = range_levels
+        for angle_idx in range(sector_starts[sector_idx], sector_starts[sector_idx + 1]):
+            dist = _cast_ray(
+                poses, angles[angle_idx], boxes, max_range, robot_idx, in_range, n_in_range
+            )
+            if dist == 0 or dist != dist:
+                continue
+            # number of levels whose min is <= dist
+            low = 0
+            high = range_levels
+            while low < high:
+                middle = (low + high) // 2
+                if range_level_mins[middle] <= dist:
+                    low = middle + 1
+                else:
+                    high = middle
+            first_unseen = min(first_unseen, low)
+            if low > 0 and dist < range_level_maxs[low - 1]:
+                rings[robot_idx, sector_idx, low - 1] = hit
+        for range_idx in range(first_unseen, range_levels):
+            if rings[robot_idx, sector_idx, range_idx] == 0:
+                rings[robot_idx, sector_idx, range_idx] = unseen
+    free(in_range)
+
+
+cdef Py_ssize_t _cull_boxes(
+    float[:, ::1] poses,
+    float[:, ::1] boxes,
+    float max_range,
+    Py_ssize_t robot_idx,
+    Py_ssize_t *in_range,
+) noexcept nogil:
+    """Writes the indices of the boxes in the range of a robot, returns their number"""
+    cdef float origin_x = poses[robot_idx, 0]
+    cdef float origin_y = poses[robot_idx, 1]
+    cdef float gap_x, gap_y
+    cdef Py_ssize_t box_idx, n_in_range = 0
+    for box_idx in range(boxes.shape[0]):
+        gap_x = max(boxes[box_idx, 0] - origin_x, origin_x - boxes[box_idx, 2], 0.0)
+        gap_y = max(boxes[box_idx, 1] - origin_y, origin_y - boxes[box_idx, 3], 0.0)
+        if gap_x * gap_x + gap_y * gap_y <= max_range * max_range:
+            in_range[n_in_range] = box_idx
+            n_in_range += 1
+    return n_in_range
+
+
+cdef inline float _cast_ray(
+    float[:, ::1] poses,
+    double angle,
+    float[:, ::1] boxes,
+    float max_range,
+    Py_ssize_t robot_idx,
+    Py_ssize_t *in_range,
+    Py_ssize_t n_in_range,
+) noexcept nogil:
+    """Range of one ray of a robot against the boxes in its range"""
+    cdef float origin_x = poses[robot_idx, 0]
+    cdef float origin_y = poses[robot_idx, 1]
+    cdef Py_ssize_t idx, box_idx
+    cdef float direction_x, direction_y, inv_x, inv_y
+    cdef float slab_1, slab_2, t_near, t_far, distance
+    cdef float best = max_range
+    # Rays are cast at float32 angles, like CMap2D
+    direction_x = cosf(<float> (angle + poses[robot_idx, 2]))
+    direction_y = sinf(<float> (angle + poses[robot_idx, 2]))
+    # Rays parallel to an axis get a tiny direction instead of a null one
+    if direction_x == 0.0:
+        direction_x = FLT_MIN
+    if direction_y == 0.0:
+        direction_y = FLT_MIN
+    inv_x = 1.0 / direction_x
+    inv_y = 1.0 / direction_y
+    for idx in range(n_in_range):
+        box_idx = in_range[idx]
+        slab_1 = (boxes[box_idx, 0] - origin_x) * inv_x
+        slab_2 = (boxes[box_idx, 2] - origin_x) * inv_x
+        t_near = min(slab_1, slab_2)
+        t_far = max(slab_1, slab_2)
+        slab_1 = (boxes[box_idx, 1] - origin_y) * inv_y
+        slab_2 = (boxes[box_idx, 3] - origin_y) * inv_y
+        t_near = max(t_near, min(slab_1, slab_2))
+        t_far = min(t_far, max(slab_1, slab_2))
+        if t_far < t_near or t_far < 0.0:
+            continue
+        # A ray starting inside a box stops on its boundary
+        distance = t_near if t_near >= 0.0 else t_far
+        if distance < best:
+            best = distance
+    return best
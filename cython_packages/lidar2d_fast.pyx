@@ -1,69 +1,124 @@
 # distutils: language=c++
+# cython: boundscheck=False, wraparound=False, cdivision=True
 
 import numpy as np
 cimport numpy as np
+from cython.parallel cimport prange
 from libc.math cimport ceil as cceil
 
 
 DTYPE = np.float32
 ctypedef np.float32_t DTYPE_t
 
-def fast_lidar_to_rings(scans, angle_levels, range_levels, range_level_mins, range_level_maxs):
-    rings = np.zeros(
-        (scans.shape[1], angle_levels, range_levels, 1), dtype=np.uint8
+ctypedef fused ring_t:
+    np.uint8_t
+    np.float32_t
+
+def fast_lidar_to_rings(
+    scans,
+    angle_levels,
+    range_levels,
+    range_level_mins,
+    range_level_maxs,
+    out=None,
+    cell_scale=1.0,
+):
+    """
+    scans: ndarray (n_scans, n_rays)   0-100 [m]
+    out: uint8 or float32 ndarray (n_scans, angle_levels, range_levels, 1),
+         allocated as uint8 if None, every cell is overwritten
+    cell_scale: value of one unit of the cells (0: free, 1: unseen, 2: hit)
+    """
+    if out is None:
+        out = np.empty(
+            (scans.shape[0], angle_levels, range_levels, 1), dtype=np.uint8
+        )
+    clidar_to_rings(
+        scans, angle_levels, range_levels, range_level_mins, range_level_maxs, out, cell_scale
     )
-    clidar_to_rings(scans, angle_levels, range_levels, range_level_mins, range_level_maxs, rings)
-    return rings
+    return out
 
-# cdef clidar_to_rings():
 def clidar_to_rings(
-    np.float32_t[:, ::1] scans,
+    const np.float32_t[:, ::1] scans,
     int angle_levels,
     int range_levels,
-    np.float32_t[::1] range_level_mins,
-    np.float32_t[::1] range_level_maxs,
-    np.uint8_t[:, :, :, ::1] rings,
+    const np.float32_t[::1] range_level_mins,
+    const np.float32_t[::1] range_level_maxs,
+    ring_t[:, :, :, ::1] rings,
+    float cell_scale=1.0,
 ):
     """
+    Scans are converted in parallel with OpenMP threads, each ray is binned
+    once with a binary search over the ascending range_level_mins.
+
     scans: ndarray (n_scans, n_rays)   0-100 [m]
     rings: ndarray (n_scans, angle_levels, range_levels, n_channels)
     """
-    cdef int n_scans = scans.shape[0]
+    cdef Py_ssize_t n_scans = scans.shape[0]
+    if (
+        rings.shape[0] != n_scans
+        or rings.shape[1] != angle_levels
+        or rings.shape[2] != range_levels
+        or range_level_mins.shape[0] != range_levels
+        or range_level_maxs.shape[0] != range_levels
+    ):
+        raise ValueError(
+            f"Rings must have shape ({n_scans}, {angle_levels}, {range_levels}, 1)"
+            f" and range levels {range_levels} values"
+        )
+    cdef Py_ssize_t scan_idx
+    with nogil:
+        for scan_idx in prange(n_scans, schedule="static"):
+            _scan_to_rings(
+                scans, range_level_mins, range_level_maxs, rings, cell_scale, scan_idx
+            )
+
+
+cdef void _scan_to_rings(
+    const np.float32_t[:, ::1] scans,
+    const np.float32_t[::1] range_level_mins,
+    const np.float32_t[::1] range_level_maxs,
+    ring_t[:, :, :, ::1] rings,
+    float cell_scale,
+    Py_ssize_t scan_idx,
+) noexcept nogil:
+    """Fills the rings of one scan, rays are read once in order"""
     cdef int n_rays = scans.shape[1]
+    cdef int angle_levels = rings.shape[1]
+    cdef int range_levels = rings.shape[2]
     cdef int CHANNEL = 0
     cdef np.float32_t downsample_factor = n_rays * 1.0 / angle_levels  # >= 1
-    # vars
-    cdef int ray_idx_start
-    cdef int ray_idx_end
-    cdef int angle_idx
-    cdef int range_idx
-    cdef int scan_idx
-    cdef int ray_idx
-    cdef np.float32_t r_min
-    cdef np.float32_t r_max
+    cdef ring_t unseen = <ring_t>(1 * cell_scale)
+    cdef ring_t hit = <ring_t>(2 * cell_scale)
+    cdef int ray_idx_start, ray_idx_end, angle_idx, range_idx, ray_idx
+    cdef int low, high, middle, first_unseen
     cdef np.float32_t dist
-    cdef int cell_value
     for angle_idx in range(angle_levels):
         # generate ray indices corresponding to current angle level
         ray_idx_start = int(cceil(angle_idx * downsample_factor))
         ray_idx_end = int(cceil((angle_idx + 1) * downsample_factor))
         for range_idx in range(range_levels):
-            r_min = range_level_mins[range_idx]
-            r_max = range_level_maxs[range_idx]
-            for scan_idx in range(n_scans):
-                # initialize value of cell at (angle_idx, range_idx)
-                cell_value = 0
-                # check if any relevant rays hit cell or fall short
-                for ray_idx in range(ray_idx_start, ray_idx_end):
-                    dist = scans[scan_idx, ray_idx]
-                    if dist == 0:
-                        continue
-                    # if a ray hits the cell the value is 2
-                    if r_min <= dist and dist < r_max:
-                        cell_value = 2
-                        break
-                    # if a ray falls short of the cell the value is at least 1
-                    if dist < r_min:
-                        cell_value = 1
-                        continue
-                rings[scan_idx, angle_idx, range_idx, CHANNEL] = cell_value
\ No newline at end of file
+            rings[scan_idx, angle_idx, range_idx, CHANNEL] = 0
+        # levels from first_unseen on have at least one ray falling short
+        first_unseen = range_levels
+        for ray_idx in range(ray_idx_start, ray_idx_end):
+            dist = scans[scan_idx, ray_idx]
+            if dist == 0 or dist != dist:
+                continue
+            # number of levels whose min is <= dist
+            low = 0
+            high = range_levels
+            while low < high:
+                middle = (low + high) // 2
+                if range_level_mins[middle] <= dist:
+                    low = middle + 1
+                else:
+                    high = middle
+            first_unseen = min(first_unseen, low)
+            # if a ray hits the cell the value is 2
+            if low > 0 and dist < range_level_maxs[low - 1]:
+                rings[scan_idx, angle_idx, low - 1, CHANNEL] = hit
+        # if a ray falls short of the cell the value is at least 1
+        for range_idx in range(first_unseen, range_levels):
+            if rings[scan_idx, angle_idx, range_idx, CHANNEL] == 0:
+                rings[scan_idx, angle_idx, range_idx, CHANNEL] = unseen
@@ -0,0 +1,156 @@
+"""Benchmark LiDAR backends against the CMap2D renderer
+
+Usage
+------------------
+    $ python scripts/benchmark_lidar.py [--n-robots 64] [--repeats 5]
+
+Obstacles are random rectangles inside the default 256x256 map, surrounded
+by the border obstacles of the robot environment, robots are placed outside
+the obstacles. For each map size, the time to scan all robots and the error
+against CMap2D are reported. The lookup table is built once per map with a
+resolution of LUT_RESOLUTION, its scans are interpolated.
+"""
+from typing import Callable, Dict, List
+import argparse
+import time
+import numpy as np
+from CMap2D import render_contours_in_lidar  # pylint: disable=no-name-in-module
+
+from highrl.lidar_setup.grid import OccupancyGrid, cast_rays_grid
+from highrl.lidar_setup.lookup import LidarLookupTable
+from highrl.lidar_setup.raycast import (
+    cast_rays_aabb,
+    cast_rays_openmp,
+    obstacles_to_boxes,
+)
+from highrl.obstacle.obstacles import ObstacleSet
+from highrl.obstacle.single_obstacle import SingleObstacle
+
+MAP_SIZE = 256
+N_ANGLES = 1080
+MAX_RANGE = 25.0
+LUT_RESOLUTION = 2.0
+N_OBSTACLES = [4, 20, 200]
+
+ScanFunction = Callable[[np.ndarray], np.ndarray]
+
+
+def make_obstacles(n_obstacles: int, rng: np.random.Generator) -> List[SingleObstacle]:
+    """Create random obstacles and the map borders"""
+    obstacles = [
+        SingleObstacle(
+            *rng.integers(0, MAP_SIZE - 10, size=2).tolist(),
+            *rng.integers(2, 20, size=2).tolist(),
+        )
+        for _ in range(n_obstacles)
+    ]
+    obstacles += [
+        SingleObstacle(-1, 0, 1, MAP_SIZE),
+        SingleObstacle(0, -1, MAP_SIZE, 1),
+        SingleObstacle(MAP_SIZE, 0, 1, MAP_SIZE),
+        SingleObstacle(0, MAP_SIZE, MAP_SIZE, 1),
+    ]
+    return obstacles
+
+
+def make_free_poses(
+    n_robots: int, obstacles: List[SingleObstacle], rng: np.random.Generator
+) -> np.ndarray:
+    """Create random robots poses outside the obstacles, like robots of the env"""
+    boxes = obstacles_to_boxes(obstacles)
+    poses = np.zeros((0, 3), dtype=np.float32)
+    while len(poses) < n_robots:
+        candidates = rng.uniform(
+            [0, 0, 0], [MAP_SIZE, MAP_SIZE, 2 * np.pi], size=(n_robots, 3)
+        ).astype(np.float32)
+        is_free = np.all(
+            (candidates[:, None, 0] < boxes[None, :, 0])
+            | (candidates[:, None, 0] > boxes[None, :, 2])
+            | (candidates[:, None, 1] < boxes[None, :, 1])
+            | (candidates[:, None, 1] > boxes[None, :, 3]),
+            axis=1,
+        )
+        poses = np.concatenate([poses, candidates[is_free]])
+    return poses[:n_robots]
+
+
+def make_backends(
+    obstacles: List[SingleObstacle],
+    angles: np.ndarray,
+) -> Dict[str, ScanFunction]:
+    """Create the scan functions of all backends for a map"""
+    flat_contours, _ = ObstacleSet(obstacles).get_flatten_contours()
+    boxes = obstacles_to_boxes(obstacles)
+    grid = OccupancyGrid(boxes)
+    table = LidarLookupTable.build(
+        boxes, MAP_SIZE, MAP_SIZE, LUT_RESOLUTION, len(angles), MAX_RANGE
+    )
+
+    def scan_cmap2d(poses: np.ndarray) -> np.ndarray:
+        scans = np.full((len(poses), len(angles)), MAX_RANGE, dtype=np.float32)
+        for scan, pose in zip(scans, poses):
+            render_contours_in_lidar(scan, angles + pose[2], flat_contours, pose[:2])
+        return scans
+
+    def scan_aabb(poses: np.ndarray) -> np.ndarray:
+        return cast_rays_aabb(poses, angles, boxes, MAX_RANGE)
+
+    def scan_grid(poses: np.ndarray) -> np.ndarray:
+        return cast_rays_grid(poses, angles, grid, MAX_RANGE)
+
+    def scan_openmp(poses: np.ndarray) -> np.ndarray:
+        return cast_rays_openmp(poses, angles, boxes, MAX_RANGE)
+
+    return {
+        "cmap2d": scan_cmap2d,
+        "aabb": scan_aabb,
+        "grid": scan_grid,
+        "openmp": scan_openmp,
+        "lut": lambda poses: table.scan(poses, angles),
+    }
+
+
+def time_scan(scan: ScanFunction, poses: np.ndarray, repeats: int) -> float:
+    """Best time, in seconds, to scan all poses"""
+    timings = []
+    for _ in range(repeats):
+        tic = time.perf_counter()
+        scan(poses)
+        timings.append(time.perf_counter() - tic)
+    return min(timings)
+
+
+def main() -> None:
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", maxsplit=1)[0])
+    parser.add_argument("--n-robots", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    angles = np.linspace(0, 2 * np.pi, N_ANGLES, endpoint=False)
+
+    print(f"{args.n_robots} robots, {N_ANGLES} rays")
+    print(
+        f"{'obstacles':>9} {'backend':>8} {'ms/scan':>9} {'speedup':>8}"
+        f" {'max err':>9} {'mean err':>9}"
+    )
+    for n_obstacles in N_OBSTACLES:
+        obstacles = make_obstacles(n_obstacles, rng)
+        poses = make_free_poses(args.n_robots, obstacles, rng)
+        backends = make_backends(obstacles, angles)
+        reference = backends["cmap2d"](poses)
+        reference_time = time_scan(backends["cmap2d"], poses, args.repeats)
+        for name, scan in backends.items():
+            elapsed = time_scan(scan, poses, args.repeats)
+            error = np.abs(scan(poses) - reference)
+            print(
+                f"{n_obstacles:>9} {name:>8} {1e3 * elapsed / args.n_robots:>9.4f}"
+                f" {reference_time / elapsed:>8.2f} {error.max():>9.2e}"
+                f" {error.mean():>9.2e}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark the rings lidar encoder
+
+Usage
+------------------
+    $ python scripts/benchmark_rings.py [--n-envs 1 64] [--steps 200]
+
+Random scans of the default lidar are encoded into 64x64 rings once per
+step, as the robot environments do in rings mode. The legacy encoder, which
+sized the rings by the number of rays and converted them to float64, is
+compared to the float32 and uint8 encoders writing into a reused buffer,
+and to the NumPy fallback used when the Cython extension is not built.
+Each encoder runs in a fresh process, so that the reported peak RSS increase
+only accounts for its own allocations.
+"""
+from typing import Callable, Dict, Tuple
+import argparse
+import multiprocessing
+import resource
+import time
+import numpy as np
+
+from highrl.envs.env_encoders import RingsLidarEncoder
+from highrl.lidar_setup.rings import RINGS_TO_BOOL, numpy_lidar_to_rings
+from lidar2d_fast import clidar_to_rings  # pylint: disable=no-name-in-module
+
+N_ANGLES = 1080
+MAX_RANGE = 25.0
+
+EncodeFunction = Callable[[np.ndarray], np.ndarray]
+
+
+def make_encoder(name: str, n_envs: int) -> EncodeFunction:
+    """Create the encode function of an encoder for batches of n_envs scans"""
+    if name == "legacy":
+        rings_def = RingsLidarEncoder().rings_def
+
+        def encode_legacy(scans: np.ndarray) -> np.ndarray:
+            rings = np.zeros((scans.shape[1], 64, 64, 1), dtype=np.uint8)
+            rings = rings[: len(scans)]
+            clidar_to_rings(
+                scans,
+                64,
+                64,
+                rings_def["range_level_mins"],
+                rings_def["range_level_maxs"],
+                rings,
+            )
+            return (rings.astype(float) / RINGS_TO_BOOL).reshape(len(scans), -1)
+
+        return encode_legacy
+
+    if name == "numpy":
+        rings_def = RingsLidarEncoder().rings_def
+        rings = np.empty((n_envs, 64, 64, 1), dtype=np.uint8)
+
+        def encode_numpy(scans: np.ndarray) -> np.ndarray:
+            return numpy_lidar_to_rings(
+                scans,
+                64,
+                64,
+                rings_def["range_level_mins"],
+                rings_def["range_level_maxs"],
+                rings,
+            ).reshape(len(scans), -1)
+
+        return encode_numpy
+
+    encoder = RingsLidarEncoder(name)
+    out = np.empty((n_envs, encoder.ring_dim), dtype=encoder.lidar_dtype)
+    return lambda scans: encoder.encode_obs({"lidar": scans}, out=out)["lidar"]
+
+
+def run_encoder(name: str, n_envs: int, steps: int) -> Tuple[float, float]:
+    """Encode random scans, returns the ms per step and the peak RSS increase in MiB"""
+    rng = np.random.default_rng(0)
+    scans = MAX_RANGE * rng.random((steps, n_envs, N_ANGLES), dtype=np.float32)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    encode = make_encoder(name, n_envs)
+    tic = time.perf_counter()
+    for step_scans in scans:
+        encode(step_scans)
+    elapsed = time.perf_counter() - tic
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return 1e3 * elapsed / steps, (rss_after - rss_before) / 1024
+
+
+def main() -> None:
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", maxsplit=1)[0])
+    parser.add_argument("--n-envs", type=int, nargs="+", default=[1, 64])
+    parser.add_argument("--steps", type=int, default=200)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{N_ANGLES} rays, {args.steps} steps")
+    print(f"{'envs':>5} {'encoder':>8} {'ms/step':>9} {'speedup':>8} {'peak MiB':>9}")
+    for n_envs in args.n_envs:
+        results: Dict[str, Tuple[float, float]] = {}
+        for name in ["legacy", "float32", "uint8", "numpy"]:
+            with context.Pool(1) as pool:
+                results[name] = pool.apply(run_encoder, (name, n_envs, args.steps))
+            elapsed, peak_rss = results[name]
+            print(
+                f"{n_envs:>5} {name:>8} {elapsed:>9.3f}"
+                f" {results['legacy'][0] / elapsed:>8.2f} {peak_rss:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
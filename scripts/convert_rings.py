@@ -0,0 +1,101 @@
+"""Convert recorded lidar scans to rings and back
+
+Usage
+------------------
+    $ python scripts/convert_rings.py scans.npy rings.npy [--decoded decoded.npy]
+        [--chunk-size 4096] [--dtype uint8] [--max-range 25.0]
+
+The scans are a .npy array of shape (n_scans, n_rays) with ranges in meters,
+such as the lidar observations of a recorded rollout. They are memory mapped
+and encoded into 64x64 rings chunk by chunk, the rings are written to a .npy
+array of shape (n_scans, 1, 64, 64) with the given dtype, as returned by the
+rings encoder of the robot environments. The rings are then decoded back to
+scans, which are optionally saved, and the encoding loss is reported on the
+rays shorter than the max range.
+"""
+from typing import Optional
+import argparse
+import time
+import numpy as np
+
+from highrl.envs.env_encoders import RingsLidarEncoder
+from highrl.envs.observation_pipeline import RINGS_DTYPES
+
+
+def convert(
+    scans_path: str,
+    rings_path: str,
+    decoded_path: Optional[str],
+    chunk_size: int,
+    dtype: str,
+    max_range: float,
+) -> None:
+    """Encode the scans of scans_path into rings_path and report the encoding loss"""
+    scans = np.load(scans_path, mmap_mode="r")
+    n_scans, n_rays = scans.shape
+    encoder = RingsLidarEncoder(dtype, max_range, n_rays)
+    rings_to_lidar = encoder.rings_def["rings_to_lidar"]
+    rings = np.lib.format.open_memmap(
+        rings_path,
+        mode="w+",
+        dtype=encoder.lidar_dtype,
+        shape=(n_scans,) + encoder.rings_shape,
+    )
+    decoded = None
+    if decoded_path:
+        decoded = np.lib.format.open_memmap(
+            decoded_path, mode="w+", dtype=np.float32, shape=(n_scans, n_rays)
+        )
+    decoded_chunk = np.empty((chunk_size, n_rays), dtype=np.float32)
+    errors = []
+    tic = time.perf_counter()
+    for start in range(0, n_scans, chunk_size):
+        stop = min(start + chunk_size, n_scans)
+        chunk = np.asarray(scans[start:stop], dtype=np.float32)
+        encoder.encode_obs({"lidar": chunk}, out=rings[start:stop])
+        chunk_decoded = rings_to_lidar(
+            rings[start:stop], n_rays, decoded_chunk[: stop - start]
+        )
+        if decoded is not None:
+            decoded[start:stop] = chunk_decoded
+        in_range = (chunk > 0) & (chunk < max_range)
+        errors.append(np.abs(chunk - chunk_decoded)[in_range])
+    rings.flush()
+    if decoded is not None:
+        decoded.flush()
+    elapsed = time.perf_counter() - tic
+
+    error = np.concatenate(errors)
+    size_mib = (scans.nbytes + rings.nbytes) / 2**20
+    print(f"{n_scans} scans of {n_rays} rays in {elapsed:.2f} s ({size_mib / elapsed:.0f} MiB/s)")
+    if len(error) == 0:
+        print("No ray shorter than the max range")
+        return
+    print(
+        f"Decoding error [m] on {len(error)} rays: mean {error.mean():.3f}, "
+        f"p99 {np.percentile(error, 99):.3f}, max {error.max():.3f}"
+    )
+
+
+def main() -> None:
+    """Run the conversion"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", maxsplit=1)[0])
+    parser.add_argument("scans", help="input .npy scans of shape (n_scans, n_rays)")
+    parser.add_argument("rings", help="output .npy rings of shape (n_scans, 1, 64, 64)")
+    parser.add_argument("--decoded", default=None, help="output .npy decoded scans")
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    parser.add_argument("--dtype", choices=RINGS_DTYPES, default="uint8")
+    parser.add_argument("--max-range", type=float, default=25.0)
+    args = parser.parse_args()
+    convert(
+        args.scans,
+        args.rings,
+        args.decoded,
+        args.chunk_size,
+        args.dtype,
+        args.max_range,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,69 @@
-from setuptools import setup
+import os
+import tempfile
+from setuptools import setup, Extension
+from setuptools.errors import CompileError, LinkError
+from setuptools.command.build_ext import build_ext
 from Cython.Build import cythonize
 import numpy
+
+OPENMP_FLAGS = ["-fopenmp"]
+# Extensions whose kernels run their ``prange`` loops on OpenMP threads
+OPENMP_EXTENSIONS = ["lidar2d_fast", "lidar2d_batch"]
+OPENMP_TEST = """#include <omp.h>
+int main(void) { return omp_get_num_threads() - 1; }
+"""
+
+
+def has_openmp(compiler) -> bool:
+    """Check that the compiler builds and links a program with OpenMP"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = os.path.join(tmp_dir, "openmp_test.c")
+        with open(source, "w") as source_file:
+            source_file.write(OPENMP_TEST)
+        try:
+            objects = compiler.compile(
+                [source], output_dir=tmp_dir, extra_postargs=OPENMP_FLAGS
+            )
+            compiler.link_executable(
+                objects,
+                "openmp_test",
+                output_dir=tmp_dir,
+                extra_postargs=OPENMP_FLAGS,
+            )
+        except (CompileError, LinkError):
+            return False
+    return True
+
+
+class OpenMPBuildExt(build_ext):
+    """Build the extensions with OpenMP when the compiler supports it, their
+    ``prange`` loops run serially otherwise"""
+
+    def build_extensions(self) -> None:
+        if has_openmp(self.compiler):
+            for ext in self.extensions:
+                if ext.name in OPENMP_EXTENSIONS:
+                    ext.extra_compile_args += OPENMP_FLAGS
+                    ext.extra_link_args += OPENMP_FLAGS
+        else:
+            print("OpenMP is not supported, building the LiDAR kernels serially")
+        super().build_extensions()
+
+
+extensions = [
+    Extension(
+        "lidar2d_fast",
+        ["cython_packages/lidar2d_fast.pyx"],
+        extra_compile_args=["-O3"],
+    ),
+    Extension(
+        "lidar2d_batch",
+        ["cython_packages/lidar2d_batch.pyx"],
+        extra_compile_args=["-O3"],
+    ),
+]
 setup(
-    ext_modules=cythonize(["cython_packages/lidar2d_fast.pyx"], annotate=True),
+    ext_modules=cythonize(extensions, annotate=True),
     include_dirs=[numpy.get_include()],
+    cmdclass={"build_ext": OpenMPBuildExt},
 )
@@ -1,7 +1,7 @@
 """Implementation for agents interface"""
 from typing import Any, Tuple, List, Union
+import math
 import numpy as np
-from numpy.linalg import norm
 
 from highrl.obstacle.single_obstacle import SingleObstacle
 from highrl.utils.action import ActionXY
@@ -202,7 +202,9 @@ class Agent:
 
     def dist_to_goal(self) -> float:
         """Compute the distance from the agent to the goal"""
-        return norm(self.pos.get_coords() - self.gpos.get_coords()).item()
+        delta_x = self.pos.x - self.gpos.x
+        delta_y = self.pos.y - self.gpos.y
+        return math.sqrt(delta_x * delta_x + delta_y * delta_y)
 
     def step(self, action: ActionXY, delta_t: float) -> None:
         """Performs an action and update the agent state.
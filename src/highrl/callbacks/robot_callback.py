@@ -16,6 +16,8 @@ from pandas import DataFrame, concat
 from stable_baselines3.common.callbacks import BaseCallback
 from stable_baselines3.common.vec_env.base_vec_env import VecEnv
 
+from highrl.envs.observation_pipeline import get_env_obs_stats, obs_stats_path
+
 
 _LOG = logging.getLogger(__name__)
 THINK_EMOJI = "\U0001F914"
@@ -37,7 +39,7 @@ class RobotMaxStepsCallback(BaseCallback):
         Returns:
             bool: If the callback returns False, training is aborted early.
         """
-        total_steps = self.training_env.get_attr(attr_name="total_steps")[0]  # type: ignore
+        total_steps = sum(self.training_env.get_attr("total_steps"))  # type: ignore
 
         if total_steps >= self.max_steps:
             _LOG.warning("%s Abort_training %s", THINK_EMOJI, THINK_EMOJI)
@@ -58,8 +60,7 @@ class RobotSuccessesCallback(BaseCallback):
         Returns:
             bool: Flag for aborting training early
         """
-        attribute_name = "opt"
-        total_num_successes = self.training_env.get_attr(attribute_name)[0].num_successes  # type: ignore
+        total_num_successes = sum(self.training_env.get_attr("num_successes"))  # type: ignore
         if total_num_successes >= self.num_successes:
             _LOG.warning("%s Abort_training %s", THINK_EMOJI, THINK_EMOJI)
             return False
@@ -99,10 +100,18 @@ class RobotLogCallback(BaseCallback):
         if self.eval_frequency > 0 and self.n_calls % self.eval_frequency == 0:
             env = self.training_env
             if isinstance(self.training_env, VecEnv):
+                # Environments may share the same statistics, e.g. robots of a
+                # batched environment, so each table is only added once
+                statistics = {
+                    id(episode_statistics): episode_statistics
+                    for episode_statistics in self.training_env.get_attr(
+                        "episode_statistics"
+                    )
+                }
                 train_logs = DataFrame()
-                for env in self.training_env.envs:
+                for episode_statistics in statistics.values():
                     train_logs = concat(
-                        [train_logs, DataFrame.from_records(env.opt.episode_statistics)]
+                        [train_logs, DataFrame.from_records(episode_statistics)]
                     )
             else:
                 train_logs = env.opt.episode_statistics
@@ -169,6 +178,9 @@ class RobotEvalCallback(BaseCallback):
         """
 
         if self.eval_frequency > 0 and self.n_calls % self.eval_frequency == 0:
+            self.eval_env.encoder.load_state_dict(  # type: ignore
+                get_env_obs_stats(self.training_env)
+            )
             tic = time.time()
             eval_logs = run_n_episodes(self.model, self.eval_env, self.n_eval_episodes)
             toc = time.time()
@@ -204,6 +216,7 @@ class RobotEvalCallback(BaseCallback):
         if savepath is not None:
             try:
                 model.save(savepath)
+                self.eval_env.encoder.save(obs_stats_path(savepath))  # type: ignore
                 stat_message = (
                     f"Model saved to {savepath} (avg reward: {new_avg_reward})."
                 )
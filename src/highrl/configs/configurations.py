@@ -28,9 +28,41 @@ max_session_steps = 200
 
 [lidar]
 n_angles = 1080
-lidar_angle_increment = 005817764
+lidar_angle_increment = 0.005817764
 lidar_min_angle = 0
 lidar_max_angle = 6.283185307
+# range of rays hitting no obstacle
+lidar_max_range = 25.0
+# {cmap2d: CMap2D polygons renderer, aabb: NumPy ray/box intersections,
+#  grid: NumPy ray marching through an occupancy grid,
+#  openmp: ray/box intersections in parallel Cython,
+#  lut: scans precomputed for a static map, suits the evaluation env}
+lidar_backend = cmap2d
+# cells side length of the grid backend
+lidar_grid_resolution = 1.0
+# distance between the positions scanned by the lut backend, rays are
+# interpolated between positions and are off near the obstacles edges. On a
+# 256x256 map of 40 obstacles with 1080 rays, a table is 72 MB at 2.0 (mean
+# error 0.44 m, 99th percentile 10 m), 285 MB at 1.0 (0.25 m, 9 m) and
+# 1.1 GB at 0.5 (0.09 m, 2.8 m), the max error stays near the max range
+lidar_lut_resolution = 1.0
+# directory of the lut backend tables, empty to not cache them on disk
+lidar_lut_cache_dir = ~/.cache/highrl
+# sectors the flat lidar observation is min-pooled to, 0 keeps all rays
+lidar_sectors = 0
+# {float32, float16, uint8: ranges quantized on 256 levels up to the max range}
+# rings observations are always uint8 cells in {0, 1, 2}
+lidar_dtype = float32
+# observation stages applied in order {downsample: min-pool into lidar_sectors,
+#  quantize: store with lidar_dtype, rings: 64x64 rings of the scans,
+#  normalize: standardize lidar and robot with running statistics, not
+#   available with the subproc worker backend,
+#  stack: last history_len lidar frames as channels}
+observation_stages = downsample, quantize, stack
+# lidar frames seen by the policy at each step
+history_len = 1
+# bound of the normalized observations
+normalize_clip = 10.0
 
 [reward]
 collision_score = -25
@@ -48,6 +80,8 @@ save_to_file = False
 
 [env]
 epsilon = 1
+# write observations into two preallocated buffers used in turn
+reuse_obs_buffers = False
 
 [statistics]
 collect_statistics = True
@@ -84,6 +118,14 @@ small_obstacles_max_dim = 4
 small_obstacles_min_dim = 3
 # {flat: 1D, rings: 2D}
 lidar_mode = flat
+# number of robots stepped together during a robot session
+n_robot_envs = 1
+# {vectorized: robots stepped in one process, subproc: one process per robot,
+#  robots observations cannot be normalized}
+worker_backend = vectorized
+# drop, remove contained and merge the generated obstacles before each session,
+# fewer obstacles lower the session difficulty and change the teacher reward
+coalesce_obstacles = False
 
 [render]
 render_eval = False
@@ -129,9 +171,41 @@ max_session_steps = 200
 
 [lidar]
 n_angles = 1080
-lidar_angle_increment = 005817764
+lidar_angle_increment = 0.005817764
 lidar_min_angle = 0
 lidar_max_angle = 6.283185307
+# range of rays hitting no obstacle
+lidar_max_range = 25.0
+# {cmap2d: CMap2D polygons renderer, aabb: NumPy ray/box intersections,
+#  grid: NumPy ray marching through an occupancy grid,
+#  openmp: ray/box intersections in parallel Cython,
+#  lut: scans precomputed for a static map, suits the evaluation env}
+lidar_backend = cmap2d
+# cells side length of the grid backend
+lidar_grid_resolution = 1.0
+# distance between the positions scanned by the lut backend, rays are
+# interpolated between positions and are off near the obstacles edges. On a
+# 256x256 map of 40 obstacles with 1080 rays, a table is 72 MB at 2.0 (mean
+# error 0.44 m, 99th percentile 10 m), 285 MB at 1.0 (0.25 m, 9 m) and
+# 1.1 GB at 0.5 (0.09 m, 2.8 m), the max error stays near the max range
+lidar_lut_resolution = 1.0
+# directory of the lut backend tables, empty to not cache them on disk
+lidar_lut_cache_dir = ~/.cache/highrl
+# sectors the flat lidar observation is min-pooled to, 0 keeps all rays
+lidar_sectors = 0
+# {float32, float16, uint8: ranges quantized on 256 levels up to the max range}
+# rings observations are always uint8 cells in {0, 1, 2}
+lidar_dtype = float32
+# observation stages applied in order {downsample: min-pool into lidar_sectors,
+#  quantize: store with lidar_dtype, rings: 64x64 rings of the scans,
+#  normalize: standardize lidar and robot with running statistics, not
+#   available with the subproc worker backend,
+#  stack: last history_len lidar frames as channels}
+observation_stages = downsample, quantize, stack
+# lidar frames seen by the policy at each step
+history_len = 1
+# bound of the normalized observations
+normalize_clip = 10.0
 
 [reward]
 collision_score = -25
@@ -149,6 +223,8 @@ save_to_file = False
 
 [env]
 epsilon = 1
+# write observations into two preallocated buffers used in turn
+reuse_obs_buffers = False
 
 [statistics]
 collect_statistics = True
@@ -0,0 +1,407 @@
+"""Implementation of a batched robot environment stepping many robots at once"""
+from typing import List, Optional, Sequence, Tuple, Union
+import argparse
+import logging
+import time
+from configparser import RawConfigParser
+import numpy as np
+import pandas as pd
+from gym import spaces
+
+from highrl.obstacle.obstacles import (
+    BORDER_LAYER,
+    SESSION_LAYER,
+    LayeredObstacleSet,
+    ObstacleSet,
+)
+from highrl.obstacle.single_obstacle import SingleObstacle
+from highrl.utils import Position
+from highrl.utils.general import configure_robot
+from highrl.utils.robot_utils import RobotOpt
+from highrl.lidar_setup.sensor import LidarSensor
+
+_LOG = logging.getLogger(__name__)
+
+EnvIndices = Optional[Union[int, Sequence[int], np.ndarray]]
+
+
+class BatchedRobotEnv:
+    """Robot environment that steps ``n_envs`` robots in one call.
+
+    The robots share the obstacles map and their states are stored as a
+    structure of arrays: positions, headings, velocities and goals of all
+    robots live in contiguous arrays. Kinematics, rewards and observations
+    follow :class:`highrl.envs.robot_env.RobotEnv`, so feeding the same actions
+    to ``n_envs`` scalar environments gives the same observations, rewards and
+    done flags, bit-for-bit.
+
+    Robot states are kept in double precision since this is the precision the
+    scalar environment integrates positions with; float32 states drift away
+    from it after a few steps. Observations are written in float32.
+    """
+
+    tensorboard_dir = "runs/robot"
+    rwrd_grph_name = "reward"
+    eps_rwrd_grph_name = "episode_reward"
+    # Attributes holding one entry per robot
+    per_env_attributes = (
+        "pos",
+        "theta",
+        "vel",
+        "goal_pos",
+        "robot_init_pos",
+        "goal_init_pos",
+        "episode_steps",
+        "episode_reward",
+        "total_steps",
+        "num_successes",
+        "rewards",
+        "dones",
+        "success_flags",
+        "is_initial_state",
+        "results",
+    )
+
+    def __init__(
+        self,
+        config: RawConfigParser,
+        args: argparse.Namespace,
+        n_envs: int = 1,
+        observation_stages: Optional[List[str]] = None,
+    ) -> None:
+        self.n_envs = n_envs
+        self.action_space = spaces.Box(low=-1, high=1, shape=(2,), dtype=np.float32)
+        self.cfg = configure_robot(config, args.env_render_path, observation_stages)
+        self.lidar = LidarSensor(self.cfg)
+        self.observation_space = spaces.Dict(
+            {
+                "lidar": self.lidar.observation_space,
+                "robot": spaces.Box(
+                    low=-np.inf, high=np.inf, shape=(5,), dtype=np.float32
+                ),
+            }
+        )
+
+        self.opt = RobotOpt()
+        self.opt.set_tb_writer(self.tensorboard_dir)
+        self.obstacles = LayeredObstacleSet()
+        self.add_border_obstacles()
+
+        # Robots state, one row per robot
+        self.pos = np.zeros((n_envs, 2), dtype=np.float64)
+        self.theta = np.zeros((n_envs,), dtype=np.float64)
+        self.vel = np.zeros((n_envs, 3), dtype=np.float64)  # vx, vy, w
+        self.goal_pos = np.zeros((n_envs, 2), dtype=np.float64)
+        self.robot_init_pos = np.zeros((n_envs, 2), dtype=np.float64)
+        self.goal_init_pos = np.zeros((n_envs, 2), dtype=np.float64)
+
+        # Episodes state, one entry per robot
+        self.episode_steps = np.zeros((n_envs,), dtype=np.int64)
+        self.episode_reward = np.zeros((n_envs,), dtype=np.float64)
+        self.rewards = np.zeros((n_envs,), dtype=np.float64)
+        self.dones = np.zeros((n_envs,), dtype=bool)
+        self.success_flags = np.zeros((n_envs,), dtype=bool)
+        self.is_initial_state = np.ones((n_envs,), dtype=bool)
+        # Session counters, one entry per robot
+        self.total_steps = np.zeros((n_envs,), dtype=np.int64)
+        self.num_successes = np.zeros((n_envs,), dtype=np.int64)
+        # Results of each episode for each robot
+        # Contains [episode_reward, episode_steps, success_flag]
+        self.results: List[List[Tuple[float, int, bool]]] = [[] for _ in range(n_envs)]
+
+        self.lidar_obs = np.zeros(
+            (n_envs,) + self.lidar.observation_shape, dtype=np.float32
+        )
+        self.robot_obs = np.zeros((n_envs, 5), dtype=np.float32)
+        self.obstacle_boxes = np.zeros((0, 4), dtype=np.float64)
+
+    @property
+    def episode_statistics(self) -> pd.DataFrame:
+        """Getter for the statistics collected at each step, shared by all robots"""
+        return self.opt.episode_statistics
+
+    def add_border_obstacles(self) -> None:
+        """Creates border obstacles to limit the allowable navigation area"""
+        # fmt: off
+        self.obstacles.set_layer(BORDER_LAYER, [
+                SingleObstacle(-self.cfg.epsilon, 0, self.cfg.epsilon, self.cfg.height),  # left obstacle
+                SingleObstacle(0, -self.cfg.epsilon, self.cfg.width, self.cfg.epsilon),  # bottom obstacle
+                SingleObstacle(self.cfg.width, 0, self.cfg.epsilon, self.cfg.height),  # right obstacle
+                SingleObstacle(0, self.cfg.height, self.cfg.width, self.cfg.epsilon),  # top obstacle
+        ])
+
+    def _to_indices(self, env_ids: EnvIndices) -> np.ndarray:
+        """Convert env indices given by the caller to an array of indices"""
+        if env_ids is None:
+            return np.arange(self.n_envs)
+        return np.atleast_1d(np.asarray(env_ids, dtype=np.int64))
+
+    def set_robot_position(
+        self,
+        robot_pos: Union[Position, np.ndarray],
+        goal_pos: Union[Position, np.ndarray],
+        env_ids: EnvIndices = None,
+    ) -> None:
+        """Initializes robots and goals positions
+        Should be called from ``teacher``
+
+        Args:
+            robot_pos (Union[Position, np.ndarray]): Position of the robots, either a single
+            position shared by all robots or an array of shape (n, 2)
+            goal_pos (Union[Position, np.ndarray]): Position of the goals, either a single
+            position shared by all robots or an array of shape (n, 2)
+            env_ids (EnvIndices, optional): Robots to update. Defaults to all robots.
+        """
+        indices = self._to_indices(env_ids)
+        if isinstance(robot_pos, Position):
+            robot_pos = np.array(robot_pos.to_list())
+        if isinstance(goal_pos, Position):
+            goal_pos = np.array(goal_pos.to_list())
+        self.robot_init_pos[indices] = robot_pos
+        self.goal_init_pos[indices] = goal_pos
+        self.pos[indices] = robot_pos
+        self.goal_pos[indices] = goal_pos
+
+    def load_session(
+        self,
+        obstacles: ObstacleSet,
+        robot_pos: Union[Position, np.ndarray],
+        goal_pos: Union[Position, np.ndarray],
+        env_ids: EnvIndices = None,
+    ) -> None:
+        """Prepares a new robot session generated by the ``teacher``
+
+        Args:
+            obstacles (ObstacleSet): Obstacles of the session shared by all robots,
+            replacing the session layer
+            robot_pos (Union[Position, np.ndarray]): Position of the robots
+            goal_pos (Union[Position, np.ndarray]): Position of the goals
+            env_ids (EnvIndices, optional): Robots to update. Defaults to all robots.
+        """
+        self.obstacles.set_layer(SESSION_LAYER, obstacles)
+        self.set_robot_position(robot_pos, goal_pos, env_ids)
+        indices = self._to_indices(env_ids)
+        self.is_initial_state[indices] = True
+        self.num_successes[indices] = 0
+        self.opt.num_successes = int(self.num_successes.sum())
+
+    def dist_to_goal(self) -> np.ndarray:
+        """Compute the distance from each robot to its goal"""
+        delta = self.pos - self.goal_pos
+        return np.sqrt(delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1])
+
+    def _move_robots(self, actions: np.ndarray) -> None:
+        """Applies ``Agent.compute_position`` kinematics to all robots.
+
+        The arithmetic mirrors the scalar code step by step: NumPy scalars of
+        the actions are promoted to double precision everywhere but in
+        ``np.arctan2``, so positions are identical to the ones of the scalar
+        environment.
+        """
+        two_pi = 2 * np.pi
+        actions_vx = actions[:, 0]
+        actions_vy = actions[:, 1]
+        speed_x = actions_vx.astype(np.float64)
+        speed_y = actions_vy.astype(np.float64)
+        velocity = (speed_x**2 + speed_y**2) ** 0.5
+        angle = np.arctan2(actions_vy, actions_vx).astype(np.float64)
+        angle = np.where(angle < 0, angle + two_pi, angle)
+        angle = np.where(angle >= two_pi, angle - two_pi, angle)
+        heading = self.theta + angle
+        self.pos[:, 0] += velocity * np.cos(heading) * self.cfg.delta_t
+        self.pos[:, 1] += velocity * np.sin(heading) * self.cfg.delta_t
+        self.vel[:, 0] = actions_vx
+        self.vel[:, 1] = actions_vy
+        self.vel[:, 2] = 0
+
+    def detect_collison(self) -> np.ndarray:
+        """Detects which robots have collided with any obstacles
+
+        Returns:
+            np.ndarray: flags of shape (n,), True for robots in collision
+        """
+        radius = self.cfg.robot_radius
+        boxes = self.obstacle_boxes
+        robot_min = self.pos - radius
+        robot_max = self.pos + radius
+        is_apart = (
+            (robot_min[:, None, 0] > boxes[None, :, 2])
+            | (robot_min[:, None, 1] > boxes[None, :, 3])
+            | (boxes[None, :, 0] > robot_max[:, None, 0])
+            | (boxes[None, :, 1] > robot_max[:, None, 1])
+        )
+        return ~np.all(is_apart, axis=1)
+
+    def reached_destination(
+        self, dist_to_goal: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Determines which robots reached their goals"""
+        if dist_to_goal is None:
+            dist_to_goal = self.dist_to_goal()
+        return dist_to_goal < self.cfg.robot_radius + self.cfg.goal_radius
+
+    def step(
+        self, actions: np.ndarray
+    ) -> Tuple[dict, np.ndarray, np.ndarray, List[dict]]:
+        """Step all robots using a batch of actions given by the robot model
+
+        Robots that are done are not reset automatically, call :meth:`reset`
+        for them before stepping again.
+
+        Args:
+            actions (np.ndarray): velocity actions (vx, vy) of shape (n, 2)
+
+        Returns:
+            Tuple[dict, np.ndarray, np.ndarray, List[dict]]: observations, rewards, dones, infos
+        """
+        actions = np.asarray(actions).reshape(self.n_envs, 2)
+        self.episode_steps += 1
+        self.total_steps += 1
+        self.opt.total_steps += self.n_envs
+
+        old_distance_to_goal = self.dist_to_goal()
+        self._move_robots(actions)
+        new_distance_to_goal = self.dist_to_goal()
+
+        collided = self.detect_collison()
+        reached = self.reached_destination(new_distance_to_goal) & ~collided
+        timed_out = (self.episode_steps >= self.cfg.max_episode_steps) & ~(
+            collided | reached
+        )
+        self.rewards.fill(0.0)
+        self.rewards[collided] = self.cfg.collision_score
+        self.rewards[reached] = self.cfg.reached_goal_score
+        self.rewards += (
+            old_distance_to_goal - new_distance_to_goal
+        ) * self.cfg.progress_discount
+        self.dones = collided | reached | timed_out
+        self.success_flags = reached
+        if collided.any():
+            _LOG.warning("COLLISION DETECTED")
+
+        self.episode_reward += self.rewards
+        self.opt.reward = self.rewards.mean().item()
+        self.opt.episode_reward = self.episode_reward.mean().item()
+        self.opt.tb_writer.add_scalar(
+            self.rwrd_grph_name,
+            self.opt.reward,
+            self.opt.total_steps,
+        )
+        self.opt.tb_writer.add_scalar(
+            self.eps_rwrd_grph_name,
+            self.opt.episode_reward,
+            self.opt.total_steps,
+        )
+
+        if self.cfg.collect_statistics:
+            self._collect_statistics(collided, reached)
+
+        # log data
+        for env_idx in np.flatnonzero(self.dones):
+            self.num_successes[env_idx] += int(self.success_flags[env_idx])
+            self.opt.num_successes += int(self.success_flags[env_idx])
+            result = (
+                self.episode_reward[env_idx].item(),
+                self.episode_steps[env_idx].item(),
+                bool(self.success_flags[env_idx]),
+            )
+            self.results[env_idx].append(result)
+
+        return (
+            self._make_obs(),
+            self.rewards,
+            self.dones,
+            [{} for _ in range(self.n_envs)],
+        )
+
+    def _collect_statistics(self, collided: np.ndarray, reached: np.ndarray) -> None:
+        """Append one statistics row per robot for the current step"""
+        step_statistics = pd.DataFrame(
+            {
+                "total_steps": self.opt.total_steps,
+                "episode_steps": self.episode_steps,
+                "scenario": "robot_env_" + self.cfg.scenario,
+                "damage": np.where(collided, 100, 0),
+                "goal_reached": reached,
+                "total_reward": self.opt.total_reward,
+                "episode_reward": self.episode_reward,
+                "reward": self.rewards,
+                "wall_time": time.time(),
+            }
+        )
+        self.opt.episode_statistics = pd.concat(
+            [self.opt.episode_statistics, step_statistics], ignore_index=True
+        )
+
+    def _make_obs(self, env_ids: EnvIndices = None) -> dict:
+        """Creates robots observations from environment state and LiDAR
+
+        Args:
+            env_ids (EnvIndices, optional): Robots whose LiDAR is scanned again,
+            the others keep their last scan. Defaults to all robots.
+
+        Returns:
+            dict: stacked observations, views into buffers that are overwritten
+            by the next call
+        """
+        indices = self._to_indices(env_ids)
+        lidar_pos = np.hstack([self.pos, self.theta[:, None]]).astype(np.float32)
+        self.lidar_obs[indices] = self.lidar.scan_batch(lidar_pos[indices])
+
+        # Transform goals and velocities from world frame into robots frames,
+        # similar to ``pose2d.inverse_pose2d`` and ``pose2d.apply_tf_to_*``
+        inv_theta = -self.theta
+        cos_th = np.cos(inv_theta)
+        sin_th = np.sin(inv_theta)
+        inv_x = cos_th * -self.pos[:, 0] + -sin_th * -self.pos[:, 1]
+        inv_y = sin_th * -self.pos[:, 0] + cos_th * -self.pos[:, 1]
+        goal_x = self.goal_pos[:, 0]
+        goal_y = self.goal_pos[:, 1]
+        vel_x = self.vel[:, 0]
+        vel_y = self.vel[:, 1]
+        self.robot_obs[:, 0] = cos_th * goal_x + -sin_th * goal_y + inv_x
+        self.robot_obs[:, 1] = sin_th * goal_x + cos_th * goal_y + inv_y
+        self.robot_obs[:, 2] = cos_th * vel_x + -sin_th * vel_y
+        self.robot_obs[:, 3] = sin_th * vel_x + cos_th * vel_y
+        self.robot_obs[:, 4] = self.vel[:, 2]
+
+        return {"lidar": self.lidar_obs, "robot": self.robot_obs}
+
+    def reset(self, env_ids: EnvIndices = None) -> dict:
+        """Resets robots that are done or in their initial state
+
+        Args:
+            env_ids (EnvIndices, optional): Robots to reset. Defaults to all robots.
+
+        Returns:
+            dict: observations of the current environment state
+        """
+        indices = self._to_indices(env_ids)
+        to_reset = indices[self.dones[indices] | self.is_initial_state[indices]]
+        if len(to_reset) > 0:
+            _LOG.info("Reseting %i robots ...", len(to_reset))
+            self.pos[to_reset] = self.robot_init_pos[to_reset]
+            self.goal_pos[to_reset] = self.goal_init_pos[to_reset]
+            self.opt.total_reward += self.episode_reward[to_reset].sum().item()
+            initial = to_reset[self.is_initial_state[to_reset]]
+            for env_idx in initial:
+                self.results[env_idx] = []
+            self.total_steps[initial] = 0
+            if self.is_initial_state.all():
+                self.opt.total_reward = 0
+                self.opt.total_steps = 0
+
+            self.success_flags[to_reset] = False
+            self.is_initial_state[to_reset] = False
+            self.episode_steps[to_reset] = 0
+            self.dones[to_reset] = False
+            self.episode_reward[to_reset] = 0
+            (
+                self.opt.flat_contours,
+                self.opt.contours,
+            ) = self.obstacles.get_flatten_contours()
+            self.lidar.set_obstacles(self.obstacles)
+            self.obstacle_boxes = np.trunc(
+                self.obstacles.get_bounding_boxes().astype(np.float64)
+            )
+        return self._make_obs(to_reset)
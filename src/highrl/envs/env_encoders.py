@@ -1,232 +1,90 @@
-"""Implementation for environments wrappers"""
-import configparser
-import argparse
-from typing import List, Tuple
+"""Implementation of the lidar encoders of the robot observations"""
+from typing import List
 from gym import spaces
 import numpy as np
 
-from highrl.lidar_setup.rings import generate_rings
-from highrl.envs.robot_env import RobotEnv
-from highrl.envs.eval_env import RobotEvalEnv
-
-
-class FlatLidarEncoder:
-    """Generic class to encode environment for 1D lidar states"""
-
-    def __init__(self) -> None:
-        self.lidar_dim = 1080
-        self.robot_dim = 5
-        self.observation_space = spaces.Dict(
-            {
-                "lidar": spaces.Box(
-                    low=-np.inf, high=np.inf, shape=(self.lidar_dim,), dtype=np.float32
-                ),
-                "robot": spaces.Box(
-                    low=-np.inf, high=np.inf, shape=(self.robot_dim,), dtype=np.float32
-                ),
-            }
-        )
-
-    def encode_obs(self, obs: dict) -> dict:
-        """Encode observations from robot lidar
-
-        Note that the function is idle since the lidar readings
-        are inherently in the 1-D format.
-
-        Args:
-            obs (dict): Input observation for encoding
-
-        Returns:
-            dict: Encoded observation
-        """
-        return obs
-
-
-class RingsLidarEncoder:
-    """Genetric class to encode environment for 2D lidar states
-    Assumes usage of 1D Conv
+from highrl.envs.observation_pipeline import (
+    LIDAR_DTYPES,
+    DownsampleStage,
+    ObservationPipeline,
+    ObservationStage,
+    QuantizeStage,
+    RingsStage,
+    make_observation_space,
+)
+
+
+def _scans_space(lidar_dim: int) -> spaces.Dict:
+    """Observation space of raw scans of lidar_dim rays"""
+    return make_observation_space(
+        spaces.Box(low=-np.inf, high=np.inf, shape=(lidar_dim,), dtype=np.float32)
+    )
+
+
+class FlatLidarEncoder(ObservationPipeline):
+    """Generic class to encode environment for 1D lidar states
+
+    The scan can be min-pooled into sectors, keeping the closest range seen
+    by the rays of each sector, and stored with a smaller dtype. Quantized
+    ``uint8`` ranges are multiples of ``lidar_scale``, rounded down so that
+    obstacles never look farther than they are.
+
+    Args:
+        lidar_dim (int): number of rays of the lidar scans
+        n_sectors (int, optional): number of sectors of the encoded scans, 0
+        keeps all rays. Defaults to 0.
+        dtype (str, optional): dtype of the encoded scans, one of
+        ``LIDAR_DTYPES``. Defaults to "float32".
+        max_range (float, optional): lidar max range. Defaults to 25.0.
     """
 
-    def __init__(self) -> None:
-        self.ring_dim = 64 * 64
-        self.robot_dim = 5
-        self.observation_space = spaces.Dict(
-            {
-                "lidar": spaces.Box(
-                    low=-np.inf, high=np.inf, shape=(self.ring_dim,), dtype=np.float32
-                ),
-                "robot": spaces.Box(
-                    low=-np.inf, high=np.inf, shape=(self.robot_dim,), dtype=np.float32
-                ),
-            }
-        )
-
-        self.rings_def = generate_rings(64, 64)
-
-    def encode_obs(self, obs: dict) -> dict:
-        """Encode observations from robot lidar
-
-        Convert observations to 2-D format.
-
-        Args:
-            obs (dict): Input observation for encoding
-
-        Returns:
-            dict: Encoded observation
-        """
-        lidar = obs["lidar"]
-        obs["lidar"] = (
-            self.rings_def["lidar_to_rings"](lidar[None, :]).astype(float)
-            / self.rings_def["rings_to_bool"]
-        ).reshape(self.ring_dim)
-        return obs
-
-
-class RobotEnv1DPlayer(RobotEnv):
-    """Robot environment wrapper for running flat lidars readings"""
-
-    def __init__(
-        self,
-        config: configparser.RawConfigParser,
-        args: argparse.Namespace,
-    ) -> None:
-        self.encoder = FlatLidarEncoder()
-        super().__init__(config, args)
-        self.observation_space = self.encoder.observation_space
-
-    def step(self, action: List) -> Tuple[dict, float, bool, dict]:
-        """Implements one step for robot
-
-        Args:
-            action (List): Action for robot step
-
-        Returns:
-            Tuple[dict, float, bool, dict]: observation, reward, done flag, info dict
-        """
-        obs, reward, done, info = super().step(action)
-        encoded_obs = self.encoder.encode_obs(obs)
-
-        return encoded_obs, reward, done, info
-
-    def reset(self) -> dict:
-        """Reset robot environment
-
-        Returns:
-            dict: Observation
-        """
-        obs = super().reset()
-        encoded_obs = self.encoder.encode_obs(obs)
-        return encoded_obs
-
-
-class RobotEnv2DPlayer(RobotEnv):
-    """Robot environment wrapper for running rings lidars readings"""
-
     def __init__(
         self,
-        config: configparser.RawConfigParser,
-        args: argparse.Namespace,
+        lidar_dim: int,
+        n_sectors: int = 0,
+        dtype: str = "float32",
+        max_range: float = 25.0,
     ) -> None:
-        self.encoder = RingsLidarEncoder()  # need to be changed
-        super().__init__(config, args)
-        self.observation_space = self.encoder.observation_space
-
-    def step(self, action: List) -> Tuple[dict, float, bool, dict]:
-        """Implements one step for robot
-
-        Args:
-            action (List): Action for robot step
-
-        Returns:
-            Tuple[dict, float, bool, dict]: observation, reward, done flag, info dict
-        """
-        obs, reward, done, info = super().step(action)
-        encoded_obs = self.encoder.encode_obs(obs)
-
-        return encoded_obs, reward, done, info
-
-    def reset(self) -> dict:
-        """Reset robot environment
-
-        Returns:
-            dict: Observation
-        """
-        obs = super().reset()
-        encoded_obs = self.encoder.encode_obs(obs)
-        return encoded_obs
-
-
-class EvalEnv1DPlayer(RobotEvalEnv):
-    """Robot evaluatiion environment wrapper for running flat lidars readings"""
-
-    def __init__(
-        self,
-        config: configparser.RawConfigParser,
-        args: argparse.Namespace,
-    ) -> None:
-        self.encoder = FlatLidarEncoder()
-        super().__init__(config, args)
-
-        self.observation_space = self.encoder.observation_space
-
-    def step(self, action: List) -> Tuple[dict, float, bool, dict]:
-        """Implements one step for robot
-
-        Args:
-            action (List): Action for robot step
-
-        Returns:
-            Tuple[dict, float, bool, dict]: observation, reward, done flag, info dict
-        """
-        obs, reward, done, info = super().step(action)
-        encoded_obs = self.encoder.encode_obs(obs)
-
-        return encoded_obs, reward, done, info
-
-    def reset(self) -> dict:
-        """Reset robot environment
-
-        Returns:
-            dict: Observation
-        """
-        obs = super().reset()
-        encoded_obs = self.encoder.encode_obs(obs)
-        return encoded_obs
-
-
-class EvalEnv2DPlayer(RobotEvalEnv):
-    """Robot evaluatiion environment wrapper for running rings lidars readings"""
+        if dtype not in LIDAR_DTYPES:
+            raise ValueError(f"Lidar dtype {dtype} is not avaliable")
+        if not 0 <= n_sectors <= lidar_dim:
+            raise ValueError(f"Lidar sectors {n_sectors} must be in [0, {lidar_dim}]")
+        stages: List[ObservationStage] = []
+        if n_sectors not in [0, lidar_dim]:
+            stages.append(DownsampleStage(n_sectors))
+        if dtype != "float32":
+            stages.append(QuantizeStage(dtype, max_range))
+        super().__init__(_scans_space(lidar_dim), stages)
+        self.lidar_dim = self.observation_space["lidar"].shape[0]
+        self.lidar_dtype = np.dtype(dtype)
+
+
+class RingsLidarEncoder(ObservationPipeline):
+    """Genetric class to encode environment for 2D lidar states
+    Assumes usage of 2D Conv
+
+    Rings are written straight into an array of the encoded dtype and of
+    shape ``rings_shape``, either ``uint8`` cells in {0, 1, 2} which are
+    multiples of ``lidar_scale``, or ``float32`` occupancies in [0, 1].
+
+    Args:
+        dtype (str, optional): dtype of the encoded rings, one of
+        ``RINGS_DTYPES``. Defaults to "uint8".
+        max_range (float, optional): lidar max range. Defaults to 25.0.
+        lidar_dim (int, optional): number of rays of the lidar scans.
+        Defaults to 1080.
+    """
 
     def __init__(
         self,
-        config: configparser.RawConfigParser,
-        args: argparse.Namespace,
+        dtype: str = "uint8",
+        max_range: float = 25.0,
+        lidar_dim: int = 1080,
     ) -> None:
-        self.encoder = RingsLidarEncoder()  # need to be changed
-        super().__init__(config, args)
-
-        self.observation_space = self.encoder.observation_space
-
-    def step(self, action: List) -> Tuple[dict, float, bool, dict]:
-        """Implements one step for robot
-
-        Args:
-            action (List): Action for robot step
-
-        Returns:
-            Tuple[dict, float, bool, dict]: observation, reward, done flag, info dict
-        """
-        obs, reward, done, info = super().step(action)
-        encoded_obs = self.encoder.encode_obs(obs)
-
-        return encoded_obs, reward, done, info
-
-    def reset(self) -> dict:
-        """Reset robot environment
-
-        Returns:
-            dict: Observation
-        """
-        obs = super().reset()
-        encoded_obs = self.encoder.encode_obs(obs)
-        return encoded_obs
+        stage = RingsStage(dtype, max_range)
+        super().__init__(_scans_space(lidar_dim), [stage])
+        self.ring_dim = 64 * 64
+        # Single channel image of the rings, angles by ranges
+        self.rings_shape = stage.rings_shape
+        self.lidar_dtype = stage.lidar_dtype
+        self.rings_def = stage.rings_def
@@ -1,20 +1,28 @@
 """Implementation for the evaluation environemnt"""
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from random import randint
 from argparse import Namespace
 from configparser import RawConfigParser
 
 from highrl.utils import Position
 from highrl.envs.robot_env import RobotEnv
+from highrl.obstacle.obstacles import EVAL_LAYER
 from highrl.obstacle.single_obstacle import SingleObstacle
 
 
 class RobotEvalEnv(RobotEnv):
     """Evaluation environment for robot performance"""
 
-    def __init__(self, config: RawConfigParser, args: Namespace) -> None:
-        super().__init__(config, args)
+    def __init__(
+        self,
+        config: RawConfigParser,
+        args: Namespace,
+        observation_stages: Optional[List[str]] = None,
+    ) -> None:
+        super().__init__(config, args, observation_stages)
         self.cfg.n_eval_episodes = config.getint("eval", "n_eval_episodes")
+        # Observations statistics are synced from the training env
+        self.encoder.train(False)
 
         self.set_robot_position(
             Position[int](self.cfg.robot_init_x_pos, self.cfg.robot_init_y_pos),
@@ -37,7 +45,7 @@ class RobotEvalEnv(RobotEnv):
             self.cfg.eval_sml_obs_dim,
         )
 
-        self.obstacles.add_obstacles(obstacles)
+        self.obstacles.set_layer(EVAL_LAYER, obstacles)
 
     def generate_eval_obstacles(
         self,
@@ -0,0 +1,754 @@
+"""Composable pipeline of stages encoding the robot observations"""
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from os import path
+import gym
+from gym import spaces
+import numpy as np
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+from highrl.lidar_setup.rings import RINGS_TO_BOOL, get_rings
+from highrl.utils.general import RobotConfigs
+
+
+OBSERVATION_STAGES = ["downsample", "quantize", "rings", "normalize", "stack"]
+LIDAR_DTYPES = ["float32", "float16", "uint8"]
+RINGS_DTYPES = ["float32", "uint8"]
+
+StageBuffers = List[Dict[str, np.ndarray]]
+EnvIndices = Union[None, Sequence[int], np.ndarray]
+
+
+def make_observation_space(lidar_space: spaces.Box, robot_dim: int = 5) -> spaces.Dict:
+    """Observation space of the robot environments for a given lidar space"""
+    return spaces.Dict(
+        {
+            "lidar": lidar_space,
+            "robot": spaces.Box(
+                low=-np.inf, high=np.inf, shape=(robot_dim,), dtype=np.float32
+            ),
+        }
+    )
+
+
+class ObservationStage:
+    """Base class of the observation pipeline stages
+
+    A stage encodes the observation entries named in ``keys``. It is set up
+    once with the observation space of its input, and then writes encoded
+    observations into buffers preallocated by the pipeline, of the stage
+    observation space with an extra leading batch shape. Stateful stages
+    keep their own outputs instead, and follow the episodes of each env.
+    """
+
+    keys: Tuple[str, ...] = ("lidar",)
+    stateful = False
+    training = True
+    # Units of the input lidar in one unit of the encoded lidar
+    lidar_scale = 1.0
+
+    def setup(self, input_space: spaces.Dict) -> spaces.Dict:
+        """Validate the input space of the stage
+
+        Args:
+            input_space (spaces.Dict): observation space of the stage input
+
+        Returns:
+            spaces.Dict: observation space of the stage output
+        """
+        raise NotImplementedError
+
+    def apply(self, obs: Dict[str, np.ndarray], out: Dict[str, np.ndarray]) -> None:
+        """Encode observations into the output buffers of ``keys``
+
+        Args:
+            obs (Dict[str, np.ndarray]): single or batched input observations
+            out (Dict[str, np.ndarray]): output buffers of the stage
+        """
+        raise NotImplementedError
+
+    def encode(
+        self,
+        obs: Dict[str, np.ndarray],
+        out: Dict[str, np.ndarray],
+        env_ids: EnvIndices = None,
+    ) -> Dict[str, np.ndarray]:
+        """Encode observations, see :meth:`ObservationPipeline.encode_obs`
+
+        Args:
+            obs (Dict[str, np.ndarray]): single or batched input observations
+            out (Dict[str, np.ndarray]): output buffers of the stage
+            env_ids (EnvIndices, optional): envs of the batched observations
+            restarting an episode. Defaults to the next step of all envs.
+
+        Returns:
+            Dict[str, np.ndarray]: encoded entries of ``keys``
+        """
+        self.apply(obs, out)
+        return out
+
+    def reset(self, env_ids: EnvIndices = None) -> None:
+        """Start new episodes for the given envs, or for all envs"""
+
+    def encoded_scale(self, input_scale: float) -> float:
+        """Distance or occupancy of one unit of the encoded lidar"""
+        return input_scale * self.lidar_scale
+
+    def state_dict(self) -> Dict[str, np.ndarray]:
+        """Learned statistics of the stage, saved with the robot models"""
+        return {}
+
+    def load_state_dict(self, state: Dict[str, np.ndarray]) -> None:
+        """Load statistics returned by :meth:`state_dict`"""
+
+
+class DownsampleStage(ObservationStage):
+    """Min-pool the lidar rays into sectors, keeping their closest range
+
+    Args:
+        n_sectors (int): number of sectors of the encoded scans
+    """
+
+    def __init__(self, n_sectors: int) -> None:
+        self.n_sectors = n_sectors
+        self.sector_starts = np.zeros((0,), dtype=np.intp)
+
+    def setup(self, input_space: spaces.Dict) -> spaces.Dict:
+        lidar_space = input_space["lidar"]
+        n_rays = lidar_space.shape[-1]
+        if len(lidar_space.shape) != 1 or not 0 < self.n_sectors <= n_rays:
+            raise ValueError(
+                f"Lidar sectors {self.n_sectors} must be in [1, {n_rays}] "
+                "of a flat scan"
+            )
+        # First ray of each sector, sectors differ by at most one ray
+        self.sector_starts = np.ceil(
+            np.arange(self.n_sectors) * n_rays / self.n_sectors
+        ).astype(np.intp)
+        return spaces.Dict(
+            {
+                **input_space.spaces,
+                "lidar": spaces.Box(
+                    low=-np.inf,
+                    high=np.inf,
+                    shape=(self.n_sectors,),
+                    dtype=lidar_space.dtype,
+                ),
+            }
+        )
+
+    def apply(self, obs: Dict[str, np.ndarray], out: Dict[str, np.ndarray]) -> None:
+        np.minimum.reduceat(obs["lidar"], self.sector_starts, axis=-1, out=out["lidar"])
+
+
+class QuantizeStage(ObservationStage):
+    """Store the lidar ranges with a smaller dtype
+
+    Quantized ``uint8`` ranges are multiples of ``lidar_scale``, rounded down
+    so that obstacles never look farther than they are.
+
+    Args:
+        dtype (str): dtype of the encoded scans, one of ``LIDAR_DTYPES``
+        max_range (float, optional): lidar max range. Defaults to 25.0.
+    """
+
+    def __init__(self, dtype: str, max_range: float = 25.0) -> None:
+        if dtype not in LIDAR_DTYPES:
+            raise ValueError(f"Lidar dtype {dtype} is not avaliable")
+        self.lidar_dtype = np.dtype(dtype)
+        # Distance in meters of one unit of the encoded scans
+        self.lidar_scale = max_range / 255 if dtype == "uint8" else 1.0
+        self._scratch: Dict[Tuple[int, ...], np.ndarray] = {}
+
+    def setup(self, input_space: spaces.Dict) -> spaces.Dict:
+        lidar_space = input_space["lidar"]
+        if lidar_space.dtype != np.float32:
+            raise ValueError(f"Lidar of dtype {lidar_space.dtype} is already quantized")
+        if self.lidar_dtype == np.uint8:
+            lidar_space = spaces.Box(
+                low=0, high=255, shape=lidar_space.shape, dtype=self.lidar_dtype
+            )
+        else:
+            lidar_space = spaces.Box(
+                low=-np.inf, high=np.inf, shape=lidar_space.shape, dtype=self.lidar_dtype
+            )
+        return spaces.Dict({**input_space.spaces, "lidar": lidar_space})
+
+    def apply(self, obs: Dict[str, np.ndarray], out: Dict[str, np.ndarray]) -> None:
+        lidar = obs["lidar"]
+        if self.lidar_dtype != np.uint8:
+            np.copyto(out["lidar"], lidar, casting="same_kind")
+            return
+        scratch = self._scratch.get(lidar.shape)
+        if scratch is None:
+            scratch = self._scratch[lidar.shape] = np.empty(lidar.shape, np.float32)
+        np.divide(lidar, self.lidar_scale, out=scratch)
+        np.clip(scratch, 0, 255, out=scratch)
+        np.floor(scratch, out=scratch)
+        np.copyto(out["lidar"], scratch, casting="unsafe")
+
+
+class RingsStage(ObservationStage):
+    """Convert the lidar scans to 2D rings, for 2D convolutions
+
+    Rings are a single channel image of angles by ranges, either ``uint8``
+    cells in {0, 1, 2} which are multiples of ``lidar_scale``, or ``float32``
+    occupancies in [0, 1].
+
+    Args:
+        dtype (str, optional): dtype of the encoded rings, one of
+        ``RINGS_DTYPES``. Defaults to "uint8".
+        max_range (float, optional): lidar max range. Defaults to 25.0.
+    """
+
+    def __init__(self, dtype: str = "uint8", max_range: float = 25.0) -> None:
+        if dtype not in RINGS_DTYPES:
+            raise ValueError(f"Rings dtype {dtype} is not avaliable")
+        self.rings_shape = (1, 64, 64)
+        self.lidar_dtype = np.dtype(dtype)
+        # Occupancy of one unit of the encoded rings
+        self.lidar_scale = 1.0 / RINGS_TO_BOOL if dtype == "uint8" else 1.0
+        self.rings_def = get_rings(64, 64, max_dist=max_range)
+
+    def setup(self, input_space: spaces.Dict) -> spaces.Dict:
+        lidar_space = input_space["lidar"]
+        if len(lidar_space.shape) != 1 or lidar_space.dtype != np.float32:
+            raise ValueError("Rings are made of flat float32 scans")
+        return spaces.Dict(
+            {
+                **input_space.spaces,
+                "lidar": spaces.Box(
+                    low=0.0,
+                    high=1.0 / self.lidar_scale,
+                    shape=self.rings_shape,
+                    dtype=self.lidar_dtype,
+                ),
+            }
+        )
+
+    def apply(self, obs: Dict[str, np.ndarray], out: Dict[str, np.ndarray]) -> None:
+        lidar = obs["lidar"]
+        self.rings_def["lidar_to_rings"](lidar.reshape(-1, lidar.shape[-1]), out["lidar"])
+
+
+class NormalizeStage(ObservationStage):
+    """Standardize observations with running statistics of the envs
+
+    Means and variances of each entry are float32 running statistics, updated
+    in place with the batch of observations of each step, using the parallel
+    variant of Welford's algorithm. Normalized observations are float32 and
+    clipped to ``[-clip, clip]``. Statistics are frozen when the stage is not
+    ``training``, see :meth:`ObservationPipeline.train`.
+
+    Args:
+        keys (Sequence[str], optional): normalized entries. Defaults to the
+        lidar and robot entries.
+        clip (float, optional): bound of the normalized observations.
+        Defaults to 10.0.
+        epsilon (float, optional): added to the variances. Defaults to 1e-8.
+    """
+
+    def __init__(
+        self,
+        keys: Sequence[str] = ("lidar", "robot"),
+        clip: float = 10.0,
+        epsilon: float = 1e-8,
+    ) -> None:
+        self.keys = tuple(keys)
+        self.clip = clip
+        self.epsilon = epsilon
+        self.count = 0.0
+        self.mean: Dict[str, np.ndarray] = {}
+        self.var: Dict[str, np.ndarray] = {}
+        self._inv_std: Dict[str, np.ndarray] = {}
+        # Batch means and variances, reused as scratch by the updates
+        self._batch_mean: Dict[str, np.ndarray] = {}
+        self._batch_var: Dict[str, np.ndarray] = {}
+
+    def setup(self, input_space: spaces.Dict) -> spaces.Dict:
+        output_spaces = dict(input_space.spaces)
+        for key in self.keys:
+            shape = input_space[key].shape
+            for stats in [self.mean, self._batch_mean, self._batch_var]:
+                stats[key] = np.zeros(shape, dtype=np.float32)
+            self.var[key] = np.ones(shape, dtype=np.float32)
+            self._inv_std[key] = np.empty(shape, dtype=np.float32)
+            self._update_inv_std(key)
+            output_spaces[key] = spaces.Box(
+                low=-self.clip, high=self.clip, shape=shape, dtype=np.float32
+            )
+        return spaces.Dict(output_spaces)
+
+    def encoded_scale(self, input_scale: float) -> float:
+        # Normalized lidar is unitless, policies use it as is
+        return 1.0
+
+    def _update_inv_std(self, key: str) -> None:
+        inv_std = self._inv_std[key]
+        np.add(self.var[key], self.epsilon, out=inv_std)
+        np.sqrt(inv_std, out=inv_std)
+        np.reciprocal(inv_std, out=inv_std)
+
+    def _update(self, key: str, batch: np.ndarray) -> None:
+        """Merge the statistics of a batch of observations of shape (n, ...)"""
+        n_batch = len(batch)
+        total = self.count + n_batch
+        mean, var = self.mean[key], self.var[key]
+        delta, batch_var = self._batch_mean[key], self._batch_var[key]
+        np.mean(batch, axis=0, dtype=np.float32, out=delta)
+        np.var(batch, axis=0, dtype=np.float32, out=batch_var)
+        np.subtract(delta, mean, out=delta)
+        np.multiply(var, self.count / total, out=var)
+        np.multiply(batch_var, n_batch / total, out=batch_var)
+        np.add(var, batch_var, out=var)
+        np.square(delta, out=batch_var)
+        np.multiply(batch_var, self.count * n_batch / total**2, out=batch_var)
+        np.add(var, batch_var, out=var)
+        np.multiply(delta, n_batch / total, out=delta)
+        np.add(mean, delta, out=mean)
+        self._update_inv_std(key)
+
+    def apply(self, obs: Dict[str, np.ndarray], out: Dict[str, np.ndarray]) -> None:
+        if self.training:
+            for key in self.keys:
+                shape = self.mean[key].shape
+                self._update(key, obs[key].reshape((-1,) + shape))
+            self.count += obs[self.keys[0]].size // self.mean[self.keys[0]].size
+        for key in self.keys:
+            normalized = out[key]
+            np.subtract(obs[key], self.mean[key], out=normalized)
+            np.multiply(normalized, self._inv_std[key], out=normalized)
+            np.clip(normalized, -self.clip, self.clip, out=normalized)
+
+    def state_dict(self) -> Dict[str, np.ndarray]:
+        state = {"count": np.array(self.count)}
+        for key in self.keys:
+            state[f"{key}_mean"] = self.mean[key].copy()
+            state[f"{key}_var"] = self.var[key].copy()
+        return state
+
+    def load_state_dict(self, state: Dict[str, np.ndarray]) -> None:
+        self.count = float(state["count"])
+        for key in self.keys:
+            np.copyto(self.mean[key], state[f"{key}_mean"])
+            np.copyto(self.var[key], state[f"{key}_var"])
+            self._update_inv_std(key)
+
+
+class FrameStackStage(ObservationStage):
+    """Stack the last ``history_len`` lidar frames of each env
+
+    Frames are written into a history of ``4 * history_len`` slots per env
+    and the stacked lidar is a strided view of the last ``history_len``
+    slots, so that stacking copies a single frame per step. Once the history
+    is full, its last frames are moved back to its start, which amounts to a
+    third of a frame per step. Envs starting an episode have their history
+    filled with their first frame. Stacked views are never overwritten by the
+    next step, they stay valid as long as the pipeline buffers.
+
+    Envs restarted alone with :meth:`ObservationPipeline.restart_obs` are
+    given copies, and their first frames are kept aside until the next step,
+    which fills the history of these envs only, in place. Envs announced with
+    :meth:`reset` may still be viewed by the previous observations, such as
+    terminal observations, so the histories of all envs are moved to free
+    slots. Histories share their write position, as the stacked observations
+    of a batch are a single view of the same slots of every history.
+
+    Args:
+        history_len (int): number of stacked frames
+    """
+
+    stateful = True
+
+    def __init__(self, history_len: int) -> None:
+        if history_len < 1:
+            raise ValueError(f"History length {history_len} must be positive")
+        self.history_len = history_len
+        self.capacity = 4 * history_len
+        self._frame_shape: Tuple[int, ...] = ()
+        self._stacked_shape: Tuple[int, ...] = ()
+        self._batch_shape: Tuple[int, ...] = ()
+        # Histories of the envs of shape (n_envs, capacity) + frame shape
+        self._history: Optional[np.ndarray] = None
+        self._restart = np.zeros((0,), dtype=bool)
+        # First frames of the envs restarted alone, stacked at the next step
+        self._first_frames: Optional[np.ndarray] = None
+        self._restarted = np.zeros((0,), dtype=bool)
+        # Slot following the last frame of the histories
+        self._pos = 0
+
+    def setup(self, input_space: spaces.Dict) -> spaces.Dict:
+        lidar_space = input_space["lidar"]
+        self._frame_shape = lidar_space.shape
+        if len(self._frame_shape) == 1:
+            # Frames of flat scans become channels of 1D convolutions
+            self._stacked_shape = (self.history_len,) + self._frame_shape
+        else:
+            self._stacked_shape = (
+                self.history_len * self._frame_shape[0],
+            ) + self._frame_shape[1:]
+        return spaces.Dict(
+            {
+                **input_space.spaces,
+                "lidar": spaces.Box(
+                    low=np.min(lidar_space.low),
+                    high=np.max(lidar_space.high),
+                    shape=self._stacked_shape,
+                    dtype=lidar_space.dtype,
+                ),
+            }
+        )
+
+    def reset(self, env_ids: EnvIndices = None) -> None:
+        if env_ids is None:
+            env_ids = slice(None)
+        self._restart[env_ids] = True
+        self._restarted[env_ids] = False
+
+    def _stacked(self, history: np.ndarray, batch_shape: Tuple[int, ...]) -> np.ndarray:
+        """View of the last frames of histories as stacked observations"""
+        frames = history[:, self._pos - self.history_len : self._pos]
+        return frames.reshape(batch_shape + self._stacked_shape)
+
+    def encode(
+        self,
+        obs: Dict[str, np.ndarray],
+        out: Dict[str, np.ndarray],
+        env_ids: EnvIndices = None,
+    ) -> Dict[str, np.ndarray]:
+        lidar = obs["lidar"]
+        frames = lidar.reshape((-1,) + self._frame_shape)
+        n_len = self.history_len
+        if env_ids is not None:
+            # Restarted envs stack their first frame, written at the next step
+            assert self._first_frames is not None, "Envs must step before restarting"
+            self._first_frames[env_ids] = frames
+            self._restarted[env_ids] = True
+            self._restart[env_ids] = False
+            stacked = np.repeat(frames[:, None], n_len, axis=1)
+            return {"lidar": stacked.reshape((len(frames),) + self._stacked_shape)}
+
+        batch_shape = lidar.shape[: lidar.ndim - len(self._frame_shape)]
+        if self._history is None or batch_shape != self._batch_shape:
+            self._batch_shape = batch_shape
+            self._history = np.empty(
+                (len(frames), self.capacity) + self._frame_shape, lidar.dtype
+            )
+            self._first_frames = np.empty_like(frames)
+            self._restart = np.ones((len(frames),), dtype=bool)
+            self._restarted = np.zeros((len(frames),), dtype=bool)
+            self._pos = 0
+        history, restart, restarted = self._history, self._restart, self._restarted
+        pos = self._pos
+        if not restart.any() and pos < self.capacity:
+            history[:, pos] = frames
+            if restarted.any():
+                # The previous rows of restarted envs were replaced by copies
+                history[restarted, pos - n_len + 1 : pos] = self._first_frames[
+                    restarted, None
+                ]
+                restarted[:] = False
+            self._pos = pos + 1
+            return {"lidar": self._stacked(history, batch_shape)}
+        refill = restart | restarted
+
+        # Move the histories to free slots, away from the last stacked views
+        new_pos = pos + n_len if pos + n_len <= self.capacity else n_len
+        if not refill.all():
+            keep = slice(None) if not refill.any() else ~refill
+            history[keep, new_pos - n_len : new_pos - 1] = history[
+                keep, pos - n_len + 1 : pos
+            ]
+        history[:, new_pos - 1] = frames
+        if restart.any():
+            history[restart, new_pos - n_len : new_pos - 1] = frames[restart, None]
+            restart[:] = False
+        if restarted.any():
+            history[restarted, new_pos - n_len : new_pos - 1] = self._first_frames[
+                restarted, None
+            ]
+            restarted[:] = False
+        self._pos = new_pos
+        return {"lidar": self._stacked(history, batch_shape)}
+
+
+class ObservationPipeline:
+    """Stages applied in turn to single or batched robot observations
+
+    Each stage writes into buffers preallocated for every batch shape seen,
+    the observations of one batch shape are written into two sets of buffers
+    used in turn. An encoded observation thus stays valid until the second
+    next call to :meth:`encode_obs` with the same batch shape, which allows
+    ``info["terminal_observation"]`` to survive the reset following the end
+    of an episode. Entries left untouched by the stages are passed through.
+
+    Stateful stages, such as frame stacking, follow the episodes of the envs
+    of a single env or of a single batch of envs. Envs starting an episode
+    are either announced with :meth:`reset` before encoding the observations
+    of all envs, or encoded alone with :meth:`restart_obs`. Restarted envs are
+    encoded into scratch buffers of their own, so that they never take the
+    turn of the buffers of :meth:`encode_obs`, even for a batch of all envs.
+
+    Args:
+        input_space (spaces.Dict): observation space of the raw observations
+        stages (Sequence[ObservationStage]): stages in order of application
+    """
+
+    def __init__(
+        self,
+        input_space: spaces.Dict,
+        stages: Sequence[ObservationStage] = (),
+    ) -> None:
+        self.input_space = input_space
+        self.stages = list(stages)
+        self.lidar_scale = 1.0
+        self._stage_spaces = []
+        space = input_space
+        for stage in self.stages:
+            space = stage.setup(space)
+            self._stage_spaces.append(space)
+            if "lidar" in stage.keys:
+                self.lidar_scale = stage.encoded_scale(self.lidar_scale)
+        self.observation_space = space
+        self.robot_dim = space["robot"].shape[0]
+        self.encoded_keys = {key for stage in self.stages for key in stage.keys}
+        # Entries last written by a stateful stage, as views of its state
+        self._stateful_keys = set()
+        for stage in self.stages:
+            if stage.stateful:
+                self._stateful_keys.update(stage.keys)
+            else:
+                self._stateful_keys.difference_update(stage.keys)
+        # Last stage writing the lidar, into the ``out`` of encode_obs
+        lidar_stages = [
+            idx for idx, stage in enumerate(self.stages) if "lidar" in stage.keys
+        ]
+        self._lidar_stage = lidar_stages[-1] if lidar_stages else -1
+        self._buffers: Dict[Tuple[int, ...], List[StageBuffers]] = {}
+        self._buffer_idx: Dict[Tuple[int, ...], int] = {}
+        self._restart_buffers: Dict[Tuple[int, ...], StageBuffers] = {}
+        # Entries written by the stages in the last encoded observations
+        self._last_obs: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_config(
+        cls, cfg: RobotConfigs, input_space: spaces.Dict
+    ) -> "ObservationPipeline":
+        """Build the ``observation_stages`` of the ``[lidar]`` config section
+
+        Args:
+            cfg (RobotConfigs): robot configurations
+            input_space (spaces.Dict): observation space of the raw observations
+
+        Returns:
+            ObservationPipeline: pipeline of the configured stages
+        """
+        n_rays = input_space["lidar"].shape[-1]
+        stages: List[ObservationStage] = []
+        for name in cfg.observation_stages:
+            if name not in OBSERVATION_STAGES:
+                raise ValueError(f"Observation stage {name} is not avaliable")
+            if name == "downsample" and cfg.lidar_sectors not in [0, n_rays]:
+                stages.append(DownsampleStage(cfg.lidar_sectors))
+            elif name == "quantize" and cfg.lidar_dtype != "float32":
+                stages.append(QuantizeStage(cfg.lidar_dtype, cfg.lidar_max_range))
+            elif name == "rings":
+                # Rings cells are lossless in uint8, whatever the lidar_dtype
+                stages.append(RingsStage("uint8", cfg.lidar_max_range))
+            elif name == "normalize":
+                stages.append(NormalizeStage(clip=cfg.normalize_clip))
+            elif name == "stack" and cfg.history_len > 1:
+                stages.append(FrameStackStage(cfg.history_len))
+        return cls(input_space, stages)
+
+    def _make_buffers(self, batch_shape: Tuple[int, ...]) -> StageBuffers:
+        """Allocate buffers of each stage for observations of a batch shape"""
+        return [
+            {
+                key: np.empty(batch_shape + space[key].shape, space[key].dtype)
+                for key in stage.keys
+                if not stage.stateful
+            }
+            for stage, space in zip(self.stages, self._stage_spaces)
+        ]
+
+    def _next_buffers(self, batch_shape: Tuple[int, ...]) -> StageBuffers:
+        """Buffers of each stage to write observations of a batch shape into"""
+        if batch_shape not in self._buffers:
+            self._buffers[batch_shape] = [
+                self._make_buffers(batch_shape) for _ in range(2)
+            ]
+            self._buffer_idx[batch_shape] = 0
+        self._buffer_idx[batch_shape] = 1 - self._buffer_idx[batch_shape]
+        return self._buffers[batch_shape][self._buffer_idx[batch_shape]]
+
+    def _scratch_buffers(self, batch_shape: Tuple[int, ...]) -> StageBuffers:
+        """Buffers of each stage to write restarted observations into"""
+        if batch_shape not in self._restart_buffers:
+            self._restart_buffers[batch_shape] = self._make_buffers(batch_shape)
+        return self._restart_buffers[batch_shape]
+
+    def _apply_stages(
+        self,
+        obs: dict,
+        out: Optional[np.ndarray] = None,
+        env_ids: EnvIndices = None,
+    ) -> dict:
+        """Encode observations with every stage, see :meth:`encode_obs`"""
+        encoded_obs = dict(obs)
+        lidar = obs["lidar"]
+        batch_shape = lidar.shape[: lidar.ndim - len(self.input_space["lidar"].shape)]
+        if env_ids is None:
+            stage_buffers = self._next_buffers(batch_shape)
+        else:
+            stage_buffers = self._scratch_buffers(batch_shape)
+        for idx, (stage, buffers) in enumerate(zip(self.stages, stage_buffers)):
+            is_out_stage = out is not None and idx == self._lidar_stage
+            if is_out_stage and not stage.stateful:
+                buffers = {**buffers, "lidar": out}
+            encoded_obs.update(stage.encode(encoded_obs, buffers, env_ids))
+            if is_out_stage and encoded_obs["lidar"] is not out:
+                np.copyto(out, encoded_obs["lidar"])
+                encoded_obs["lidar"] = out
+        return encoded_obs
+
+    def encode_obs(self, obs: dict, out: Optional[np.ndarray] = None) -> dict:
+        """Encode observations from robot lidar
+
+        The observations can either be a single observation or a batch of
+        observations with a leading batch dimension.
+
+        Args:
+            obs (dict): Input observation for encoding
+            out (Optional[np.ndarray], optional): output of the encoded lidar
+            with the pipeline lidar dtype. Defaults to a pipeline buffer, or
+            to the input lidar when no stage encodes it.
+
+        Returns:
+            dict: Encoded observation
+        """
+        if not self.stages:
+            if out is None:
+                return dict(obs)
+            np.copyto(out, obs["lidar"], casting="unsafe")
+            return {**obs, "lidar": out}
+        encoded_obs = self._apply_stages(obs, out)
+        self._last_obs = {
+            key: encoded_obs[key]
+            for key in encoded_obs
+            if key not in obs or encoded_obs[key] is not obs[key]
+        }
+        return encoded_obs
+
+    def reset(self, env_ids: EnvIndices = None) -> None:
+        """Start new episodes at the next observations of the given envs
+
+        Args:
+            env_ids (EnvIndices, optional): envs of the batched observations
+            starting an episode. Defaults to all envs.
+        """
+        for stage in self.stages:
+            stage.reset(env_ids)
+
+    def restart_obs(self, obs: dict, env_ids: EnvIndices) -> dict:
+        """Encode the first observations of envs starting an episode
+
+        The encoded observations replace the rows of the given envs in the
+        last batch of observations encoded by :meth:`encode_obs`. Entries are
+        updated in place, except the entries of stateful stages, which are
+        views shared with the previous observations and are replaced by
+        updated copies.
+
+        Args:
+            obs (dict): Input observations of the given envs
+            env_ids (EnvIndices): envs of the last batch of observations
+
+        Returns:
+            dict: Entries of the last batch of observations written by the
+            stages, with the rows of the given envs replaced
+        """
+        encoded_obs = self._apply_stages(obs, env_ids=env_ids)
+        for key, value in self._last_obs.items():
+            if key in self._stateful_keys:
+                value = self._last_obs[key] = value.copy()
+            value[env_ids] = encoded_obs[key]
+        return dict(self._last_obs)
+
+    def train(self, mode: bool = True) -> None:
+        """Update the statistics of the stages with the next observations, or
+        freeze them
+
+        Args:
+            mode (bool, optional): whether to update the statistics.
+            Defaults to True.
+        """
+        for stage in self.stages:
+            stage.training = mode
+
+    def state_dict(self) -> Dict[str, np.ndarray]:
+        """Statistics of the stages, keyed by stage index"""
+        return {
+            f"stage{idx}_{name}": value
+            for idx, stage in enumerate(self.stages)
+            for name, value in stage.state_dict().items()
+        }
+
+    def load_state_dict(self, state: Dict[str, np.ndarray]) -> None:
+        """Load statistics returned by :meth:`state_dict`"""
+        for idx, stage in enumerate(self.stages):
+            prefix = f"stage{idx}_"
+            stage_state = {
+                name[len(prefix) :]: value
+                for name, value in state.items()
+                if name.startswith(prefix)
+            }
+            if stage_state:
+                stage.load_state_dict(stage_state)
+
+    def save(self, save_path: str) -> None:
+        """Save the statistics of the stages to an .npz file, if any"""
+        state = self.state_dict()
+        if state:
+            np.savez(save_path, **state)
+
+
+def obs_stats_path(model_path: str) -> str:
+    """Path of the observation statistics saved along a robot model"""
+    return f"{model_path}_obs_stats.npz"
+
+
+def get_env_obs_stats(env: Union[gym.Env, VecEnv]) -> Dict[str, np.ndarray]:
+    """Observation statistics of a robot env, or of the first env of a VecEnv
+
+    Only the statistics go through the pipes of subprocess workers, not their
+    pipelines. Each worker keeps its own statistics, workers learning
+    statistics are rejected rather than returning those of the first one.
+    """
+    if isinstance(env, VecEnv) and not hasattr(env, "encoder"):
+        state = env.env_method("get_obs_stats", indices=0)[0]
+        if env.num_envs > 1 and state:
+            raise ValueError(
+                "Observation statistics of subprocess workers cannot be merged"
+            )
+        return state
+    return env.encoder.state_dict()  # type: ignore
+
+
+def save_env_obs_stats(env: Union[gym.Env, VecEnv], save_path: str) -> None:
+    """Save the observation statistics of a robot env or VecEnv to an .npz
+    file, if any"""
+    state = get_env_obs_stats(env)
+    if state:
+        np.savez(save_path, **state)
+
+
+def load_env_obs_stats(env: Union[gym.Env, VecEnv], load_path: str) -> None:
+    """Load observation statistics saved along a robot model into the
+    pipelines of a robot env or VecEnv, if the file exists"""
+    if not path.exists(load_path):
+        return
+    with np.load(load_path) as saved_state:
+        state = dict(saved_state)
+    if isinstance(env, VecEnv) and not hasattr(env, "encoder"):
+        env.env_method("load_obs_stats", state)
+        return
+    env.encoder.load_state_dict(state)  # type: ignore
@@ -1,7 +1,8 @@
 """Implementation of Robot Environment"""
 
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 import threading
+import math
 import time
 import argparse
 import logging
@@ -9,21 +10,25 @@ import pandas as pd
 from configparser import RawConfigParser
 from os import path, mkdir
 import numpy as np
-from CMap2D import render_contours_in_lidar  # pylint: disable=no-name-in-module
 from gym import Env, spaces
-from gym.envs.classic_control import rendering
 import pyglet
-from pyglet import gl
 from pose2d import apply_tf_to_vel, inverse_pose2d, apply_tf_to_pose
 
 from highrl.obstacle.single_obstacle import SingleObstacle
 from highrl.utils.action import ActionXY
 from highrl.agents.robot import Robot
-from highrl.obstacle.obstacles import Obstacles
+from highrl.obstacle.obstacles import (
+    BORDER_LAYER,
+    SESSION_LAYER,
+    LayeredObstacleSet,
+    ObstacleSet,
+)
 from highrl.utils import Position
 from highrl.utils.general import configure_robot
 from highrl.configs import colors
 from highrl.utils.robot_utils import RobotOpt
+from highrl.lidar_setup.sensor import LidarSensor
+from highrl.envs.observation_pipeline import ObservationPipeline
 
 
 _LOG = logging.getLogger(__name__)
@@ -41,21 +46,12 @@ class RobotEnv(Env):
         self,
         config: RawConfigParser,
         args: argparse.Namespace,
+        observation_stages: Optional[List[str]] = None,
     ) -> None:
         super().__init__()
         self.action_space = spaces.Box(low=-1, high=1, shape=(2,), dtype=np.float32)
-        self.observation_space = spaces.Dict(
-            {
-                "lidar": spaces.Box(
-                    low=-np.inf, high=np.inf, shape=(1080,), dtype=np.float32
-                ),
-                "robot": spaces.Box(
-                    low=-np.inf, high=np.inf, shape=(5,), dtype=np.float32
-                ),
-            }
-        )
 
-        self.obstacles = Obstacles()
+        self.obstacles = LayeredObstacleSet()
         self.robot = Robot()
         self.viewer = None
         # Results of each episode
@@ -64,11 +60,64 @@ class RobotEnv(Env):
 
         self.done = False
 
-        self.cfg = configure_robot(config, args.env_render_path)
+        self.cfg = configure_robot(config, args.env_render_path, observation_stages)
         self.opt = RobotOpt()
         self.opt.set_tb_writer(self.tensorboard_dir)
         self.robot.set_radius(self.cfg.robot_radius, self.cfg.goal_radius)
         self.add_border_obstacles()
+        self.lidar = LidarSensor(self.cfg)
+        self.observation_space = spaces.Dict(
+            {
+                "lidar": self.lidar.observation_space,
+                "robot": spaces.Box(
+                    low=-np.inf, high=np.inf, shape=(5,), dtype=np.float32
+                ),
+            }
+        )
+        # Stages of the ``[lidar]`` config encoding the returned observations
+        self.encoder = ObservationPipeline.from_config(self.cfg, self.observation_space)
+        self.observation_space = self.encoder.observation_space
+
+        # Preallocated observation buffers, only used with ``reuse_obs_buffers``
+        self._obs_buffers: List[dict] = []
+        self._buffer_idx = 0
+        if self.cfg.reuse_obs_buffers:
+            self._obs_buffers = [
+                {
+                    "lidar": np.zeros(self.lidar.observation_shape, dtype=np.float32),
+                    "robot": np.zeros((5,), dtype=np.float32),
+                }
+                for _ in range(2)
+            ]
+            self._lidar_pos = np.zeros((3,), dtype=np.float32)
+
+    @property
+    def total_steps(self) -> int:
+        """Getter for the number of steps taken in the current session"""
+        return self.opt.total_steps
+
+    @property
+    def num_successes(self) -> int:
+        """Getter for the number of successes in the current session"""
+        return self.opt.num_successes
+
+    @property
+    def episode_reward(self) -> float:
+        """Getter for the reward of the current episode"""
+        return self.opt.episode_reward
+
+    @property
+    def episode_statistics(self) -> pd.DataFrame:
+        """Getter for the statistics collected at each step"""
+        return self.opt.episode_statistics
+
+    def get_obs_stats(self) -> Dict[str, np.ndarray]:
+        """Getter for the statistics learned by the observation pipeline"""
+        return self.encoder.state_dict()
+
+    def load_obs_stats(self, state: Dict[str, np.ndarray]) -> None:
+        """Load statistics returned by :meth:`get_obs_stats`"""
+        self.encoder.load_state_dict(state)
 
     def step(self, action: np.ndarray) -> Tuple:
         """Step into a new state using an action given by the robot model
@@ -131,7 +180,8 @@ class RobotEnv(Env):
             )
             self.results.append(result)
 
-        return self._make_obs(), self.opt.reward, self.done, {}
+        obs = self.encoder.encode_obs(self._make_obs())
+        return obs, self.opt.reward, self.done, {}
 
     def __get_reward(self) -> float:
         """Calculates current reward
@@ -173,10 +223,28 @@ class RobotEnv(Env):
         self.robot.set_position(robot_pos)
         self.robot.set_goal_position(goal_pos)
 
+    def load_session(
+        self,
+        obstacles: ObstacleSet,
+        robot_pos: Position,
+        goal_pos: Position,
+    ) -> None:
+        """Prepares a new robot session generated by the ``teacher``
+
+        Args:
+            obstacles (ObstacleSet): Obstacles of the session, replacing the session layer
+            robot_pos (Position): Position of the robot
+            goal_pos (Position): Position of the goal
+        """
+        self.obstacles.set_layer(SESSION_LAYER, obstacles)
+        self.set_robot_position(robot_pos, goal_pos)
+        self.opt.is_initial_state = True
+        self.opt.num_successes = 0
+
     def add_border_obstacles(self) -> None:
         """Creates border obstacles to limit the allowable navigation area"""
         # fmt: off
-        self.obstacles = Obstacles([
+        self.obstacles.set_layer(BORDER_LAYER, [
                 SingleObstacle(-self.cfg.epsilon, 0, self.cfg.epsilon, self.cfg.height),  # left obstacle
                 SingleObstacle(0, -self.cfg.epsilon, self.cfg.width, self.cfg.epsilon),  # bottom obstacle
                 SingleObstacle(self.cfg.width, 0, self.cfg.epsilon, self.cfg.height),  # right obstacle
@@ -189,22 +257,12 @@ class RobotEnv(Env):
         Returns:
             dict: robot observation
         """
+        if self.cfg.reuse_obs_buffers:
+            return self._make_obs_in_buffers()
         robot = self.robot
         lidar_pos = np.array([robot.x_pos, robot.y_pos, robot.theta], dtype=np.float32)
-        ranges = np.ones((self.cfg.n_angles,), dtype=np.float32)
-        ranges.fill(25.0)
-        angles = (
-            np.linspace(
-                self.cfg.lidar_min_angle,
-                self.cfg.lidar_max_angle - self.cfg.lidar_angle_increment,
-                self.cfg.n_angles,
-            )
-            + lidar_pos[2]
-        )
-        render_contours_in_lidar(ranges, angles, self.opt.flat_contours, lidar_pos[:2])
-
-        self.opt.lidar_scan = ranges
-        self.opt.lidar_angles = angles
+        self.opt.lidar_scan = self.lidar.scan(lidar_pos)
+        self.opt.lidar_angles = self.lidar.angles + lidar_pos[2]
 
         baselink_in_world = np.array([robot.x_pos, robot.y_pos, robot.theta])
         world_in_baselink = inverse_pose2d(baselink_in_world)
@@ -216,6 +274,43 @@ class RobotEnv(Env):
 
         return {"lidar": self.opt.lidar_scan, "robot": robotstate_obs}
 
+    def _make_obs_in_buffers(self) -> dict:
+        """Creates robot observation without allocating new arrays.
+
+        Same observation as :meth:`_make_obs`, written into the next of two
+        preallocated float32 buffers. The robot frame transform of
+        ``pose2d`` is applied with scalar math. Returned arrays are views
+        that stay valid until the second next call to ``step``/``reset``,
+        which allows ``info["terminal_observation"]`` to survive the reset
+        following the end of an episode.
+
+        Returns:
+            dict: robot observation
+        """
+        robot = self.robot
+        self._buffer_idx = 1 - self._buffer_idx
+        obs = self._obs_buffers[self._buffer_idx]
+
+        lidar_pos = self._lidar_pos
+        lidar_pos[0] = robot.x_pos
+        lidar_pos[1] = robot.y_pos
+        lidar_pos[2] = robot.theta
+        self.opt.lidar_scan = self.lidar.scan(lidar_pos, obs["lidar"])
+
+        # Goal and velocity in the robot frame, see ``inverse_pose2d``
+        cos_th = math.cos(-robot.theta)
+        sin_th = math.sin(-robot.theta)
+        inv_x = cos_th * -robot.x_pos + -sin_th * -robot.y_pos
+        inv_y = sin_th * -robot.x_pos + cos_th * -robot.y_pos
+        robot_obs = obs["robot"]
+        robot_obs[0] = cos_th * robot.gpos.x + -sin_th * robot.gpos.y + inv_x
+        robot_obs[1] = sin_th * robot.gpos.x + cos_th * robot.gpos.y + inv_y
+        robot_obs[2] = cos_th * robot.vx + -sin_th * robot.vy
+        robot_obs[3] = sin_th * robot.vx + cos_th * robot.vy
+        robot_obs[4] = 0.0
+        # The encoder replaces entries of the returned dict, not of the buffers
+        return dict(obs)
+
     def render(
         self,
         mode="human",
@@ -236,6 +331,12 @@ class RobotEnv(Env):
                 self.viewer.close()
             return False
 
+        # Importing the viewer opens a GL context, so headless workers
+        # only pay for it once they actually render.
+        # pylint: disable=import-outside-toplevel
+        from gym.envs.classic_control import rendering
+        from pyglet import gl
+
         # Create viewer
         if self.viewer is None:
             self.viewer = rendering.Viewer(self.cfg.width, self.cfg.height)
@@ -366,10 +467,16 @@ class RobotEnv(Env):
         Returns:
             bool: flag to check collisions. Ouputs True if there is collision
         """
-        collision_flag = False
-        for obstacle in self.obstacles.obstacles_list:
-            collision_flag |= self.robot.is_overlapped(obstacle=obstacle)
-        return collision_flag
+        # The overlap check truncates the obstacles boxes to integers, which
+        # moves them by less than one, candidates are searched one unit farther
+        margin = self.robot.radius + 1
+        pos_x, pos_y = self.robot.pos.x, self.robot.pos.y
+        candidates = self.obstacles.spatial_index().query_box(
+            [pos_x - margin, pos_y - margin, pos_x + margin, pos_y + margin]
+        )
+        return any(
+            self.robot.is_overlapped(obstacle=self.obstacles[idx]) for idx in candidates
+        )
 
     def _to_actionxy_format(self, action: np.ndarray) -> ActionXY:
         """Converts action array into action `ActionXY` object"""
@@ -383,7 +490,10 @@ class RobotEnv(Env):
         """
         if self.done or self.opt.is_initial_state:
             _LOG.info("Reseting robot env ...")
-            self.robot.set_position(self.opt.robot_init_pos)
+            # Copy the initial position, otherwise stepping the robot moves
+            # the stored initial position along with it.
+            init_pos = self.opt.robot_init_pos
+            self.robot.set_position(Position[float](init_pos.x, init_pos.y))
             self.robot.set_goal_position(self.opt.goal_init_pos)
             self.opt.total_reward += self.opt.episode_reward
             if self.opt.is_initial_state:
@@ -400,4 +510,6 @@ class RobotEnv(Env):
                 self.opt.flat_contours,
                 self.opt.contours,
             ) = self.obstacles.get_flatten_contours()
-        return self._make_obs()
+            self.lidar.set_obstacles(self.obstacles)
+            self.encoder.reset()
+        return self.encoder.encode_obs(self._make_obs())
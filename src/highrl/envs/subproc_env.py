@@ -0,0 +1,363 @@
+"""Implementation of a process pool of robot environments sharing observation memory"""
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type, Union
+import multiprocessing as mp
+import traceback
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Connection
+import gym
+import numpy as np
+from stable_baselines3.common.vec_env.base_vec_env import (
+    CloudpickleWrapper,
+    VecEnv,
+    VecEnvIndices,
+    VecEnvObs,
+    VecEnvStepReturn,
+)
+
+# Shared array description: (shared memory name, shape, dtype)
+SharedArraySpec = Tuple[str, Tuple[int, ...], str]
+
+
+class _RemoteTraceback(Exception):
+    """Traceback of an exception raised in a worker, chained to the exception"""
+
+    def __init__(self, tb: str) -> None:
+        super().__init__(tb)
+        self.tb = tb
+
+    def __str__(self) -> str:
+        return self.tb
+
+
+class _WorkerError:
+    """Exception raised by a worker while running a command, sent in place of
+    the command result"""
+
+    def __init__(self, error: Exception) -> None:
+        self.error = error
+        self.tb = "".join(
+            traceback.format_exception(type(error), error, error.__traceback__)
+        )
+
+
+def _recv(remote: Connection) -> Any:
+    """Receive the result of a command, raising the exception of the worker"""
+    result = remote.recv()
+    if isinstance(result, _WorkerError):
+        raise result.error from _RemoteTraceback(result.tb)
+    return result
+
+
+def _recv_all(remotes: Sequence[Connection]) -> List[Any]:
+    """Receive the results of all the workers before raising the first
+    exception, so that no result is left in the pipes"""
+    results = [remote.recv() for remote in remotes]
+    for result in results:
+        if isinstance(result, _WorkerError):
+            raise result.error from _RemoteTraceback(result.tb)
+    return results
+
+
+def attach_shared_arrays(
+    specs: Dict[str, SharedArraySpec],
+) -> Tuple[List[shared_memory.SharedMemory], Dict[str, np.ndarray]]:
+    """Attach to shared memory blocks created by another process
+
+    Args:
+        specs (Dict[str, SharedArraySpec]): Description of the arrays by key
+
+    Returns:
+        Tuple[List[shared_memory.SharedMemory], Dict[str, np.ndarray]]: Memory
+        blocks, which must be kept alive, and the arrays viewing them
+    """
+    blocks = []
+    arrays = {}
+    for key, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        arrays[key] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    return blocks, arrays
+
+
+def _worker(
+    remote: Connection,
+    parent_remote: Connection,
+    env_fn_wrapper: CloudpickleWrapper,
+    env_idx: int,
+) -> None:
+    """Runs one robot environment and writes its results into shared memory.
+
+    Observations, rewards and dones are written at row ``env_idx`` of the
+    buffer selected by the parent, only infos go through the pipe. Exceptions
+    raised by a command are sent back to the parent, which raises them.
+    """
+    # Import here to avoid a circular import
+    from stable_baselines3.common.env_util import (  # pylint: disable=import-outside-toplevel
+        is_wrapped,
+    )
+
+    parent_remote.close()
+    env = env_fn_wrapper.var()
+    blocks: List[shared_memory.SharedMemory] = []
+    arrays: Dict[str, np.ndarray] = {}
+
+    def write_obs(obs: dict, buffer_idx: int) -> None:
+        for key, value in obs.items():
+            arrays[key][buffer_idx, env_idx] = value
+
+    while True:
+        try:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                action, buffer_idx = data
+                obs, reward, done, info = env.step(action)
+                if done:
+                    # save final observation where user can get it, then reset
+                    info["terminal_observation"] = obs
+                    obs = env.reset()
+                write_obs(obs, buffer_idx)
+                arrays["_rewards"][buffer_idx, env_idx] = reward
+                arrays["_dones"][buffer_idx, env_idx] = done
+                remote.send(info)
+            elif cmd == "reset":
+                write_obs(env.reset(), data)
+                remote.send(None)
+            elif cmd == "attach":
+                blocks, arrays = attach_shared_arrays(data)
+                remote.send(None)
+            elif cmd == "get_spaces":
+                remote.send((env.observation_space, env.action_space))
+            elif cmd == "seed":
+                remote.send(env.seed(data))
+            elif cmd == "env_method":
+                method = getattr(env, data[0])
+                remote.send(method(*data[1], **data[2]))
+            elif cmd == "get_attr":
+                remote.send(getattr(env, data))
+            elif cmd == "set_attr":
+                remote.send(setattr(env, data[0], data[1]))
+            elif cmd == "is_wrapped":
+                remote.send(is_wrapped(env, data))
+            elif cmd == "close":
+                try:
+                    env.close()
+                finally:
+                    arrays.clear()
+                    for block in blocks:
+                        block.close()
+                    remote.close()
+                break
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+        except EOFError:
+            break
+        except Exception as error:  # pylint: disable=broad-except
+            try:
+                remote.send(_WorkerError(error))
+            except Exception:  # pylint: disable=broad-except
+                # The exception itself cannot be pickled
+                remote.send(_WorkerError(RuntimeError(repr(error))))
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """Process pool of robot environments writing into shared memory.
+
+    Each environment runs in its own process like SB3 ``SubprocVecEnv``, but
+    observations, rewards and dones are written by the workers straight into
+    ``multiprocessing.shared_memory`` arrays instead of being pickled through
+    the pipes. The parent only sends actions and control messages, and
+    receives the (usually empty) infos.
+
+    Like :class:`highrl.envs.vec_env.RobotVecEnv`, two sets of buffers are
+    used in turn, so an observation stays valid until the second next call
+    to ``step``/``reset``.
+
+    Args:
+        env_fns (List[Callable[[], gym.Env]]): Functions creating the environments,
+        their observation space must be a ``spaces.Dict`` of boxes
+        start_method (Optional[str], optional): Method used to start the workers.
+        Defaults to ``forkserver`` when available and ``spawn`` otherwise.
+    """
+
+    def __init__(
+        self,
+        env_fns: List[Callable[[], gym.Env]],
+        start_method: Optional[str] = None,
+    ) -> None:
+        self.waiting = False
+        self.closed = False
+        n_envs = len(env_fns)
+
+        if start_method is None:
+            # Same default as SB3 ``SubprocVecEnv``, fork is not thread safe
+            forkserver_available = "forkserver" in mp.get_all_start_methods()
+            start_method = "forkserver" if forkserver_available else "spawn"
+        ctx = mp.get_context(start_method)
+        if start_method == "forkserver":
+            # Workers inherit the rings definitions created by the server
+            ctx.set_forkserver_preload(["highrl.lidar_setup.rings"])  # type: ignore[attr-defined]
+        # Workers must share the resource tracker of this process, otherwise
+        # their own trackers unlink the shared memory when they exit
+        resource_tracker.ensure_running()
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_envs)])
+        self.processes = []
+        for env_idx, (work_remote, remote, env_fn) in enumerate(
+            zip(self.work_remotes, self.remotes, env_fns)
+        ):
+            args = (work_remote, remote, CloudpickleWrapper(env_fn), env_idx)
+            # daemon=True: if the main process crashes, we should not cause things to hang
+            process = ctx.Process(target=_worker, args=args, daemon=True)  # type: ignore[attr-defined]
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        self.remotes[0].send(("get_spaces", None))
+        observation_space, action_space = _recv(self.remotes[0])
+        super().__init__(n_envs, observation_space, action_space)
+
+        shapes = {
+            key: (space.shape, space.dtype)
+            for key, space in observation_space.spaces.items()  # type: ignore
+        }
+        shapes["_rewards"] = ((), np.dtype(np.float32))
+        shapes["_dones"] = ((), np.dtype(bool))
+        self._blocks: List[shared_memory.SharedMemory] = []
+        specs: Dict[str, SharedArraySpec] = {}
+        for key, (shape, dtype) in shapes.items():
+            buffer_shape = (2, n_envs) + tuple(shape)
+            nbytes = max(int(np.prod(buffer_shape)) * dtype.itemsize, 1)
+            block = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._blocks.append(block)
+            specs[key] = (block.name, buffer_shape, dtype.str)
+        self._arrays = {
+            key: np.ndarray(shape, dtype=dtype, buffer=block.buf)
+            for block, (key, (_, shape, dtype)) in zip(self._blocks, specs.items())
+        }
+        for remote in self.remotes:
+            remote.send(("attach", specs))
+        _recv_all(self.remotes)
+
+        self._obs_keys = list(observation_space.spaces.keys())  # type: ignore
+        self._buffer_idx = 0
+
+    def _next_buffer(self) -> int:
+        """Select the buffer written by the next step or reset"""
+        self._buffer_idx = 1 - self._buffer_idx
+        return self._buffer_idx
+
+    def _read_obs(self, buffer_idx: int) -> Dict[str, np.ndarray]:
+        """Views of the observations stored in the given shared buffer"""
+        return {key: self._arrays[key][buffer_idx] for key in self._obs_keys}
+
+    def step_async(self, actions: np.ndarray) -> None:
+        """Send actions to the workers"""
+        buffer_idx = self._next_buffer()
+        for remote, action in zip(self.remotes, actions):
+            remote.send(("step", (action, buffer_idx)))
+        self.waiting = True
+
+    def step_wait(self) -> VecEnvStepReturn:
+        """Wait for the workers to write their step results
+
+        Returns:
+            VecEnvStepReturn: observations, rewards, dones, infos
+        """
+        self.waiting = False
+        infos = _recv_all(self.remotes)
+        buffer_idx = self._buffer_idx
+        return (
+            self._read_obs(buffer_idx),
+            self._arrays["_rewards"][buffer_idx].copy(),
+            self._arrays["_dones"][buffer_idx].copy(),
+            infos,
+        )
+
+    def reset(self) -> VecEnvObs:
+        """Reset all environments
+
+        Returns:
+            VecEnvObs: Stacked observations
+        """
+        buffer_idx = self._next_buffer()
+        for remote in self.remotes:
+            remote.send(("reset", buffer_idx))
+        _recv_all(self.remotes)
+        return self._read_obs(buffer_idx)
+
+    def seed(self, seed: Optional[int] = None) -> List[Union[None, int]]:
+        """Seed each environment with an incremented seed"""
+        if seed is None:
+            seed = np.random.randint(0, 2**32 - 1)
+        for idx, remote in enumerate(self.remotes):
+            remote.send(("seed", seed + idx))
+        return _recv_all(self.remotes)
+
+    def close(self) -> None:
+        """Stop the workers and release the shared memory"""
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self._arrays.clear()
+        for block in self._blocks:
+            block.unlink()
+            try:
+                block.close()
+            except BufferError:
+                # Observations returned earlier still view the memory, which
+                # is unmapped once they are garbage collected
+                pass
+        self.closed = True
+
+    def get_attr(self, attr_name: str, indices: VecEnvIndices = None) -> List[Any]:
+        """Return attribute from the environments"""
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("get_attr", attr_name))
+        return _recv_all(target_remotes)
+
+    def set_attr(
+        self,
+        attr_name: str,
+        value: Any,
+        indices: VecEnvIndices = None,
+    ) -> None:
+        """Set attribute inside the environments"""
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("set_attr", (attr_name, value)))
+        _recv_all(target_remotes)
+
+    def env_method(
+        self,
+        method_name: str,
+        *method_args,
+        indices: VecEnvIndices = None,
+        **method_kwargs,
+    ) -> List[Any]:
+        """Call a method of the environments"""
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("env_method", (method_name, method_args, method_kwargs)))
+        return _recv_all(target_remotes)
+
+    def env_is_wrapped(
+        self,
+        wrapper_class: Type[gym.Wrapper],
+        indices: VecEnvIndices = None,
+    ) -> List[bool]:
+        """Check if the environments are wrapped with a given wrapper"""
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("is_wrapped", wrapper_class))
+        return _recv_all(target_remotes)
+
+    def _get_target_remotes(self, indices: VecEnvIndices) -> Sequence[Connection]:
+        """Get the connections of the workers of the given environments"""
+        return [self.remotes[idx] for idx in self._get_indices(indices)]
@@ -1,16 +1,23 @@
 """Implementation of Teacher Environment"""
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 import argparse
 import logging
+from functools import partial
 from random import uniform
 import pandas as pd
 from configparser import RawConfigParser
 from gym import Env, spaces
 import numpy as np
 from prettytable import PrettyTable
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
 from highrl.utils.abstract import Position
-from highrl.envs import env_encoders as env_enc
-from highrl.utils.general import configure_teacher
+from highrl.envs.robot_env import RobotEnv
+from highrl.envs.eval_env import RobotEvalEnv
+from highrl.envs.vec_env import RobotVecEnv
+from highrl.envs.subproc_env import SharedMemoryVecEnv
+from highrl.obstacle.coalesce import CoalescingStats, coalesce_obstacles
+from highrl.obstacle.obstacles import SESSION_LAYER
+from highrl.utils.general import configure_robot, configure_teacher
 from highrl.utils import training_utils as train_utils
 from highrl.utils import teacher_utils as teach_utils
 
@@ -28,6 +35,7 @@ class TeacherEnv(Env):
     techr_rwrd_grph_name: str = "teacher_reward"
     rob_num_suc_grph_name: str = "robot_num_successes"
     rob_lvl_grph_name: str = "robot_level"
+    elim_obs_grph_name: str = "teacher_eliminated_obstacles"
     action_space_names: List[str] = ["robot_x", "robot_y", "goal_x", "goal_y"]
 
     def __init__(
@@ -69,20 +77,79 @@ class TeacherEnv(Env):
         if self.cfg.lidar_mode not in ["flat", "rings"]:
             raise ValueError(f"Lidar mode {self.cfg.lidar_mode} is not avaliable")
 
-        if self.cfg.lidar_mode == "flat":
-            robot_env = env_enc.RobotEnv1DPlayer(config=robot_config, args=self.args)
-            eval_env = env_enc.EvalEnv1DPlayer(config=eval_config, args=self.args)
+        if self.cfg.worker_backend not in ["vectorized", "subproc"]:
+            raise ValueError(
+                f"Worker backend {self.cfg.worker_backend} is not avaliable"
+            )
 
-        else:
-            robot_env = env_enc.RobotEnv2DPlayer(config=robot_config, args=self.args)
-            eval_env = env_enc.EvalEnv2DPlayer(config=eval_config, args=self.args)
+        robot_stages = configure_robot(robot_config, "").observation_stages
+        eval_stages = configure_robot(eval_config, "").observation_stages
+        if (
+            "normalize" in robot_stages
+            and self.cfg.n_robot_envs > 1
+            and self.cfg.worker_backend == "subproc"
+        ):
+            # Each worker would learn its own statistics, and only the
+            # statistics of the first one would be saved
+            raise ValueError(
+                "Observations of subproc workers cannot be normalized, "
+                "use the vectorized worker backend"
+            )
+
+        if self.cfg.lidar_mode == "rings":
+            robot_stages = self._rings_stages(robot_stages)
+            eval_stages = self._rings_stages(eval_stages)
+        eval_env = RobotEvalEnv(
+            config=eval_config, args=self.args, observation_stages=eval_stages
+        )
+        robot_env = RobotEnv(
+            config=robot_config, args=self.args, observation_stages=robot_stages
+        )
+
+        robot_vec_env: Optional[VecEnv] = None
+        if self.cfg.n_robot_envs > 1 and self.cfg.worker_backend == "vectorized":
+            robot_vec_env = RobotVecEnv(
+                config=robot_config,
+                args=self.args,
+                n_envs=self.cfg.n_robot_envs,
+                observation_stages=robot_stages,
+            )
+        elif self.cfg.n_robot_envs > 1:
+            robot_vec_env = SharedMemoryVecEnv(
+                [
+                    partial(
+                        RobotEnv,
+                        config=robot_config,
+                        args=self.args,
+                        observation_stages=robot_stages,
+                    )
+                    for _ in range(self.cfg.n_robot_envs)
+                ]
+            )
 
         self.opt = train_utils.TeacherMetrics(
             robot_env=robot_env,
             eval_env=eval_env,
+            robot_vec_env=robot_vec_env,
             desired_difficulty=self.cfg.base_difficulty,
         )
 
+    @staticmethod
+    def _rings_stages(stages: List[str]) -> List[str]:
+        """Rings of the full scans, unless the stages already make rings
+
+        Args:
+            stages (List[str]): configured observation stages
+
+        Returns:
+            List[str]: observation stages of the rings lidar mode
+        """
+        if "rings" in stages:
+            return stages
+        return ["rings"] + [
+            stage for stage in stages if stage not in ["downsample", "quantize"]
+        ]
+
     def _get_robot_metrics(self) -> None:
         """Calculates and prints training session results indicating how well the robot performed
         during this session. This is done for every robot trainig session created by the teacher.
@@ -153,6 +220,8 @@ class TeacherEnv(Env):
             self.opt.difficulty_obs,
             self.robot_metrics.level,
             self.opt.robot_env.opt.num_successes,
+            self.opt.obstacles_stats.n_obstacles,
+            self.opt.obstacles_stats.n_eliminated,
         ]
 
         self.opt.tb_writer.add_scalar(
@@ -170,6 +239,11 @@ class TeacherEnv(Env):
             self.robot_metrics.level,
             self.opt.time_steps,
         )
+        self.opt.tb_writer.add_scalar(
+            self.elim_obs_grph_name,
+            self.opt.obstacles_stats.n_eliminated,
+            self.opt.time_steps,
+        )
 
     def step(self, action: List) -> Tuple:
         """Step into the new state using an action given by the teacher model
@@ -192,8 +266,11 @@ class TeacherEnv(Env):
         )
 
         obstacles = teach_utils.get_obstacles_from_action(action, self.opt, self.cfg)
-        for obstacle in obstacles:
-            self.opt.robot_env.obstacles.obstacles_list.append(obstacle)
+        if self.cfg.coalesce_obstacles:
+            obstacles, self.opt.obstacles_stats = coalesce_obstacles(obstacles)
+        else:
+            self.opt.obstacles_stats = CoalescingStats(n_obstacles=len(obstacles))
+        self.opt.robot_env.obstacles.set_layer(SESSION_LAYER, obstacles)
 
         self.opt.robot_env.set_robot_position(robot_pos, goal_pos)
         self.opt.robot_env.opt.is_initial_state = True
@@ -0,0 +1,188 @@
+"""Implementation of a Stable-Baselines3 vectorized environment for robots"""
+from typing import Any, Dict, List, Optional, Type, Union
+import argparse
+import inspect
+from configparser import RawConfigParser
+import gym
+import numpy as np
+from stable_baselines3.common.vec_env.base_vec_env import (
+    VecEnv,
+    VecEnvIndices,
+    VecEnvObs,
+    VecEnvStepReturn,
+)
+
+from highrl.envs.batched_env import BatchedRobotEnv
+from highrl.envs.observation_pipeline import ObservationPipeline
+
+
+class RobotVecEnv(VecEnv):
+    """Vectorized robot environment stepping all robots with one batched call.
+
+    Unlike ``DummyVecEnv``, which loops over ``n_envs`` python environments,
+    the robots states live in a single :class:`BatchedRobotEnv`. Robots that
+    finish an episode are reset automatically and their last observation is
+    stored in ``info["terminal_observation"]``.
+
+    Observations are encoded into two preallocated sets of buffers used in
+    turn, so an observation stays valid until the second next call to
+    ``step``/``reset``. SB3 on-policy algorithms only keep the previous
+    observation around, which makes this safe for them. Entries encoded by
+    the pipeline stages live in the pipeline buffers, the other entries are
+    copied into buffers of the vectorized env.
+    """
+
+    def __init__(
+        self,
+        config: RawConfigParser,
+        args: argparse.Namespace,
+        n_envs: int = 1,
+        encoder: Optional[ObservationPipeline] = None,
+        observation_stages: Optional[List[str]] = None,
+    ) -> None:
+        self.env = BatchedRobotEnv(
+            config, args, n_envs=n_envs, observation_stages=observation_stages
+        )
+        if encoder is None:
+            encoder = ObservationPipeline.from_config(
+                self.env.cfg, self.env.observation_space
+            )
+        self.encoder = encoder
+        super().__init__(n_envs, self.encoder.observation_space, self.env.action_space)
+
+        self._obs_buffers = [
+            {
+                key: np.zeros((n_envs,) + space.shape, dtype=space.dtype)
+                for key, space in self.observation_space.spaces.items()  # type: ignore
+                if key not in self.encoder.encoded_keys
+            }
+            for _ in range(2)
+        ]
+        self._buffer_idx = 0
+        self._actions: Optional[np.ndarray] = None
+
+    def _write_obs(self, obs: dict) -> Dict[str, np.ndarray]:
+        """Encode observations into the next preallocated buffers
+
+        Args:
+            obs (dict): Stacked observations of the batched environment
+
+        Returns:
+            Dict[str, np.ndarray]: Encoded observations
+        """
+        self._buffer_idx = 1 - self._buffer_idx
+        encoded_obs = self.encoder.encode_obs(dict(obs))
+        for key, buffer in self._obs_buffers[self._buffer_idx].items():
+            np.copyto(buffer, encoded_obs[key], casting="unsafe")
+            encoded_obs[key] = buffer
+        return encoded_obs
+
+    def _restart_obs(
+        self, encoded_obs: Dict[str, np.ndarray], obs: dict, env_ids: np.ndarray
+    ) -> None:
+        """Replace the last encoded observations of robots starting an episode
+
+        Args:
+            encoded_obs (Dict[str, np.ndarray]): Last encoded observations,
+            updated with the restarted robots
+            obs (dict): Stacked observations of the batched environment
+            env_ids (np.ndarray): Robots starting an episode
+        """
+        encoded_obs.update(
+            self.encoder.restart_obs(
+                {key: value[env_ids] for key, value in obs.items()}, env_ids
+            )
+        )
+        for key, buffer in self._obs_buffers[self._buffer_idx].items():
+            buffer[env_ids] = obs[key][env_ids]
+
+    def reset(self) -> VecEnvObs:
+        """Reset all robots which are done or in their initial state
+
+        Returns:
+            VecEnvObs: Stacked observations
+        """
+        self.encoder.reset()
+        return self._write_obs(self.env.reset())
+
+    def step_async(self, actions: np.ndarray) -> None:
+        """Store actions to be applied by :meth:`step_wait`"""
+        self._actions = actions
+
+    def step_wait(self) -> VecEnvStepReturn:
+        """Step all robots and automatically reset the finished ones
+
+        Returns:
+            VecEnvStepReturn: observations, rewards, dones, infos
+        """
+        obs, rewards, dones, infos = self.env.step(self._actions)  # type: ignore
+        dones = dones.copy()
+        rewards = rewards.astype(np.float32)
+        encoded_obs = self._write_obs(obs)
+        done_indices = np.flatnonzero(dones)
+        if len(done_indices) > 0:
+            for env_idx in done_indices:
+                infos[env_idx]["terminal_observation"] = {
+                    key: value[env_idx].copy() for key, value in encoded_obs.items()
+                }
+            self._restart_obs(encoded_obs, self.env.reset(done_indices), done_indices)
+        return encoded_obs, rewards, dones, infos
+
+    def close(self) -> None:
+        """Close the tensorboard writer of the environment"""
+        self.env.opt.tb_writer.close()
+
+    def seed(self, seed: Optional[int] = None) -> List[Union[None, int]]:
+        """The robot environment is deterministic, hence seeding is idle"""
+        return [None for _ in range(self.num_envs)]
+
+    def get_attr(self, attr_name: str, indices: VecEnvIndices = None) -> List[Any]:
+        """Return attribute from the batched environment for each robot
+
+        Attributes holding one entry per robot are indexed, the rest are
+        shared by all robots.
+        """
+        value = getattr(self.env, attr_name)
+        if attr_name in self.env.per_env_attributes:
+            return [value[idx] for idx in self._get_indices(indices)]
+        return [value for _ in self._get_indices(indices)]
+
+    def set_attr(
+        self,
+        attr_name: str,
+        value: Any,
+        indices: VecEnvIndices = None,
+    ) -> None:
+        """Set attribute inside the batched environment for the given robots"""
+        if attr_name not in self.env.per_env_attributes:
+            setattr(self.env, attr_name, value)
+            return
+        attribute = getattr(self.env, attr_name)
+        for idx in self._get_indices(indices):
+            attribute[idx] = value
+
+    def env_method(
+        self,
+        method_name: str,
+        *method_args,
+        indices: VecEnvIndices = None,
+        **method_kwargs,
+    ) -> List[Any]:
+        """Call a method of the batched environment once for the given robots
+
+        Methods accepting ``env_ids`` receive the robots indices.
+        """
+        env_indices = list(self._get_indices(indices))
+        method = getattr(self.env, method_name)
+        if "env_ids" in inspect.signature(method).parameters:
+            method_kwargs["env_ids"] = env_indices
+        result = method(*method_args, **method_kwargs)
+        return [result for _ in env_indices]
+
+    def env_is_wrapped(
+        self,
+        wrapper_class: Type[gym.Wrapper],
+        indices: VecEnvIndices = None,
+    ) -> List[bool]:
+        """Robots of the batched environment are never wrapped"""
+        return [False for _ in self._get_indices(indices)]
@@ -0,0 +1,154 @@
+"""Implementation of a LiDAR ray marcher over a uniform occupancy grid"""
+from typing import Optional
+import numpy as np
+
+# Value of the cells padding the grid, rays stop when they reach them
+OUTSIDE = 2
+
+
+class OccupancyGrid:
+    """Uniform occupancy grid rasterizing axis-aligned obstacle boxes.
+
+    A cell is occupied when it overlaps an obstacle, so the grid is exact
+    for obstacles aligned on the cells and conservative otherwise.
+
+    Args:
+        boxes (np.ndarray): obstacles boxes of shape (n_obstacles, 4), each row
+        is [xmin, ymin, xmax, ymax]
+        resolution (float, optional): cells side length. Defaults to 1.0.
+    """
+
+    def __init__(self, boxes: np.ndarray, resolution: float = 1.0) -> None:
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.resolution = resolution
+        if len(boxes) == 0:
+            self.origin = np.zeros((2,), dtype=np.float64)
+            self.occupancy = np.zeros((0, 0), dtype=bool)
+            self.padded_cells = np.full((4,), OUTSIDE, dtype=np.int8)
+            return
+
+        self.origin = np.floor(boxes[:, :2].min(axis=0) / resolution) * resolution
+        cells_min = np.floor((boxes[:, :2] - self.origin) / resolution).astype(np.int64)
+        cells_max = np.ceil((boxes[:, 2:] - self.origin) / resolution).astype(np.int64)
+        # Degenerated boxes still occupy one cell
+        cells_max = np.maximum(cells_max, cells_min + 1)
+        shape = cells_max.max(axis=0)
+        # Boxes are added to a 2D difference array at their corners, the
+        # prefix sums count the boxes overlapping each cell
+        coverage = np.zeros((shape[0] + 1, shape[1] + 1), dtype=np.int32)
+        np.add.at(coverage, (cells_min[:, 0], cells_min[:, 1]), 1)
+        np.add.at(coverage, (cells_max[:, 0], cells_min[:, 1]), -1)
+        np.add.at(coverage, (cells_min[:, 0], cells_max[:, 1]), -1)
+        np.add.at(coverage, (cells_max[:, 0], cells_max[:, 1]), 1)
+        np.cumsum(coverage, axis=0, out=coverage)
+        np.cumsum(coverage, axis=1, out=coverage)
+        self.occupancy = coverage[:-1, :-1] > 0
+        # Flattened occupancy surrounded by one cell of ``OUTSIDE`` value
+        self.padded_cells = np.pad(
+            self.occupancy.astype(np.int8), 1, constant_values=OUTSIDE
+        ).reshape(-1)
+
+    @property
+    def shape(self) -> tuple:
+        """Getter for the number of cells along x and y"""
+        return self.occupancy.shape
+
+    def to_cells(self, points: np.ndarray) -> np.ndarray:
+        """Converts points of shape (..., 2) into cells indices"""
+        return np.floor((points - self.origin) / self.resolution).astype(np.int64)
+
+
+def cast_rays_grid(
+    poses: np.ndarray,
+    angles: np.ndarray,
+    grid: OccupancyGrid,
+    max_range: float = 25.0,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Marches the LiDAR rays of a batch of robots through an occupancy grid.
+
+    All rays are stepped together with a DDA traversal, one cell crossing per
+    iteration, until they reach an occupied cell, leave the grid or travel
+    ``max_range``. The cost of a ray depends on the number of cells it
+    crosses, not on the number of obstacles. Rays starting in an occupied
+    cell stop when they leave the occupied region, like rays starting inside
+    an obstacle stop on its boundary. Rays of robots outside the grid return
+    ``max_range``.
+
+    Args:
+        poses (np.ndarray): robots poses of shape (n_robots, 3), each row is [x, y, theta]
+        angles (np.ndarray): rays angles relative to the robot heading, of shape (n_angles,)
+        grid (OccupancyGrid): occupancy grid of the obstacles
+        max_range (float, optional): range of rays hitting no obstacle. Defaults to 25.0.
+        out (Optional[np.ndarray], optional): contiguous float32 output of shape
+        (n_robots, n_angles). Defaults to a new array.
+
+    Returns:
+        np.ndarray: ranges of shape (n_robots, n_angles)
+    """
+    poses = np.asarray(poses, dtype=np.float32).reshape(-1, 3)
+    n_robots = len(poses)
+    n_angles = len(angles)
+    if out is None:
+        out = np.empty((n_robots, n_angles), dtype=np.float32)
+    out.fill(max_range)
+    if not out.flags.c_contiguous:
+        raise ValueError("Output of the ray marcher must be contiguous")
+    ranges = out.reshape(-1)
+
+    rays_angles = (angles[None, :] + poses[:, 2, None]).astype(np.float32).reshape(-1)
+    direction_x = np.cos(rays_angles).astype(np.float64)
+    direction_y = np.sin(rays_angles).astype(np.float64)
+    origins = np.repeat(poses[:, :2].astype(np.float64), n_angles, axis=0)
+    cells = grid.to_cells(origins)
+    n_cells_x, n_cells_y = grid.shape
+    in_grid = (
+        (cells[:, 0] >= 0)
+        & (cells[:, 0] < n_cells_x)
+        & (cells[:, 1] >= 0)
+        & (cells[:, 1] < n_cells_y)
+    )
+    rays = np.flatnonzero(in_grid)
+    direction_x, direction_y = direction_x[rays], direction_y[rays]
+    origins, cells = origins[rays], cells[rays]
+
+    # Rays walk on the flattened padded grid, moving by one cell along x or y
+    # is adding ``stride_x`` or ``stride_y`` to the index
+    cells_map = grid.padded_cells
+    stride_x, stride_y = grid.shape[1] + 2, 1
+    cell_index = (cells[:, 0] + 1) * stride_x + (cells[:, 1] + 1) * stride_y
+    inside = cells_map[cell_index]
+
+    step_x = np.where(direction_x > 0, stride_x, -stride_x)
+    step_y = np.where(direction_y > 0, stride_y, -stride_y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Distance along the ray to cross one cell, and to the first crossing
+        delta_x = np.abs(grid.resolution / direction_x)
+        delta_y = np.abs(grid.resolution / direction_y)
+        next_x = grid.origin[0] + (cells[:, 0] + (direction_x > 0)) * grid.resolution
+        next_y = grid.origin[1] + (cells[:, 1] + (direction_y > 0)) * grid.resolution
+        t_max_x = np.where(
+            direction_x != 0, (next_x - origins[:, 0]) / direction_x, np.inf
+        )
+        t_max_y = np.where(
+            direction_y != 0, (next_y - origins[:, 1]) / direction_y, np.inf
+        )
+
+    while len(rays) > 0:
+        is_step_x = t_max_x < t_max_y
+        distance = np.where(is_step_x, t_max_x, t_max_y)
+        cell_index += np.where(is_step_x, step_x, step_y)
+        t_max_x = np.where(is_step_x, t_max_x + delta_x, t_max_x)
+        t_max_y = np.where(is_step_x, t_max_y, t_max_y + delta_y)
+
+        cell = cells_map[cell_index]
+        is_done = (cell != inside) | (distance >= max_range)
+        hits = is_done & (cell != OUTSIDE) & (distance < max_range)
+        ranges[rays[hits]] = distance[hits]
+
+        active = ~is_done
+        rays, cell_index, inside = rays[active], cell_index[active], inside[active]
+        step_x, step_y = step_x[active], step_y[active]
+        delta_x, delta_y = delta_x[active], delta_y[active]
+        t_max_x, t_max_y = t_max_x[active], t_max_y[active]
+    return out
@@ -0,0 +1,213 @@
+"""Implementation of a LiDAR lookup table for maps with static obstacles"""
+from typing import Optional
+import hashlib
+import logging
+import tempfile
+from os import path, makedirs, remove, replace
+import numpy as np
+
+from highrl.lidar_setup import raycast
+from highrl.lidar_setup.raycast import cast_rays_aabb, cast_rays_openmp
+
+_LOG = logging.getLogger(__name__)
+
+# Number of positions scanned at once while building a table
+BUILD_BATCH_SIZE = 4096
+
+
+def layout_hash(
+    boxes: np.ndarray,
+    width: float,
+    height: float,
+    resolution: float,
+    n_angles: int,
+    max_range: float,
+) -> str:
+    """Computes the key of the lookup table of an obstacles layout
+
+    Args:
+        boxes (np.ndarray): obstacles boxes of shape (n_obstacles, 4)
+        width (float): map width
+        height (float): map height
+        resolution (float): distance between two scanned positions
+        n_angles (int): number of rays of a scan
+        max_range (float): range of rays hitting no obstacle
+
+    Returns:
+        str: hexadecimal digest of the layout and table parameters
+    """
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(boxes, dtype=np.float32).tobytes())
+    digest.update(np.array([width, height, resolution, n_angles, max_range]).tobytes())
+    return digest.hexdigest()
+
+
+class LidarLookupTable:
+    """Scans precomputed on a grid of positions of a static map.
+
+    Scans are stored at a null heading, with ``n_angles`` rays spread
+    uniformly over a full turn. A scan at any pose is answered by bilinear
+    interpolation between the four surrounding positions, and the heading
+    rotates the rays by shifting their index in the stored scans.
+
+    Args:
+        scans (np.ndarray): float32 scans of shape (n_x, n_y, n_angles)
+        resolution (float): distance between two scanned positions
+        key (str, optional): layout hash of the table. Defaults to "".
+    """
+
+    def __init__(self, scans: np.ndarray, resolution: float, key: str = "") -> None:
+        self.scans = scans
+        self.resolution = resolution
+        self.key = key
+        self.n_angles = scans.shape[2]
+        self.angle_increment = 2 * np.pi / self.n_angles
+
+    @classmethod
+    def build(
+        cls,
+        boxes: np.ndarray,
+        width: float,
+        height: float,
+        resolution: float,
+        n_angles: int,
+        max_range: float = 25.0,
+    ) -> "LidarLookupTable":
+        """Scans the positions of a ``resolution`` spaced grid covering the map
+
+        Positions are scanned with the OpenMP caster, or with the NumPy one
+        when the lidar2d_batch extension is not built.
+
+        Args:
+            boxes (np.ndarray): obstacles boxes of shape (n_obstacles, 4)
+            width (float): map width
+            height (float): map height
+            resolution (float): distance between two scanned positions
+            n_angles (int): number of rays of a scan
+            max_range (float, optional): range of rays hitting no obstacle.
+            Defaults to 25.0.
+
+        Returns:
+            LidarLookupTable: table of the map
+        """
+        pos_x = np.arange(int(np.ceil(width / resolution)) + 1) * resolution
+        pos_y = np.arange(int(np.ceil(height / resolution)) + 1) * resolution
+        poses = np.zeros((len(pos_x) * len(pos_y), 3), dtype=np.float32)
+        poses[:, :2] = np.stack(
+            np.meshgrid(pos_x, pos_y, indexing="ij"), axis=-1
+        ).reshape(-1, 2)
+        angles = np.arange(n_angles) * (2 * np.pi / n_angles)
+        cast_rays = cast_rays_openmp
+        if raycast.cast_rays_batch is None:
+            cast_rays = cast_rays_aabb
+        scans = np.empty((len(poses), n_angles), dtype=np.float32)
+        for start in range(0, len(poses), BUILD_BATCH_SIZE):
+            stop = start + BUILD_BATCH_SIZE
+            cast_rays(poses[start:stop], angles, boxes, max_range, scans[start:stop])
+        key = layout_hash(boxes, width, height, resolution, n_angles, max_range)
+        return cls(scans.reshape(len(pos_x), len(pos_y), n_angles), resolution, key)
+
+    @classmethod
+    def load_or_build(
+        cls,
+        boxes: np.ndarray,
+        width: float,
+        height: float,
+        resolution: float,
+        n_angles: int,
+        max_range: float = 25.0,
+        cache_dir: str = "",
+    ) -> "LidarLookupTable":
+        """Loads the table of a layout from the disk cache, or builds and saves it
+
+        Args:
+            boxes (np.ndarray): obstacles boxes of shape (n_obstacles, 4)
+            width (float): map width
+            height (float): map height
+            resolution (float): distance between two scanned positions
+            n_angles (int): number of rays of a scan
+            max_range (float, optional): range of rays hitting no obstacle.
+            Defaults to 25.0.
+            cache_dir (str, optional): directory of the cached tables, tables
+            are not cached when empty. Defaults to "".
+
+        Returns:
+            LidarLookupTable: table of the map
+        """
+        key = layout_hash(boxes, width, height, resolution, n_angles, max_range)
+        if not cache_dir:
+            return cls.build(boxes, width, height, resolution, n_angles, max_range)
+
+        cache_dir = path.expanduser(cache_dir)
+        table_path = path.join(cache_dir, f"lidar_lut_{key}.npy")
+        if path.exists(table_path):
+            _LOG.info("Loading lidar lookup table %s", table_path)
+            return cls(np.load(table_path), resolution, key)
+
+        _LOG.info("Building lidar lookup table %s", table_path)
+        table = cls.build(boxes, width, height, resolution, n_angles, max_range)
+        makedirs(cache_dir, exist_ok=True)
+        # Envs sharing the cache must never load a partially written table
+        with tempfile.NamedTemporaryFile(
+            dir=cache_dir, suffix=".npy", delete=False
+        ) as tmp_file:
+            tmp_path = tmp_file.name
+            try:
+                np.save(tmp_file, table.scans)
+            except BaseException:
+                tmp_file.close()
+                remove(tmp_path)
+                raise
+        replace(tmp_path, table_path)
+        return table
+
+    def scan(
+        self,
+        poses: np.ndarray,
+        angles: np.ndarray,
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """Answers the scans of a batch of robots from the table
+
+        Positions outside the map are clamped on its border.
+
+        Args:
+            poses (np.ndarray): robots poses of shape (n_robots, 3), each row is [x, y, theta]
+            angles (np.ndarray): rays angles relative to the robot heading, of shape (n_angles,)
+            out (Optional[np.ndarray], optional): float32 output of shape
+            (n_robots, n_angles). Defaults to a new array.
+
+        Returns:
+            np.ndarray: ranges of shape (n_robots, n_angles)
+        """
+        poses = np.asarray(poses, dtype=np.float64).reshape(-1, 3)
+        n_x, n_y, _ = self.scans.shape
+        cells_x = np.clip(poses[:, 0] / self.resolution, 0, n_x - 1)
+        cells_y = np.clip(poses[:, 1] / self.resolution, 0, n_y - 1)
+        idx_x = np.minimum(cells_x.astype(np.int64), n_x - 2)
+        idx_y = np.minimum(cells_y.astype(np.int64), n_y - 2)
+        weight_x = (cells_x - idx_x)[:, None]
+        weight_y = (cells_y - idx_y)[:, None]
+
+        # The heading shifts the rays index, by a fraction of a ray in general
+        rays = np.mod(
+            (angles[None, :] + poses[:, 2, None]) / self.angle_increment, self.n_angles
+        )
+        rays_start = np.minimum(rays.astype(np.int64), self.n_angles - 1)
+        rays_end = (rays_start + 1) % self.n_angles
+        weight_rays = rays - rays_start
+
+        def corner(shift_x: int, shift_y: int) -> np.ndarray:
+            scans = self.scans[idx_x + shift_x, idx_y + shift_y]
+            start = np.take_along_axis(scans, rays_start, axis=1)
+            end = np.take_along_axis(scans, rays_end, axis=1)
+            return start + weight_rays * (end - start)
+
+        bottom_left, top_left = corner(0, 0), corner(0, 1)
+        bottom = bottom_left + weight_x * (corner(1, 0) - bottom_left)
+        top = top_left + weight_x * (corner(1, 1) - top_left)
+        ranges = bottom + weight_y * (top - bottom)
+        if out is None:
+            return ranges.astype(np.float32)
+        out[...] = ranges
+        return out
@@ -0,0 +1,245 @@
+"""Implementation of a LiDAR ray caster for axis-aligned rectangular obstacles"""
+from typing import Iterable, Optional
+import numpy as np
+
+try:
+    from lidar2d_batch import cast_rays_batch, cast_rings_batch
+except ImportError:
+    cast_rays_batch = cast_rings_batch = None
+
+from highrl.obstacle.obstacles import ObstacleSet
+from highrl.obstacle.single_obstacle import SingleObstacle
+from highrl.lidar_setup.rings import RINGS_TO_BOOL
+
+# Number of (robot, ray, obstacle) intersections computed at once, bounds
+# the size of the temporary arrays for large batches and maps.
+CHUNK_SIZE = 1 << 20
+
+LIDAR_BACKENDS = ["cmap2d", "aabb", "grid", "openmp", "lut"]
+
+# Box that no ray of a LiDAR inside the map reaches
+FAR_BOX = np.array([1e30, 1e30, 1e30, 1e30], dtype=np.float32)
+
+
+def obstacles_to_boxes(obstacles: Iterable[SingleObstacle]) -> np.ndarray:
+    """Converts obstacles into an array of axis-aligned boxes
+
+    Args:
+        obstacles (Iterable[SingleObstacle]): Obstacles of the map
+
+    Returns:
+        np.ndarray: boxes of shape (n_obstacles, 4), each row is [xmin, ymin, xmax, ymax]
+    """
+    if isinstance(obstacles, ObstacleSet):
+        return obstacles.get_bounding_boxes()
+    boxes = [
+        [
+            obstacle.px,
+            obstacle.py,
+            obstacle.px + obstacle.width,
+            obstacle.py + obstacle.height,
+        ]
+        for obstacle in obstacles
+    ]
+    return np.array(boxes, dtype=np.float32).reshape(-1, 4)
+
+
+def select_boxes_in_range(
+    positions: np.ndarray,
+    boxes: np.ndarray,
+    max_range: float,
+) -> np.ndarray:
+    """Gathers, for each robot, the boxes closer than ``max_range``.
+
+    Robots get the same number of boxes, the largest number of boxes in range
+    of a robot, missing boxes are padded with a box placed out of range.
+
+    Args:
+        positions (np.ndarray): robots positions of shape (n_robots, 2)
+        boxes (np.ndarray): obstacles boxes of shape (n_obstacles, 4)
+        max_range (float): LiDAR max range
+
+    Returns:
+        np.ndarray: boxes of shape (n_robots, n_boxes_in_range, 4)
+    """
+    gap_x = np.maximum(boxes[None, :, 0] - positions[:, 0, None], 0.0)
+    gap_x = np.maximum(gap_x, positions[:, 0, None] - boxes[None, :, 2])
+    gap_y = np.maximum(boxes[None, :, 1] - positions[:, 1, None], 0.0)
+    gap_y = np.maximum(gap_y, positions[:, 1, None] - boxes[None, :, 3])
+    in_range = gap_x * gap_x + gap_y * gap_y <= max_range * max_range
+    n_in_range = int(in_range.sum(axis=1).max(initial=0))
+    # Boxes in range first, keeping their order
+    order = np.argsort(~in_range, axis=1, kind="stable")[:, :n_in_range]
+    selected = boxes[order]
+    selected[~np.take_along_axis(in_range, order, axis=1)] = FAR_BOX
+    return selected
+
+
+def cast_rays_aabb(
+    poses: np.ndarray,
+    angles: np.ndarray,
+    boxes: np.ndarray,
+    max_range: float = 25.0,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Casts the LiDAR rays of a batch of robots against axis-aligned boxes.
+
+    Each ray is intersected with the boxes in range of its robot using the
+    slab method: the ray enters a box at the last of its entries in the x and
+    y slabs and exits at the first of its exits. Like
+    ``CMap2D.render_contours_in_lidar`` a ray starting inside a box returns
+    the distance to the box boundary, and rays are cast at float32 angles.
+
+    Args:
+        poses (np.ndarray): robots poses of shape (n_robots, 3), each row is [x, y, theta]
+        angles (np.ndarray): rays angles relative to the robot heading, of shape (n_angles,)
+        boxes (np.ndarray): obstacles boxes of shape (n_obstacles, 4), see
+        :func:`obstacles_to_boxes`
+        max_range (float, optional): range of rays hitting no obstacle. Defaults to 25.0.
+        out (Optional[np.ndarray], optional): float32 output of shape (n_robots, n_angles).
+        Defaults to a new array.
+
+    Returns:
+        np.ndarray: ranges of shape (n_robots, n_angles)
+    """
+    poses = np.asarray(poses, dtype=np.float32).reshape(-1, 3)
+    n_robots = len(poses)
+    n_angles = len(angles)
+    if out is None:
+        out = np.empty((n_robots, n_angles), dtype=np.float32)
+    out.fill(max_range)
+    boxes = select_boxes_in_range(
+        poses[:, :2], np.asarray(boxes, dtype=np.float32).reshape(-1, 4), max_range
+    )
+    n_boxes = boxes.shape[1]
+    if n_boxes == 0:
+        return out
+
+    rays_angles = (angles[None, :] + poses[:, 2, None]).astype(np.float32)
+    chunk = max(1, CHUNK_SIZE // (n_angles * n_boxes))
+    for start in range(0, n_robots, chunk):
+        stop = min(start + chunk, n_robots)
+        # Rays parallel to an axis get a tiny direction instead of a null one,
+        # so that slabs bounds are huge but never NaN
+        inv_x = 1.0 / _non_zero(np.cos(rays_angles[start:stop]))[:, :, None]
+        inv_y = 1.0 / _non_zero(np.sin(rays_angles[start:stop]))[:, :, None]
+        origin_x = poses[start:stop, 0, None, None]
+        origin_y = poses[start:stop, 1, None, None]
+        chunk_boxes = boxes[start:stop, None, :, :]
+
+        with np.errstate(over="ignore"):
+            slab_1 = (chunk_boxes[..., 0] - origin_x) * inv_x
+            slab_2 = (chunk_boxes[..., 2] - origin_x) * inv_x
+            t_near = np.minimum(slab_1, slab_2)
+            t_far = np.maximum(slab_1, slab_2)
+            slab_1 = (chunk_boxes[..., 1] - origin_y) * inv_y
+            slab_2 = (chunk_boxes[..., 3] - origin_y) * inv_y
+        np.maximum(t_near, np.minimum(slab_1, slab_2), out=t_near)
+        np.minimum(t_far, np.maximum(slab_1, slab_2), out=t_far)
+
+        is_hit = (t_far >= t_near) & (t_far >= 0.0)
+        distances = np.where(t_near >= 0.0, t_near, t_far)
+        distances[~is_hit] = np.inf
+        np.minimum(out[start:stop], distances.min(axis=-1), out=out[start:stop])
+    return out
+
+
+def cast_rays_openmp(
+    poses: np.ndarray,
+    angles: np.ndarray,
+    boxes: np.ndarray,
+    max_range: float = 25.0,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Casts the LiDAR rays of a batch of robots with the OpenMP Cython kernel.
+
+    Same results as :func:`cast_rays_aabb`, robots are scanned in parallel by
+    ``lidar2d_batch`` with the GIL released. The number of threads is set with
+    the ``OMP_NUM_THREADS`` environment variable.
+
+    Args:
+        poses (np.ndarray): robots poses of shape (n_robots, 3), each row is [x, y, theta]
+        angles (np.ndarray): rays angles relative to the robot heading, of shape (n_angles,)
+        boxes (np.ndarray): obstacles boxes of shape (n_obstacles, 4), see
+        :func:`obstacles_to_boxes`
+        max_range (float, optional): range of rays hitting no obstacle. Defaults to 25.0.
+        out (Optional[np.ndarray], optional): contiguous float32 output of shape
+        (n_robots, n_angles). Defaults to a new array.
+
+    Returns:
+        np.ndarray: ranges of shape (n_robots, n_angles)
+    """
+    if cast_rays_batch is None:
+        raise ImportError("The openmp lidar backend needs the lidar2d_batch extension")
+    poses = np.ascontiguousarray(poses, dtype=np.float32).reshape(-1, 3)
+    if out is None:
+        out = np.empty((len(poses), len(angles)), dtype=np.float32)
+    cast_rays_batch(
+        poses,
+        np.ascontiguousarray(angles, dtype=np.float64),
+        np.ascontiguousarray(boxes, dtype=np.float32).reshape(-1, 4),
+        max_range,
+        out,
+    )
+    return out
+
+
+def cast_rings_openmp(
+    poses: np.ndarray,
+    angles: np.ndarray,
+    sector_starts: np.ndarray,
+    boxes: np.ndarray,
+    rings_def: dict,
+    max_range: float = 25.0,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Rasterizes the rings of a batch of robots straight from the obstacles.
+
+    Rays are cast and binned into their ring cell one by one in the OpenMP
+    kernel of ``lidar2d_batch``, no scan is stored. The rings are the rings
+    of :func:`cast_rays_openmp` scans of the same rays, so sectors can be
+    given fewer rays than the LiDAR has to make them cheaper.
+
+    Args:
+        poses (np.ndarray): robots poses of shape (n_robots, 3), each row is [x, y, theta]
+        angles (np.ndarray): rays angles relative to the robot heading, of shape (n_angles,)
+        sector_starts (np.ndarray): rays of the angle level j are
+        ``angles[sector_starts[j]:sector_starts[j + 1]]``, of shape (angle_levels + 1,)
+        boxes (np.ndarray): obstacles boxes of shape (n_obstacles, 4), see
+        :func:`obstacles_to_boxes`
+        rings_def (dict): rings definition, see :func:`highrl.lidar_setup.rings.get_rings`
+        max_range (float, optional): range of rays hitting no obstacle. Defaults to 25.0.
+        out (Optional[np.ndarray], optional): contiguous uint8 or float32 output of
+        n_robots * angle_levels * range_levels cells, uint8 cells are 0, 1 or 2 and
+        float32 cells are divided by ``rings_to_bool``. Defaults to a new uint8 array.
+
+    Returns:
+        np.ndarray: rings of shape (n_robots, angle_levels, range_levels), a view of out
+    """
+    if cast_rings_batch is None:
+        raise ImportError("Rings rasterization needs the lidar2d_batch extension")
+    poses = np.ascontiguousarray(poses, dtype=np.float32).reshape(-1, 3)
+    shape = (len(poses), len(sector_starts) - 1, rings_def["range_levels"])
+    if out is None:
+        out = np.empty(shape, dtype=np.uint8)
+    # Raises instead of silently writing into a copy of out
+    rings = out.view()
+    rings.shape = shape
+    cast_rings_batch(
+        poses,
+        np.ascontiguousarray(angles, dtype=np.float64),
+        np.ascontiguousarray(sector_starts, dtype=np.intp),
+        np.ascontiguousarray(boxes, dtype=np.float32).reshape(-1, 4),
+        max_range,
+        rings_def["range_level_mins"],
+        rings_def["range_level_maxs"],
+        rings,
+        1.0 / RINGS_TO_BOOL if out.dtype == np.float32 else 1.0,
+    )
+    return rings
+
+
+def _non_zero(values: np.ndarray) -> np.ndarray:
+    """Replaces null values by the smallest positive float32"""
+    values[values == 0.0] = np.finfo(np.float32).tiny
+    return values
@@ -1,6 +1,25 @@
+import logging
 import numpy as np
 
-from lidar2d_fast import fast_lidar_to_rings
+try:
+    from lidar2d_fast import fast_lidar_to_rings
+except ImportError:
+    fast_lidar_to_rings = None
+
+_LOG = logging.getLogger(__name__)
+
+# Value of the rings cells hit by a ray
+RINGS_TO_BOOL = 2.0
+
+# Implementation of lidar_to_rings, the NumPy one is used when the Cython
+# extension is not built
+RINGS_BACKEND = "numpy" if fast_lidar_to_rings is None else "cython"
+
+# Rings definitions and downsampling maps shared by the whole process, see
+# get_rings and get_downsampling_map. They are plain dicts filled without
+# locks, so processes forked from this one inherit them.
+_RINGS_CACHE = {}
+_DOWNSAMPLING_CACHE = {}
 
 
 def generate_rings(
@@ -42,13 +61,33 @@ def generate_rings(
     )
     range_level_mins = np.concatenate([[0.0], range_level_maxs[:-1]]).astype(np.float32)
 
-    def lidar_to_rings(scans):
+    def lidar_to_rings(scans, out=None):
         """
         scans: ndarray (n, N_RAYS)   0-100 [m]
-        rings: ndarray (n_scans, angle_levels, range_levels, n_channels)
+        out: contiguous uint8 or float32 ndarray of n_scans * angle_levels *
+             range_levels values, e.g. (n_scans, angle_levels * range_levels).
+             uint8 cells are 0, 1 or 2, float32 cells are divided by
+             rings_to_bool. Defaults to a new uint8 array.
+        rings: ndarray (n_scans, angle_levels, range_levels, n_channels), a view
+               of out
         """
-        return fast_lidar_to_rings(
-            scans, angle_levels, range_levels, range_level_mins, range_level_maxs
+        scans = np.ascontiguousarray(scans, dtype=np.float32)
+        rings = None
+        cell_scale = 1.0
+        if out is not None:
+            # Raises instead of silently writing into a copy of out
+            rings = out.view()
+            rings.shape = (len(scans), angle_levels, range_levels, 1)
+            if out.dtype == np.float32:
+                cell_scale = 1.0 / RINGS_TO_BOOL
+        return _lidar_to_rings(
+            scans,
+            angle_levels,
+            range_levels,
+            range_level_mins,
+            range_level_maxs,
+            rings,
+            cell_scale,
         )
 
     def old_lidar_to_rings(scans):
@@ -82,25 +121,122 @@ def generate_rings(
             )
         return rings
 
-    def rings_to_lidar(rings, N_RAYS=1080):
+    def rings_to_lidar(rings, N_RAYS=1080, out=None):
+        """
+        rings: ndarray of n_scans * angle_levels * range_levels cells, e.g.
+               (n_scans, angle_levels, range_levels, 1) or (n_scans, angle_levels *
+               range_levels), uint8 or float cells
+        out: float32 ndarray (n_scans, N_RAYS). Defaults to a new array.
+        scans: ndarray (n_scans, N_RAYS), each ray is the min of the first level
+               of its sector which is not free
+        """
         CHANNEL = 0
-        i_to_j, j_to_ii = generate_downsampling_map(N_RAYS, angle_levels)
-        scans = np.zeros((rings.shape[0], N_RAYS), dtype=np.float32)
-        for j, ii in enumerate(j_to_ii):
-            scans[:, ii] = range_level_mins[np.argmax(rings[:, j, :, :] > 0.4, axis=1)][
-                :, None, CHANNEL
-            ]
-        return scans
+        i_to_j, _ = get_downsampling_map(N_RAYS, angle_levels)
+        rings = rings.reshape(len(rings), angle_levels, range_levels, -1)
+        levels = np.argmax(rings[..., CHANNEL] > 0.4, axis=-1)
+        if out is None:
+            out = np.empty((len(rings), N_RAYS), dtype=np.float32)
+        np.take(range_level_mins[levels], i_to_j, axis=1, out=out)
+        return out
 
     return {
         "range_level_mins": range_level_mins,
         "range_level_maxs": range_level_maxs,
         "lidar_to_rings": lidar_to_rings,
         "rings_to_lidar": rings_to_lidar,
-        "rings_to_bool": 2.0,
+        "rings_to_bool": RINGS_TO_BOOL,
+        "backend": RINGS_BACKEND,
+        "angle_levels": angle_levels,
+        "range_levels": range_levels,
     }
 
 
+def get_rings(
+    angle_levels=64,
+    range_levels=64,
+    expansion_term=3.12,
+    min_resolution=0.01,
+    min_dist=0.3,
+    max_dist=25.0,
+):
+    """
+    Memoized generate_rings, the definition is created once per process for
+    each set of arguments and shared by all its callers. Its range levels are
+    read-only, and the definition itself must not be modified.
+    """
+    key = (
+        int(angle_levels),
+        int(range_levels),
+        float(expansion_term),
+        float(min_resolution),
+        float(min_dist),
+        float(max_dist),
+    )
+    if key not in _RINGS_CACHE:
+        rings_def = generate_rings(*key)
+        rings_def["range_level_mins"].setflags(write=False)
+        rings_def["range_level_maxs"].setflags(write=False)
+        _RINGS_CACHE[key] = rings_def
+    return _RINGS_CACHE[key]
+
+
+def numpy_lidar_to_rings(
+    scans,
+    angle_levels,
+    range_levels,
+    range_level_mins,
+    range_level_maxs,
+    out=None,
+    cell_scale=1.0,
+):
+    """
+    NumPy version of lidar2d_fast.fast_lidar_to_rings with identical rings,
+    rays are binned with searchsorted and scattered into their cells.
+
+    scans: ndarray (n_scans, n_rays)   0-100 [m]
+    out: uint8 or float32 ndarray (n_scans, angle_levels, range_levels, 1),
+         allocated as uint8 if None, every cell is overwritten
+    cell_scale: value of one unit of the cells (0: free, 1: unseen, 2: hit)
+    """
+    CHANNEL = 0
+    n_scans, n_rays = scans.shape
+    if out is None:
+        out = np.empty((n_scans, angle_levels, range_levels, 1), dtype=np.uint8)
+    if out.shape != (n_scans, angle_levels, range_levels, 1):
+        raise ValueError(
+            f"Rings must have shape ({n_scans}, {angle_levels}, {range_levels}, 1)"
+        )
+    starts = get_sector_starts(n_rays, angle_levels)
+    ray_to_angle = np.repeat(np.arange(angle_levels), np.diff(starts))
+    scans = scans[:, : starts[-1]]
+
+    # number of levels whose min is <= dist, 0 and nan rays are ignored
+    is_valid = (scans != 0) & ~np.isnan(scans)
+    levels = np.searchsorted(range_level_mins, np.where(is_valid, scans, 0.0), "right")
+    levels[~is_valid] = range_levels
+    # levels from first_unseen on have at least one ray falling short
+    first_unseen = np.full((n_scans, angle_levels), range_levels)
+    is_filled = starts[:-1] < starts[1:]
+    if np.any(is_filled):
+        first_unseen[:, is_filled] = np.minimum.reduceat(
+            levels, starts[:-1][is_filled], axis=1
+        )
+    rings = out[..., CHANNEL]
+    rings[...] = np.arange(range_levels) >= first_unseen[..., None]
+    # if a ray hits the cell the value is 2
+    is_hit = is_valid & (levels > 0)
+    is_hit[is_hit] = scans[is_hit] < range_level_maxs[levels[is_hit] - 1]
+    scan_idx, ray_idx = np.nonzero(is_hit)
+    rings[scan_idx, ray_to_angle[ray_idx], levels[scan_idx, ray_idx] - 1] = 2
+    if cell_scale != 1.0:
+        rings *= cell_scale
+    return out
+
+
+_lidar_to_rings = numpy_lidar_to_rings if fast_lidar_to_rings is None else fast_lidar_to_rings
+_LOG.debug("Rings are computed with the %s backend", RINGS_BACKEND)
+
+
 def generate_downsampling_map(I, J):
     """
     with,
@@ -129,3 +265,42 @@ def generate_downsampling_map(I, J):
         for j in range(J)
     ]
     return i_to_j, j_to_ii
+
+
+def get_sector_starts(n_rays, angle_levels):
+    """
+    Rays of the angle level j are rays sector_starts[j] to sector_starts[j + 1],
+    with the float32 bounds of lidar2d_fast.fast_lidar_to_rings.
+
+    sector_starts: read-only ndarray (angle_levels + 1,) of np.intp
+    """
+    key = ("starts", int(n_rays), int(angle_levels))
+    if key not in _DOWNSAMPLING_CACHE:
+        downsample_factor = np.float32(n_rays * 1.0 / angle_levels)
+        starts = np.ceil(
+            np.arange(angle_levels + 1, dtype=np.float32) * downsample_factor
+        )
+        starts = np.minimum(starts.astype(np.intp), n_rays)
+        starts.setflags(write=False)
+        _DOWNSAMPLING_CACHE[key] = starts
+    return _DOWNSAMPLING_CACHE[key]
+
+
+def get_downsampling_map(I, J):
+    """
+    Memoized generate_downsampling_map with read-only arrays, j_to_ii is a
+    tuple shared by all the callers.
+    """
+    key = (int(I), int(J))
+    if key not in _DOWNSAMPLING_CACHE:
+        i_to_j, j_to_ii = generate_downsampling_map(I, J)
+        for indices in [i_to_j] + j_to_ii:
+            indices.setflags(write=False)
+        _DOWNSAMPLING_CACHE[key] = (i_to_j, tuple(j_to_ii))
+    return _DOWNSAMPLING_CACHE[key]
+
+
+# Default definition of the rings encoders, created at import so that
+# workers forked from a process importing this module inherit it
+get_rings()
+get_downsampling_map(1080, 64)
@@ -0,0 +1,240 @@
+"""Implementation of the robots LiDAR sensor"""
+from typing import Dict, Iterable, Optional, Tuple, Union
+import numpy as np
+from CMap2D import render_contours_in_lidar  # pylint: disable=no-name-in-module
+from gym import spaces
+
+from highrl.obstacle.obstacles import ObstacleSet
+from highrl.obstacle.single_obstacle import SingleObstacle
+from highrl.utils.general import RobotConfigs
+from highrl.lidar_setup.grid import OccupancyGrid, cast_rays_grid
+from highrl.lidar_setup import raycast
+from highrl.lidar_setup.lookup import LidarLookupTable, layout_hash
+from highrl.lidar_setup.raycast import (
+    LIDAR_BACKENDS,
+    cast_rays_aabb,
+    cast_rays_openmp,
+    cast_rings_openmp,
+    obstacles_to_boxes,
+)
+from highrl.lidar_setup.rings import get_sector_starts
+
+
+class LidarSensor:
+    """LiDAR built once from the ``[lidar]`` section of a robot config.
+
+    The sensor owns the rays angles in its own frame, its max range, and the
+    obstacles representation used by the configured backend. Obstacles are
+    set with :meth:`set_obstacles` whenever the map changes, then robots poses
+    are scanned with :meth:`scan` or :meth:`scan_batch`.
+
+    Args:
+        cfg (RobotConfigs): robot configs, see ``[lidar]`` config section
+    """
+
+    def __init__(self, cfg: RobotConfigs) -> None:
+        if cfg.lidar_backend not in LIDAR_BACKENDS:
+            raise ValueError(f"Lidar backend {cfg.lidar_backend} is not avaliable")
+        self.cfg = cfg
+        self.backend = cfg.lidar_backend
+        self.n_angles = cfg.n_angles
+        self.max_range = cfg.lidar_max_range
+        self.angles = np.linspace(
+            cfg.lidar_min_angle,
+            cfg.lidar_max_angle - cfg.lidar_angle_increment,
+            cfg.n_angles,
+        )
+
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.flat_contours = np.zeros((0, 3), dtype=np.float32)
+        self.grid = OccupancyGrid(self.boxes, cfg.lidar_grid_resolution)
+        self.table: Optional[LidarLookupTable] = None
+        # Rays angles relative to the heading and in the world frame, in
+        # float32 for the CMap2D backend, so that no cast buffer is allocated
+        self._angles32 = self.angles.astype(np.float32)
+        self._world_angles = np.zeros((self.n_angles,), dtype=np.float32)
+        # Rays angles and sectors starts of the rings, by levels and rays per sector
+        self._rings_rays: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+
+    @property
+    def observation_shape(self) -> Tuple[int]:
+        """Getter for the shape of a scan"""
+        return (self.n_angles,)
+
+    @property
+    def observation_space(self) -> spaces.Box:
+        """Getter for the observation space of a scan"""
+        return spaces.Box(
+            low=-np.inf, high=np.inf, shape=self.observation_shape, dtype=np.float32
+        )
+
+    def set_obstacles(
+        self, obstacles: Union[ObstacleSet, Iterable[SingleObstacle]]
+    ) -> None:
+        """Prepares the obstacles representation of the backend for a new map
+
+        The representation is cached by the obstacle set, and only built again
+        once the obstacles change.
+
+        Args:
+            obstacles (Union[ObstacleSet, Iterable[SingleObstacle]]): obstacles of
+            the map
+        """
+        if not isinstance(obstacles, ObstacleSet):
+            obstacles = ObstacleSet(obstacles)
+        self.boxes = obstacles_to_boxes(obstacles)
+        if self.backend == "cmap2d":
+            self.flat_contours, _ = obstacles.get_flatten_contours()
+        elif self.backend == "grid":
+            resolution = self.cfg.lidar_grid_resolution
+            self.grid = obstacles.cached(
+                ("grid", resolution), lambda: OccupancyGrid(self.boxes, resolution)
+            )
+        elif self.backend == "lut":
+            table_key = (
+                "lut",
+                self.cfg.width,
+                self.cfg.height,
+                self.cfg.lidar_lut_resolution,
+                self.n_angles,
+                self.max_range,
+            )
+            self.table = obstacles.cached(table_key, self._load_table)
+
+    def _load_table(self) -> LidarLookupTable:
+        """Loads the lookup table of the obstacles, unless already loaded"""
+        table_args = (
+            self.boxes,
+            self.cfg.width,
+            self.cfg.height,
+            self.cfg.lidar_lut_resolution,
+            self.n_angles,
+            self.max_range,
+        )
+        if self.table is not None and self.table.key == layout_hash(*table_args):
+            return self.table
+        return LidarLookupTable.load_or_build(
+            *table_args, cache_dir=self.cfg.lidar_lut_cache_dir
+        )
+
+    def scan(self, pose: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Scans the obstacles from a single pose
+
+        Args:
+            pose (np.ndarray): float32 LiDAR pose [x, y, theta]
+            out (Optional[np.ndarray], optional): contiguous float32 output of
+            shape (n_angles,). Defaults to a new array.
+
+        Returns:
+            np.ndarray: ranges of shape (n_angles,)
+        """
+        if out is None:
+            out = np.empty(self.observation_shape, dtype=np.float32)
+        if self.backend == "cmap2d":
+            out.fill(self.max_range)
+            np.add(self._angles32, pose[2], out=self._world_angles)
+            render_contours_in_lidar(
+                out, self._world_angles, self.flat_contours, pose[:2]
+            )
+        else:
+            self.scan_batch(pose[None, :], out[None, :])
+        return out
+
+    def scan_batch(
+        self,
+        poses: np.ndarray,
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """Scans the obstacles from a batch of poses
+
+        Args:
+            poses (np.ndarray): float32 LiDAR poses of shape (n_robots, 3)
+            out (Optional[np.ndarray], optional): contiguous float32 output of
+            shape (n_robots, n_angles). Defaults to a new array.
+
+        Returns:
+            np.ndarray: ranges of shape (n_robots, n_angles)
+        """
+        if out is None:
+            out = np.empty((len(poses),) + self.observation_shape, dtype=np.float32)
+        if self.backend == "aabb":
+            cast_rays_aabb(poses, self.angles, self.boxes, self.max_range, out)
+        elif self.backend == "openmp":
+            cast_rays_openmp(poses, self.angles, self.boxes, self.max_range, out)
+        elif self.backend == "grid":
+            cast_rays_grid(poses, self.angles, self.grid, self.max_range, out)
+        elif self.backend == "lut":
+            self.table.scan(poses, self.angles, out)  # type: ignore
+        else:
+            for ranges, pose in zip(out, poses):
+                self.scan(pose, ranges)
+        return out
+
+    def rings_rays(
+        self, angle_levels: int, rays_per_sector: int = 0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Getter for the rays rasterized into the rings angle levels
+
+        Args:
+            angle_levels (int): number of angle levels of the rings
+            rays_per_sector (int, optional): rays of each angle level, spread
+            uniformly over the LiDAR rays of the level. Defaults to 0, which
+            uses the LiDAR rays.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: rays angles, and the start of the rays of
+            each angle level, of shape (angle_levels + 1,)
+        """
+        key = (angle_levels, rays_per_sector)
+        if key not in self._rings_rays:
+            starts = get_sector_starts(self.n_angles, angle_levels)
+            if rays_per_sector == 0:
+                self._rings_rays[key] = (self.angles, starts)
+            else:
+                # Rays at the centers of equal parts of the sectors, in rays indices
+                parts = (np.arange(rays_per_sector) + 0.5) / rays_per_sector
+                sizes = np.diff(starts)[:, None]
+                indices = starts[:-1, None] - 0.5 + sizes * parts[None, :]
+                increment = self.cfg.lidar_angle_increment
+                angles = self.angles[0] + indices.ravel() * increment
+                sector_starts = np.arange(angle_levels + 1) * rays_per_sector
+                self._rings_rays[key] = (angles, sector_starts)
+        return self._rings_rays[key]
+
+    def rasterize_rings(
+        self,
+        poses: np.ndarray,
+        rings_def: dict,
+        out: Optional[np.ndarray] = None,
+        rays_per_sector: int = 0,
+    ) -> np.ndarray:
+        """Computes the rings of a batch of poses without scanning the LiDAR
+
+        The rings are the rings of :meth:`scan_batch` scans with the openmp
+        backend when rays_per_sector is 0, see
+        :func:`highrl.lidar_setup.raycast.cast_rings_openmp`. Without the
+        lidar2d_batch extension, the rays are scanned with the aabb backend and
+        converted with the ``lidar_to_rings`` of the rings definition.
+
+        Args:
+            poses (np.ndarray): float32 LiDAR poses of shape (n_robots, 3)
+            rings_def (dict): rings definition, see
+            :func:`highrl.lidar_setup.rings.get_rings`
+            out (Optional[np.ndarray], optional): contiguous uint8 or float32 output of
+            n_robots * angle_levels * range_levels cells. Defaults to a new uint8 array.
+            rays_per_sector (int, optional): rays cast for each angle level, see
+            :meth:`rings_rays`. Defaults to 0.
+
+        Returns:
+            np.ndarray: rings of shape (n_robots, angle_levels, range_levels)
+        """
+        angles, sector_starts = self.rings_rays(
+            rings_def["angle_levels"], rays_per_sector
+        )
+        if raycast.cast_rings_batch is None:
+            scans = cast_rays_aabb(poses, angles, self.boxes, self.max_range)
+            rings = rings_def["lidar_to_rings"](scans, out)
+            return rings.reshape(rings.shape[:-1])
+        return cast_rings_openmp(
+            poses, angles, sector_starts, self.boxes, rings_def, self.max_range, out
+        )
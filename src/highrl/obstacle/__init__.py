@@ -1,8 +1,11 @@
 """
 A package for creating obstacles in the environment
 Contains:
-    Obstacles Class: 
+    ObstacleSet Class: 
+    LayeredObstacleSet Class: 
     SingleObstacle Class: 
+    coalesce_obstacles Function: 
 """
-from highrl.obstacle.obstacles import Obstacles
+from highrl.obstacle.coalesce import CoalescingStats, coalesce_obstacles
+from highrl.obstacle.obstacles import LayeredObstacleSet, ObstacleSet, Obstacles
 from highrl.obstacle.single_obstacle import SingleObstacle
@@ -0,0 +1,168 @@
+"""Implementation of the normalization of the obstacles generated by the teacher"""
+from typing import Iterable, List, Tuple
+from dataclasses import dataclass
+import numpy as np
+
+from highrl.obstacle.obstacles import ObstacleSet
+from highrl.obstacle.single_obstacle import SingleObstacle
+
+
+@dataclass
+class CoalescingStats:
+    """Number of obstacles eliminated by each step of the normalization"""
+
+    n_obstacles: int = 0
+    n_degenerate: int = 0
+    n_contained: int = 0
+    n_merged: int = 0
+    n_covered: int = 0
+    n_decomposed: int = 0
+
+    @property
+    def n_eliminated(self) -> int:
+        """Getter for the number of obstacles eliminated by all steps"""
+        return (
+            self.n_degenerate
+            + self.n_contained
+            + self.n_merged
+            + self.n_covered
+            + self.n_decomposed
+        )
+
+
+def _remove_contained(bounds: np.ndarray) -> np.ndarray:
+    """Remove boxes contained in another box, keeping the first of equal boxes"""
+    contains = np.all(bounds[:, None, :2] <= bounds[None, :, :2], axis=2) & np.all(
+        bounds[None, :, 2:] <= bounds[:, None, 2:], axis=2
+    )
+    # contains[j, i] is True when box j contains box i
+    order = np.arange(len(bounds))
+    is_later_equal = contains & contains.T & (order[:, None] > order[None, :])
+    np.fill_diagonal(contains, False)
+    return bounds[~np.any(contains & ~is_later_equal, axis=0)]
+
+
+def _merge_pairs(bounds: List[List[float]]) -> List[List[float]]:
+    """Merge pairs of boxes whose union is a box, until no pair can be merged"""
+    merged = True
+    while merged:
+        merged = False
+        for first in range(len(bounds)):
+            for second in range(first + 1, len(bounds)):
+                box, other = bounds[first], bounds[second]
+                is_x_merge = box[1] == other[1] and box[3] == other[3]
+                is_x_merge &= box[0] <= other[2] and other[0] <= box[2]
+                is_y_merge = box[0] == other[0] and box[2] == other[2]
+                is_y_merge &= box[1] <= other[3] and other[1] <= box[3]
+                if is_x_merge or is_y_merge:
+                    bounds[first] = [
+                        min(box[0], other[0]),
+                        min(box[1], other[1]),
+                        max(box[2], other[2]),
+                        max(box[3], other[3]),
+                    ]
+                    del bounds[second]
+                    merged = True
+                    break
+            if merged:
+                break
+    return bounds
+
+
+def _decompose_union(bounds: np.ndarray) -> np.ndarray:
+    """Split the union of boxes into disjoint boxes, columns of cells first
+
+    The union is rasterized on the cells between the boxes edges, each column
+    of cells is split into runs of occupied cells, and equal runs of adjacent
+    columns are joined into a single box.
+    """
+    x_edges = np.unique(bounds[:, [0, 2]])
+    y_edges = np.unique(bounds[:, [1, 3]])
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    occupied = np.any(
+        (bounds[:, None, None, 0] < x_centers[None, :, None])
+        & (x_centers[None, :, None] < bounds[:, None, None, 2])
+        & (bounds[:, None, None, 1] < y_centers[None, None, :])
+        & (y_centers[None, None, :] < bounds[:, None, None, 3]),
+        axis=0,
+    )
+    # Open boxes, as [first column, first cell, last cell], by run of cells
+    open_boxes = {}
+    boxes = []
+    for column, cells in enumerate(occupied.tolist() + [[False] * len(y_centers)]):
+        runs = set()
+        start = None
+        for cell, is_occupied in enumerate(cells + [False]):
+            if is_occupied and start is None:
+                start = cell
+            elif not is_occupied and start is not None:
+                runs.add((start, cell))
+                start = None
+        for run in set(open_boxes) - runs:
+            boxes.append(
+                [
+                    x_edges[open_boxes.pop(run)],
+                    y_edges[run[0]],
+                    x_edges[column],
+                    y_edges[run[1]],
+                ]
+            )
+        for run in runs - set(open_boxes):
+            open_boxes[run] = column
+    return np.array(boxes, dtype=np.float64).reshape(-1, 4)
+
+
+def coalesce_obstacles(
+    obstacles: Iterable[SingleObstacle],
+) -> Tuple[List[SingleObstacle], CoalescingStats]:
+    """Normalize obstacles into fewer obstacles covering the same area
+
+    Obstacles without area are dropped, then obstacles contained in another
+    obstacle, then pairs of obstacles whose union is a rectangle are merged,
+    which may leave more obstacles contained in the merged ones.
+    The union of the remaining obstacles is finally split into disjoint
+    rectangles, along x or y, when this takes fewer obstacles.
+
+    Args:
+        obstacles (Iterable[SingleObstacle]): obstacles generated by the teacher
+
+    Returns:
+        Tuple[List[SingleObstacle], CoalescingStats]: normalized obstacles, and
+        the number of obstacles eliminated by each step
+    """
+    obstacle_set = ObstacleSet(obstacles)
+    boxes = obstacle_set.boxes.astype(np.float64)
+    bounds = np.concatenate([boxes[:, :2], boxes[:, :2] + boxes[:, 2:]], axis=1)
+    stats = CoalescingStats(n_obstacles=len(bounds))
+
+    has_area = np.all(bounds[:, 2:] > bounds[:, :2], axis=1)
+    stats.n_degenerate = int(np.sum(~has_area))
+    bounds = bounds[has_area]
+
+    n_boxes = len(bounds)
+    bounds = _remove_contained(bounds)
+    stats.n_contained = n_boxes - len(bounds)
+
+    n_boxes = len(bounds)
+    bounds = np.array(_merge_pairs(bounds.tolist()), dtype=np.float64).reshape(-1, 4)
+    stats.n_merged = n_boxes - len(bounds)
+
+    # Merged boxes may contain boxes which could not be merged
+    n_boxes = len(bounds)
+    bounds = _remove_contained(bounds)
+    stats.n_covered = n_boxes - len(bounds)
+
+    n_boxes = len(bounds)
+    if len(bounds) > 2:
+        transposed = _decompose_union(bounds[:, [1, 0, 3, 2]])[:, [1, 0, 3, 2]]
+        for decomposed in [_decompose_union(bounds), transposed]:
+            if len(decomposed) < len(bounds):
+                bounds = decomposed
+    stats.n_decomposed = n_boxes - len(bounds)
+
+    coalesced = [
+        SingleObstacle(x_min, y_min, x_max - x_min, y_max - y_min)
+        for x_min, y_min, x_max, y_max in bounds.tolist()
+    ]
+    return coalesced, stats
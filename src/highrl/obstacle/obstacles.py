@@ -1,50 +1,357 @@
-from typing import List
+"""Implementation of a set of obstacles backed by a single array"""
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+from itertools import chain, count
 import numpy as np
 from highrl.obstacle.single_obstacle import SingleObstacle
+from highrl.obstacle.spatial_index import INDEX_CELL_SIZE, SpatialHashIndex
 
+# Layers of the obstacles of an environment, in the order of their obstacles
+BORDER_LAYER = "border"
+EVAL_LAYER = "eval"
+SESSION_LAYER = "session"
+OBSTACLE_LAYERS = [BORDER_LAYER, EVAL_LAYER, SESSION_LAYER]
 
-class Obstacles:
-    def __init__(self, obstacles_list: List[SingleObstacle] = []) -> None:
-        self.obstacles_list = obstacles_list
-        self.num = 0
+# Corners of the obstacles contours as columns of [xmin, ymin, xmax, ymax]
+# boxes, clockwise from the top left corner and closed with the first corner
+_CONTOUR_X = np.array([0, 2, 2, 0, 0])
+_CONTOUR_Y = np.array([3, 3, 1, 1, 3])
+
+# Versions of the obstacle sets, each change of a set takes the next one
+_VERSIONS = count()
+
+CachedValue = TypeVar("CachedValue")
+
+
+def _to_bounds(boxes: np.ndarray) -> np.ndarray:
+    """Convert rows ``[px, py, width, height]`` to rows ``[xmin, ymin, xmax, ymax]``"""
+    return np.concatenate([boxes[:, :2], boxes[:, :2] + boxes[:, 2:]], axis=1)
+
+
+class ObstacleSet:
+    """Set of obstacles stored as rows ``[px, py, width, height]`` of a float32 array.
+
+    Obstacles of the set are ``SingleObstacle`` views of the rows of the
+    array, created on access. Views are invalidated when obstacles are added
+    beyond the capacity of the array, which is then reallocated.
+
+    Each change of the obstacles gives the set a ``version`` greater than all
+    the versions given before. Geometry derived from the obstacles is cached
+    with :meth:`cached` until the version changes, ``cache_hits`` and
+    ``cache_misses`` count the cached values reused and built. Obstacles
+    edited through views must be followed by :meth:`touch`. Cached arrays are
+    shared by all the callers and must not be modified. Spatial indices of
+    the obstacles are updated with the added obstacles instead.
+
+    Args:
+        obstacles_list (Optional[Iterable[SingleObstacle]], optional): initial
+        obstacles, copied into the set. Defaults to None.
+    """
+
+    def __init__(
+        self, obstacles_list: Optional[Iterable[SingleObstacle]] = None
+    ) -> None:
+        self._boxes = np.zeros((0, 4), dtype=np.float32)
+        self._size = 0
+        self._version = next(_VERSIONS)
+        self._cache: Dict[Hashable, Tuple[int, Any]] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._indices: Dict[float, Tuple[int, SpatialHashIndex]] = {}
+        if obstacles_list is not None:
+            self.add_obstacles(obstacles_list)
+
+    @classmethod
+    def from_boxes(cls, boxes: np.ndarray) -> "ObstacleSet":
+        """Create a set from an array of rows ``[px, py, width, height]``"""
+        obstacles = cls()
+        obstacles.add_boxes(boxes)
+        return obstacles
+
+    @property
+    def boxes(self) -> np.ndarray:
+        """Getter for the (n_obstacles, 4) array of rows ``[px, py, width, height]``"""
+        return self._boxes[: self._size]
+
+    @property
+    def version(self) -> int:
+        """Getter for the version of the obstacles, which increases on each change"""
+        return self._version
+
+    def touch(self) -> None:
+        """Mark the obstacles as changed, invalidating the cached geometry"""
+        self._version = next(_VERSIONS)
+
+    def cached(
+        self, key: Hashable, build: Callable[[], CachedValue]
+    ) -> CachedValue:
+        """Get the value of key derived from the current obstacles, built on change
+
+        Args:
+            key (Hashable): name and parameters of the derived value
+            build (Callable[[], CachedValue]): builds the value from the obstacles
+
+        Returns:
+            CachedValue: value built for the current version of the obstacles
+        """
+        version = self.version
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] == version:
+            self.cache_hits += 1
+            return entry[1]
+        self.cache_misses += 1
+        value = build()
+        self._cache[key] = (version, value)
+        return value
+
+    def spatial_index(self, cell_size: float = INDEX_CELL_SIZE) -> SpatialHashIndex:
+        """Getter for a spatial index of the bounding boxes, kept up to date
+
+        Args:
+            cell_size (float, optional): side length of the cells of the index.
+            Defaults to ``INDEX_CELL_SIZE``.
+
+        Returns:
+            SpatialHashIndex: index of the obstacles, boxes ids are obstacles indices
+        """
+        entry = self._indices.get(cell_size)
+        if entry is not None and entry[0] == self.version:
+            return entry[1]
+        index = SpatialHashIndex(cell_size)
+        index.add_boxes(self.get_bounding_boxes())
+        self._indices[cell_size] = (self.version, index)
+        return index
+
+    def _update_indices(self, previous_version: int, start: int) -> None:
+        """Replace the boxes of the indices from start on, after a single change
+
+        Indices which were not up to date before the change are dropped.
+        """
+        bounds = None
+        for cell_size, (version, index) in list(self._indices.items()):
+            if version != previous_version:
+                del self._indices[cell_size]
+                continue
+            if bounds is None:
+                bounds = _to_bounds(self.boxes[start:])
+            index.truncate(start)
+            index.add_boxes(bounds)
+            self._indices[cell_size] = (self.version, index)
+
+    @property
+    def obstacles_list(self) -> Tuple[SingleObstacle, ...]:
+        """Getter for views of the obstacles, use ``add_obstacles`` to add obstacles"""
+        return tuple(self)
+
+    def _reserve(self, n_new: int) -> None:
+        """Grow the capacity geometrically to fit n_new more obstacles"""
+        if self._size + n_new <= len(self._boxes):
+            return
+        capacity = max(2 * len(self._boxes), self._size + n_new, 8)
+        boxes = np.zeros((capacity, 4), dtype=np.float32)
+        boxes[: self._size] = self.boxes
+        self._boxes = boxes
+
+    def add_boxes(self, boxes: np.ndarray) -> None:
+        """Add obstacles given as rows ``[px, py, width, height]``"""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        previous_version, start = self.version, self._size
+        self._reserve(len(boxes))
+        self._boxes[self._size : self._size + len(boxes)] = boxes
+        self._size += len(boxes)
+        self.touch()
+        self._update_indices(previous_version, start)
+
+    def add_obstacles(self, obstacles_list: Iterable[SingleObstacle]) -> None:
+        """Add new obstacles to the current obstacles list"""
+        self.add_boxes([obstacle.box for obstacle in obstacles_list])
 
     def __add__(self, obstacle: SingleObstacle):
-        self.obstacles_list.append(obstacle)
+        self.add_boxes(obstacle.box)
         return self
 
-    def get_flatten_contours(self):
-        contours = []
-        for obstacle in self.obstacles_list:
-            contours.append(obstacle.get_points())
-        contours = np.array(contours)
-        n_total_vertices = int(
-            np.sum([len(verts) for verts in contours]) + len(contours)
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, idx: int) -> SingleObstacle:
+        return SingleObstacle.from_box(self.boxes[idx])
+
+    def __iter__(self) -> Iterator[SingleObstacle]:
+        boxes = self.boxes
+        return (SingleObstacle.from_box(box) for box in boxes)
+
+    def get_bounding_boxes(self) -> np.ndarray:
+        """Get the (n_obstacles, 4) array of rows ``[xmin, ymin, xmax, ymax]``"""
+        return self.cached("bounding_boxes", lambda: _to_bounds(self.boxes))
+
+    def get_contours(self) -> np.ndarray:
+        """Get the (n_obstacles, 4, 2) corners, ordered as in ``get_points``"""
+        return self.cached("contours", self._build_contours)
+
+    def _build_contours(self) -> np.ndarray:
+        bounds = self.get_bounding_boxes()
+        return np.stack(
+            [bounds[:, _CONTOUR_X[:-1]], bounds[:, _CONTOUR_Y[:-1]]], axis=-1
         )
-        flat_contours = np.zeros((n_total_vertices, 3), dtype=np.float32)
-        v = 0
-        for idx, polygon in enumerate(contours):
-            # add first vertex last to close polygon
-            for vertex in np.concatenate((polygon, polygon[:1]), axis=0):
-                flat_contours[v, :] = np.array([idx, vertex[0], vertex[1]])
-                v += 1
-        return flat_contours, contours
-
-    def __iter__(self):
-        return self
 
-    def __next__(self):
-        if self.num == len(self.obstacles_list):
-            raise StopIteration
-        self.num += 1
-        return self.obstacles_list[self.num - 1]
+    def get_flatten_contours(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the closed contours of the obstacles flattened into a single array
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: flat contours of shape
+            (5 * n_obstacles, 3), each row is [obstacle index, x, y], and contours
+            of shape (n_obstacles, 4, 2)
+        """
+        return self.cached("flatten_contours", self._build_flatten_contours)
+
+    def _build_flatten_contours(self) -> Tuple[np.ndarray, np.ndarray]:
+        bounds = self.get_bounding_boxes()
+        indices = np.broadcast_to(
+            np.arange(len(bounds), dtype=np.float32)[:, None], (len(bounds), 5)
+        )
+        flat_contours = np.stack(
+            [indices, bounds[:, _CONTOUR_X], bounds[:, _CONTOUR_Y]], axis=-1
+        )
+        return flat_contours.reshape(-1, 3), self.get_contours()
+
+    def get_grid_points(self) -> np.ndarray:
+        """Get the integer points inside the obstacles, as in ``get_grid_points``
+
+        Returns:
+            np.ndarray: int32 points of shape (n_points, 2), the points of each
+            obstacle are contiguous and ordered by x then y
+        """
+        return self.cached("grid_points", self._build_grid_points)
+
+    def _build_grid_points(self) -> np.ndarray:
+        sizes = np.maximum(self.boxes[:, 2:].astype(np.int64) + 1, 0)
+        counts = sizes[:, 0] * sizes[:, 1]
+        # Index of each point among the points of its obstacle
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        y_sizes = np.repeat(sizes[:, 1], counts)
+        offsets = np.stack([local // y_sizes, local % y_sizes], axis=1)
+        return (np.repeat(self.boxes[:, :2], counts, axis=0) + offsets).astype(np.int32)
 
     def __str__(self):
         ret = "[\n"
-        for obstacle in self.obstacles_list:
+        for obstacle in self:
             ret += f"{obstacle}\n"
         ret += "]"
         return ret
 
-    def add_obstacles(self, obstacles_list: List[SingleObstacle]) -> None:
-        """Add new obstacles to the current obstacles list"""
-        self.obstacles_list.extend(obstacles_list)
+
+class LayeredObstacleSet(ObstacleSet):
+    """Obstacles of an environment split into named layers.
+
+    The static borders, the obstacles of the evaluation map and the
+    obstacles of the current teacher session are stored in separate
+    ``ObstacleSet`` layers, ordered as ``OBSTACLE_LAYERS`` so that the borders
+    always come first. A layer is replaced at once with ``set_layer``, which
+    costs the size of the new layer only, and obstacles added to the set go to
+    the session layer.
+    """
+
+    def __init__(
+        self, obstacles_list: Optional[Iterable[SingleObstacle]] = None
+    ) -> None:
+        self.layers: Dict[str, ObstacleSet] = {
+            name: ObstacleSet() for name in OBSTACLE_LAYERS
+        }
+        super().__init__(obstacles_list)
+
+    def layer(self, name: str) -> ObstacleSet:
+        """Getter for the obstacles of a layer"""
+        if name not in self.layers:
+            raise ValueError(f"Obstacle layer {name} is not avaliable")
+        return self.layers[name]
+
+    def _layer_start(self, name: str) -> int:
+        """Getter for the index of the first obstacle of a layer"""
+        start = 0
+        for layer_name in OBSTACLE_LAYERS:
+            if layer_name == name:
+                return start
+            start += len(self.layers[layer_name])
+        raise ValueError(f"Obstacle layer {name} is not avaliable")
+
+    def _replace_layer(self, name: str, layer: ObstacleSet) -> None:
+        """Replace a layer, updating the indices from its first obstacle on"""
+        previous_version, start = self.version, self._layer_start(name)
+        self.layers[name] = layer
+        self._update_indices(previous_version, start)
+
+    def set_layer(
+        self, name: str, obstacles: Union[ObstacleSet, Iterable[SingleObstacle]]
+    ) -> None:
+        """Replace the obstacles of a layer with a copy of the given obstacles"""
+        self.layer(name)
+        if isinstance(obstacles, ObstacleSet):
+            layer = ObstacleSet.from_boxes(obstacles.boxes)
+        else:
+            layer = ObstacleSet(obstacles)
+        self._replace_layer(name, layer)
+
+    def clear_layer(self, name: str) -> None:
+        """Remove the obstacles of a layer"""
+        self.layer(name)
+        self._replace_layer(name, ObstacleSet())
+
+    @property
+    def boxes(self) -> np.ndarray:
+        """Getter for the (n_obstacles, 4) array of rows ``[px, py, width, height]``"""
+        return self.cached(
+            "boxes",
+            lambda: np.concatenate([layer.boxes for layer in self.layers.values()]),
+        )
+
+    @property
+    def version(self) -> int:
+        """Getter for the version of the obstacles, the latest version of the layers"""
+        return max(layer.version for layer in self.layers.values())
+
+    def touch(self) -> None:
+        """Mark the obstacles of all layers as changed"""
+        for layer in self.layers.values():
+            layer.touch()
+
+    def add_boxes(self, boxes: np.ndarray, layer: str = SESSION_LAYER) -> None:
+        """Add obstacles given as rows ``[px, py, width, height]`` to a layer"""
+        obstacles = self.layer(layer)
+        previous_version = self.version
+        start = self._layer_start(layer) + len(obstacles)
+        obstacles.add_boxes(boxes)
+        self._update_indices(previous_version, start)
+
+    def add_obstacles(
+        self, obstacles_list: Iterable[SingleObstacle], layer: str = SESSION_LAYER
+    ) -> None:
+        """Add new obstacles to a layer, the session layer by default"""
+        self.add_boxes([obstacle.box for obstacle in obstacles_list], layer)
+
+    def __len__(self) -> int:
+        return sum(len(layer) for layer in self.layers.values())
+
+    def __getitem__(self, idx: int) -> SingleObstacle:
+        idx = range(len(self))[idx]
+        for layer in self.layers.values():
+            if idx < len(layer):
+                return layer[idx]
+            idx -= len(layer)
+        raise IndexError(idx)
+
+    def __iter__(self) -> Iterator[SingleObstacle]:
+        return chain.from_iterable(list(self.layers.values()))
+
+
+# Former name of the obstacles container
+Obstacles = ObstacleSet
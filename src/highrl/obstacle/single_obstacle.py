@@ -6,21 +6,73 @@ from highrl.utils import Position
 
 
 class SingleObstacle:
-    """Representation of a single obstacle"""
+    """Representation of a single obstacle
+
+    The obstacle is a view of a float32 row ``[px, py, width, height]``,
+    either owned by the obstacle or shared with an ``ObstacleSet``, in which
+    case updating the obstacle updates the set.
+    """
+
+    __slots__ = ("_box",)
 
     def __init__(
         self,
-        px: int = 0,
-        py: int = 0,
-        width: int = 0,
-        height: int = 0,
+        px: float = 0,
+        py: float = 0,
+        width: float = 0,
+        height: float = 0,
     ) -> None:
-        self.px = px
-        self.py = py
-        self.width = width
-        self.height = height
+        self._box = np.array([px, py, width, height], dtype=np.float32)
+
+    @classmethod
+    def from_box(cls, box: np.ndarray) -> "SingleObstacle":
+        """Create an obstacle viewing the float32 row ``[px, py, width, height]``"""
+        obstacle = cls.__new__(cls)
+        obstacle._box = box
+        return obstacle
+
+    @property
+    def box(self) -> np.ndarray:
+        """Getter for the ``[px, py, width, height]`` row of the obstacle"""
+        return self._box
+
+    @property
+    def px(self) -> float:
+        """Getter for the x coordinate of the bottom left corner"""
+        return self._box[0].item()
+
+    @px.setter
+    def px(self, value: float) -> None:
+        self._box[0] = value
+
+    @property
+    def py(self) -> float:
+        """Getter for the y coordinate of the bottom left corner"""
+        return self._box[1].item()
 
-    def get_position(self) -> List[int]:
+    @py.setter
+    def py(self, value: float) -> None:
+        self._box[1] = value
+
+    @property
+    def width(self) -> float:
+        """Getter for the obstacle width"""
+        return self._box[2].item()
+
+    @width.setter
+    def width(self, value: float) -> None:
+        self._box[2] = value
+
+    @property
+    def height(self) -> float:
+        """Getter for the obstacle height"""
+        return self._box[3].item()
+
+    @height.setter
+    def height(self, value: float) -> None:
+        self._box[3] = value
+
+    def get_position(self) -> List[float]:
         """Getter for position coordinates"""
         return [self.px, self.py]
 
@@ -38,7 +90,7 @@ class SingleObstacle:
             (self.px, self.py),
         ]
 
-    def get_dimension(self) -> List[int]:
+    def get_dimension(self) -> List[float]:
         """Getter for obstacle dimension"""
         return [self.width, self.height]
 
@@ -54,15 +106,14 @@ class SingleObstacle:
         return is_x_overlap and is_y_overlap
 
     def get_grid_points(self) -> np.ndarray:
-        """Get all the points inside an obstacle"""
-        height, width = map(int, (self.height, self.width))
-        points = [
-            [self.px + x, self.py + y]
-            for x in range(width + 1)
-            for y in range(height + 1)
-        ]
-        points = np.array(points, dtype=np.int32)
-        return points
+        """Get all the points inside an obstacle, ordered by x then y"""
+        x_steps, y_steps = np.meshgrid(
+            np.arange(int(self.width) + 1),
+            np.arange(int(self.height) + 1),
+            indexing="ij",
+        )
+        offsets = np.stack([x_steps.ravel(), y_steps.ravel()], axis=1)
+        return (self._box[:2] + offsets).astype(np.int32)
 
     def __str__(self) -> str:
-        return f"Obstacle: [{self.px}, {self.py}, {self.width}, {self.height}]"
+        return f"Obstacle: [{self.px:g}, {self.py:g}, {self.width:g}, {self.height:g}]"
@@ -0,0 +1,222 @@
+"""Implementation of a spatial hash index over axis-aligned obstacle boxes"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Side length of the cells of the obstacles indices
+INDEX_CELL_SIZE = 8.0
+
+# Cells keys are (cell_x << _KEY_SHIFT) + cell_y
+_KEY_SHIFT = 32
+
+Box = Tuple[float, float, float, float]
+SortedCells = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+class SpatialHashIndex:
+    """Spatial hash of axis-aligned boxes ``[xmin, ymin, xmax, ymax]``.
+
+    Each box is registered in the square cells it covers, so a query only
+    tests the boxes sharing a cell with it. Boxes are identified by their
+    insertion order. Boxes are closed, a point on the boundary of a box is
+    inside the box. Single queries go through the hash of the cells, bulk
+    queries through a sorted copy of the cells built on the first bulk query
+    after a change.
+
+    Args:
+        cell_size (float, optional): side length of the cells. Defaults to
+        ``INDEX_CELL_SIZE``.
+    """
+
+    def __init__(self, cell_size: float = INDEX_CELL_SIZE) -> None:
+        if cell_size <= 0:
+            raise ValueError(f"Index cell size {cell_size} must be positive")
+        self.cell_size = cell_size
+        self.boxes = np.zeros((0, 4), dtype=np.float64)
+        self._rows: List[Box] = []
+        self._buckets: Dict[int, List[int]] = {}
+        self._box_cells: List[List[int]] = []
+        self._sorted: Optional[SortedCells] = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _cell_range(self, box: Sequence[float]) -> Tuple[int, int, int, int]:
+        """Getter for the first and last cells covered by a box"""
+        size = self.cell_size
+        return (
+            int(np.floor(box[0] / size)),
+            int(np.floor(box[1] / size)),
+            int(np.floor(box[2] / size)),
+            int(np.floor(box[3] / size)),
+        )
+
+    def add_boxes(self, boxes: np.ndarray) -> None:
+        """Add boxes of shape (n_boxes, 4), numbered after the current boxes"""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        for box in boxes.tolist():
+            box_id = len(self._rows)
+            x_min, y_min, x_max, y_max = self._cell_range(box)
+            cells = [
+                (cell_x << _KEY_SHIFT) + cell_y
+                for cell_x in range(x_min, x_max + 1)
+                for cell_y in range(y_min, y_max + 1)
+            ]
+            for key in cells:
+                self._buckets.setdefault(key, []).append(box_id)
+            self._box_cells.append(cells)
+            self._rows.append(tuple(box))
+        self.boxes = np.concatenate([self.boxes, boxes])
+        self._sorted = None
+
+    def truncate(self, n_boxes: int) -> None:
+        """Remove the boxes numbered n_boxes and after"""
+        for _ in range(len(self._rows) - n_boxes):
+            # The last boxes are the last ids of their buckets
+            for key in self._box_cells.pop():
+                bucket = self._buckets[key]
+                bucket.pop()
+                if not bucket:
+                    del self._buckets[key]
+            self._rows.pop()
+        self.boxes = self.boxes[: len(self._rows)]
+        self._sorted = None
+
+    def _candidates(self, box: Sequence[float]) -> List[int]:
+        """Getter for the ids of the boxes sharing a cell with a query box"""
+        x_min, y_min, x_max, y_max = self._cell_range(box)
+        if x_min == x_max and y_min == y_max:
+            return self._buckets.get((x_min << _KEY_SHIFT) + y_min, [])
+        candidates = set()
+        for cell_x in range(x_min, x_max + 1):
+            for cell_y in range(y_min, y_max + 1):
+                candidates.update(
+                    self._buckets.get((cell_x << _KEY_SHIFT) + cell_y, ())
+                )
+        return sorted(candidates)
+
+    def query_point(self, point: Sequence[float]) -> List[int]:
+        """Getter for the ids of the boxes containing a point [x, y]"""
+        pos_x, pos_y = float(point[0]), float(point[1])
+        ids = []
+        for box_id in self._candidates((pos_x, pos_y, pos_x, pos_y)):
+            row = self._rows[box_id]
+            if row[0] <= pos_x <= row[2] and row[1] <= pos_y <= row[3]:
+                ids.append(box_id)
+        return ids
+
+    def query_box(self, box: Sequence[float]) -> List[int]:
+        """Getter for the ids of the boxes overlapping a box [xmin, ymin, xmax, ymax]"""
+        x_min, y_min, x_max, y_max = map(float, box)
+        ids = []
+        for box_id in self._candidates((x_min, y_min, x_max, y_max)):
+            row = self._rows[box_id]
+            is_x_overlap = x_min <= row[2] and row[0] <= x_max
+            if is_x_overlap and y_min <= row[3] and row[1] <= y_max:
+                ids.append(box_id)
+        return ids
+
+    def query_circle(self, center: Sequence[float], radius: float) -> List[int]:
+        """Getter for the ids of the boxes overlapping a disk"""
+        pos_x, pos_y = float(center[0]), float(center[1])
+        ids = []
+        for box_id in self._candidates(
+            (pos_x - radius, pos_y - radius, pos_x + radius, pos_y + radius)
+        ):
+            row = self._rows[box_id]
+            delta_x = max(row[0] - pos_x, 0.0, pos_x - row[2])
+            delta_y = max(row[1] - pos_y, 0.0, pos_y - row[3])
+            if delta_x * delta_x + delta_y * delta_y <= radius * radius:
+                ids.append(box_id)
+        return ids
+
+    def _sorted_cells(self) -> SortedCells:
+        """Getter for the sorted cells keys, their entries starts and the entries"""
+        if self._sorted is None:
+            keys = np.array(sorted(self._buckets), dtype=np.int64)
+            buckets = [self._buckets[key] for key in keys.tolist()]
+            sizes = np.array([len(bucket) for bucket in buckets], dtype=np.int64)
+            starts = np.concatenate([[0], np.cumsum(sizes)])
+            ids = np.array(
+                [box_id for bucket in buckets for box_id in bucket], dtype=np.int64
+            )
+            self._sorted = (keys, starts, ids)
+        return self._sorted
+
+    def _bulk_candidates(self, boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Getter for the unique (query id, box id) pairs of boxes sharing a cell"""
+        keys, starts, ids = self._sorted_cells()
+        if len(keys) == 0:
+            return np.zeros((0,), np.int64), np.zeros((0,), np.int64)
+        cells_min = np.floor(boxes[:, :2] / self.cell_size).astype(np.int64)
+        cells_max = np.floor(boxes[:, 2:] / self.cell_size).astype(np.int64)
+        sizes = cells_max - cells_min + 1
+        n_cells = sizes[:, 0] * sizes[:, 1]
+        # Cells covered by each query, ordered by x then y
+        query_ids = np.repeat(np.arange(len(boxes)), n_cells)
+        local = np.arange(n_cells.sum()) - np.repeat(
+            np.cumsum(n_cells) - n_cells, n_cells
+        )
+        y_sizes = sizes[query_ids, 1]
+        cell_x = cells_min[query_ids, 0] + local // y_sizes
+        cell_y = cells_min[query_ids, 1] + local % y_sizes
+        query_keys = (cell_x << _KEY_SHIFT) + cell_y
+
+        found = np.minimum(np.searchsorted(keys, query_keys), len(keys) - 1)
+        counts = np.where(
+            keys[found] == query_keys, starts[found + 1] - starts[found], 0
+        )
+        pair_queries = np.repeat(query_ids, counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_boxes = ids[np.repeat(starts[found], counts) + local]
+        if np.any(n_cells > 1):
+            pairs = np.unique(pair_queries * len(self._rows) + pair_boxes)
+            pair_queries, pair_boxes = np.divmod(pairs, len(self._rows))
+        return pair_queries, pair_boxes
+
+    def query_points(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Getter for the boxes containing each point of an array of shape (n_points, 2)
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: points ids and boxes ids of the pairs of
+            a point inside a box
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        point_ids, box_ids = self._bulk_candidates(np.concatenate([points, points], 1))
+        points, boxes = points[point_ids], self.boxes[box_ids]
+        is_inside = np.all((boxes[:, :2] <= points) & (points <= boxes[:, 2:]), axis=1)
+        return point_ids[is_inside], box_ids[is_inside]
+
+    def query_boxes(self, boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Getter for the boxes overlapping each box of an array of shape (n_queries, 4)
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: queries ids and boxes ids of the
+            overlapping pairs
+        """
+        queries = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        query_ids, box_ids = self._bulk_candidates(queries)
+        queries, boxes = queries[query_ids], self.boxes[box_ids]
+        is_overlap = np.all(
+            (queries[:, :2] <= boxes[:, 2:]) & (boxes[:, :2] <= queries[:, 2:]), axis=1
+        )
+        return query_ids[is_overlap], box_ids[is_overlap]
+
+    def query_circles(
+        self, centers: np.ndarray, radius: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Getter for the boxes overlapping disks of centers of shape (n_centers, 2)
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: centers ids and boxes ids of the
+            overlapping pairs
+        """
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+        query_ids, box_ids = self._bulk_candidates(
+            np.concatenate([centers - radius, centers + radius], axis=1)
+        )
+        centers, boxes = centers[query_ids], self.boxes[box_ids]
+        deltas = np.maximum(
+            np.maximum(boxes[:, :2] - centers, 0), centers - boxes[:, 2:]
+        )
+        is_overlap = np.sum(deltas**2, axis=1) <= radius**2
+        return query_ids[is_overlap], box_ids[is_overlap]
@@ -0,0 +1,83 @@
+"""Implementation of a rollout buffer keeping the observations dtypes"""
+from typing import Dict
+import numpy as np
+import torch as th
+from gym import spaces
+from stable_baselines3.common.buffers import DictRolloutBuffer, RolloutBuffer
+from stable_baselines3.common.on_policy_algorithm import OnPolicyAlgorithm
+
+
+class TypedDictRolloutBuffer(DictRolloutBuffer):
+    """Dict rollout buffer storing observations with the dtype of their space.
+
+    The SB3 dict rollout buffer stores every observation in float32, which
+    undoes float16 or uint8 lidar observations. Here they stay small in the
+    buffer and in the minibatches copied to the device, and the policy
+    converts them to float32 when preprocessing them. Observations are
+    copied once into the buffers, stacked lidar frames which are strided
+    views of the frames histories included.
+    """
+
+    def reset(self) -> None:
+        """Allocates the buffers, see ``DictRolloutBuffer.reset``"""
+        assert isinstance(self.obs_shape, dict), "Buffer needs a Dict obs space"
+        self.observations = {
+            key: np.zeros(
+                (self.buffer_size, self.n_envs) + tuple(obs_shape),
+                dtype=self.observation_space[key].dtype,  # type: ignore
+            )
+            for key, obs_shape in self.obs_shape.items()
+        }
+        shape = (self.buffer_size, self.n_envs)
+        self.actions = np.zeros(shape + (self.action_dim,), dtype=np.float32)
+        self.rewards = np.zeros(shape, dtype=np.float32)
+        self.returns = np.zeros(shape, dtype=np.float32)
+        self.episode_starts = np.zeros(shape, dtype=np.float32)
+        self.values = np.zeros(shape, dtype=np.float32)
+        self.log_probs = np.zeros(shape, dtype=np.float32)
+        self.advantages = np.zeros(shape, dtype=np.float32)
+        self.generator_ready = False
+        # pylint: disable=bad-super-call
+        super(RolloutBuffer, self).reset()
+
+    def add(  # pylint: disable=arguments-differ
+        self,
+        obs: Dict[str, np.ndarray],
+        action: np.ndarray,
+        reward: np.ndarray,
+        episode_start: np.ndarray,
+        value: th.Tensor,
+        log_prob: th.Tensor,
+    ) -> None:
+        """Copies a step of all envs into the buffers, see ``DictRolloutBuffer.add``"""
+        if len(log_prob.shape) == 0:
+            log_prob = log_prob.reshape(-1, 1)
+        for key, observations in self.observations.items():
+            np.copyto(observations[self.pos], obs[key], casting="unsafe")
+        self.actions[self.pos] = action.reshape((self.n_envs, self.action_dim))
+        self.rewards[self.pos] = reward
+        self.episode_starts[self.pos] = episode_start
+        self.values[self.pos] = value.clone().cpu().numpy().flatten()
+        self.log_probs[self.pos] = log_prob.clone().cpu().numpy()
+        self.pos += 1
+        if self.pos == self.buffer_size:
+            self.full = True
+
+
+def use_typed_rollout_buffer(model: OnPolicyAlgorithm) -> None:
+    """Replaces the rollout buffer of a model by a :class:`TypedDictRolloutBuffer`
+
+    Args:
+        model (OnPolicyAlgorithm): model with a Dict observation space
+    """
+    if not isinstance(model.observation_space, spaces.Dict):
+        return
+    model.rollout_buffer = TypedDictRolloutBuffer(
+        model.n_steps,
+        model.observation_space,
+        model.action_space,
+        device=model.device,
+        gamma=model.gamma,
+        gae_lambda=model.gae_lambda,
+        n_envs=model.n_envs,
+    )
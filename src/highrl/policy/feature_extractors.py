@@ -23,12 +23,22 @@ class LSTMFeatureExtractor(BaseFeaturesExtractor):
 
 
 class Robot2DFeatureExtractor(BaseFeaturesExtractor):
-    def __init__(self, observation_space: gym.spaces.Dict, features_dim: int = 37):
+    def __init__(
+        self,
+        observation_space: gym.spaces.Dict,
+        features_dim: int = 37,
+        lidar_scale: float = 1.0,
+    ):
         super().__init__(
             observation_space=observation_space, features_dim=features_dim
         )
+        # Converts the rings cells into occupancies on the device, see
+        # ``RingsLidarEncoder.lidar_scale``
+        self.lidar_scale = lidar_scale
 
-        n_input_channels = 1
+        # Rings are images of shape (frames, angles, ranges)
+        rings_shape = observation_space["lidar"].shape  # type: ignore
+        n_input_channels = rings_shape[0]
         self.cnn = nn.Sequential(
             nn.Conv2d(n_input_channels, 32, kernel_size=8, stride=4),
             nn.ReLU(),
@@ -39,23 +49,33 @@ class Robot2DFeatureExtractor(BaseFeaturesExtractor):
             nn.Conv2d(128, 256, kernel_size=1, stride=4),
             nn.ReLU(),
             nn.Flatten(),
-            nn.Linear(256, 32),
         )
+        with th.no_grad():
+            n_flatten = self.cnn(th.zeros((1,) + tuple(rings_shape))).shape[1]
+        self.cnn.append(nn.Linear(n_flatten, 32))
 
     def forward(self, observations: th.Tensor) -> th.Tensor:
-        lidar_obs = observations["lidar"]  # type: ignore
+        lidar_obs = observations["lidar"] * self.lidar_scale  # type: ignore
         rs_obs = observations["robot"]  # type: ignore
-        lidar_obs = th.unsqueeze(lidar_obs, dim=1)
         return th.cat((self.cnn(lidar_obs), rs_obs), axis=1)  # type: ignore
 
 
 class Robot1DFeatureExtractor(BaseFeaturesExtractor):
-    def __init__(self, observation_space: gym.spaces.Dict, features_dim: int = 37):
+    def __init__(
+        self,
+        observation_space: gym.spaces.Dict,
+        features_dim: int = 37,
+        lidar_scale: float = 1.0,
+    ):
         super().__init__(
             observation_space=observation_space, features_dim=features_dim
         )
+        # Dequantizes the lidar into meters, see ``FlatLidarEncoder.lidar_scale``
+        self.lidar_scale = lidar_scale
 
-        n_input_channels = 1
+        # Stacked scans of shape (frames, rays) are channels of the convolutions
+        lidar_shape = observation_space["lidar"].shape  # type: ignore
+        n_input_channels = lidar_shape[0] if len(lidar_shape) == 2 else 1
         self.cnn = nn.Sequential(
             nn.Conv1d(n_input_channels, 32, kernel_size=8, stride=4),
             nn.ReLU(),
@@ -66,13 +86,18 @@ class Robot1DFeatureExtractor(BaseFeaturesExtractor):
             nn.Conv1d(128, 256, kernel_size=1, stride=4),
             nn.ReLU(),
             nn.Flatten(),
-            nn.Linear(1024, 32),
         )
+        # Size of the flattened convolutions output depends on the lidar rays
+        lidar_dim = lidar_shape[-1]
+        with th.no_grad():
+            n_flatten = self.cnn(th.zeros(1, n_input_channels, lidar_dim)).shape[1]
+        self.cnn.append(nn.Linear(n_flatten, 32))
 
     def forward(self, observations: th.Tensor) -> th.Tensor:
-        lidar_obs = observations["lidar"]  # type: ignore
+        lidar_obs = observations["lidar"] * self.lidar_scale  # type: ignore
         rs_obs = observations["robot"]  # type: ignore
-        lidar_obs = th.unsqueeze(lidar_obs, dim=1)
+        if lidar_obs.dim() == 2:
+            lidar_obs = th.unsqueeze(lidar_obs, dim=1)
         return th.cat((self.cnn(lidar_obs), rs_obs), axis=1)  # type: ignore
 
 
@@ -1,7 +1,11 @@
 """Utilties for HighRL"""
+from typing import List, Optional
 from dataclasses import dataclass
 from configparser import RawConfigParser
 
+# Observation stages of robot envs whose config does not list them
+DEFAULT_OBSERVATION_STAGES = "downsample, quantize, stack"
+
 
 @dataclass
 class TeacherConfigs:
@@ -38,6 +42,9 @@ class TeacherConfigs:
     teacher_save_model_freq: int
     n_robot_eval_episodes: int
     render_eval: bool
+    n_robot_envs: int
+    worker_backend: str
+    coalesce_obstacles: bool
 
     def compute_success(self, episodes: int) -> int:
         """Calculate the number of success"""
@@ -100,6 +107,11 @@ def configure_teacher(config: RawConfigParser) -> TeacherConfigs:
         teacher_save_model_freq=config.getint("statistics", "save_model_freq"),
         n_robot_eval_episodes=config.getint("statistics", "n_robot_eval_episodes"),
         render_eval=config.getboolean("render", "render_eval"),
+        n_robot_envs=config.getint("env", "n_robot_envs", fallback=1),
+        worker_backend=config.get("env", "worker_backend", fallback="vectorized"),
+        coalesce_obstacles=config.getboolean(
+            "env", "coalesce_obstacles", fallback=False
+        ),
     )
     return cfg
 
@@ -133,6 +145,16 @@ class RobotConfigs:
     lidar_angle_increment: float
     lidar_min_angle: float
     lidar_max_angle: float
+    lidar_max_range: float
+    lidar_backend: str
+    lidar_grid_resolution: float
+    lidar_lut_resolution: float
+    lidar_lut_cache_dir: str
+    lidar_sectors: int
+    lidar_dtype: str
+    observation_stages: List[str]
+    history_len: int
+    normalize_clip: float
 
     collision_score: int
     reached_goal_score: int
@@ -147,18 +169,37 @@ class RobotConfigs:
     save_to_file: bool
 
     epsilon: int
+    reuse_obs_buffers: bool
     collect_statistics: bool
     scenario: str
 
     env_render_path: str
 
 
-def configure_robot(config: RawConfigParser, env_render_path: str) -> RobotConfigs:
+def parse_stages(value: str) -> List[str]:
+    """Split a comma separated list of observation stages"""
+    return [stage.strip() for stage in value.split(",") if stage.strip()]
+
+
+def configure_robot(
+    config: RawConfigParser,
+    env_render_path: str,
+    observation_stages: Optional[List[str]] = None,
+) -> RobotConfigs:
     """Configure environment variables using input config object
 
     Args:
         config (RawConfigParser): input config object
+        env_render_path (str): path of the rendered episodes
+        observation_stages (Optional[List[str]], optional): observation stages
+        replacing the ones of the config. Defaults to None.
     """
+    if observation_stages is None:
+        observation_stages = parse_stages(
+            config.get(
+                "lidar", "observation_stages", fallback=DEFAULT_OBSERVATION_STAGES
+            )
+        )
     return RobotConfigs(
         width=config.getint("dimensions", "width"),
         height=config.getint("dimensions", "height"),
@@ -170,6 +211,20 @@ def configure_robot(config: RawConfigParser, env_render_path: str) -> RobotConfi
         lidar_angle_increment=config.getfloat("lidar", "lidar_angle_increment"),
         lidar_min_angle=config.getfloat("lidar", "lidar_min_angle"),
         lidar_max_angle=config.getfloat("lidar", "lidar_max_angle"),
+        lidar_max_range=config.getfloat("lidar", "lidar_max_range", fallback=25.0),
+        lidar_backend=config.get("lidar", "lidar_backend", fallback="cmap2d"),
+        lidar_grid_resolution=config.getfloat(
+            "lidar", "lidar_grid_resolution", fallback=1.0
+        ),
+        lidar_lut_resolution=config.getfloat(
+            "lidar", "lidar_lut_resolution", fallback=1.0
+        ),
+        lidar_lut_cache_dir=config.get("lidar", "lidar_lut_cache_dir", fallback=""),
+        lidar_sectors=config.getint("lidar", "lidar_sectors", fallback=0),
+        lidar_dtype=config.get("lidar", "lidar_dtype", fallback="float32"),
+        observation_stages=observation_stages,
+        history_len=config.getint("lidar", "history_len", fallback=1),
+        normalize_clip=config.getfloat("lidar", "normalize_clip", fallback=10.0),
         collision_score=config.getint("reward", "collision_score"),
         reached_goal_score=config.getint("reward", "reached_goal_score"),
         minimum_velocity=config.getfloat("reward", "minimum_velocity"),
@@ -181,6 +236,7 @@ def configure_robot(config: RawConfigParser, env_render_path: str) -> RobotConfi
         render_each=config.getint("render", "render_each"),
         save_to_file=config.getboolean("render", "save_to_file"),
         epsilon=config.getint("env", "epsilon"),
+        reuse_obs_buffers=config.getboolean("env", "reuse_obs_buffers", fallback=False),
         collect_statistics=config.getboolean("statistics", "collect_statistics"),
         scenario=config.get("statistics", "scenario"),
         env_render_path=env_render_path,
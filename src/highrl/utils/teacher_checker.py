@@ -5,7 +5,7 @@ import time
 from collections import deque
 import numpy as np
 
-from highrl.obstacle.obstacles import Obstacles
+from highrl.obstacle.obstacles import ObstacleSet
 from highrl.utils import Position
 from highrl.agents.robot import Robot
 
@@ -31,14 +31,14 @@ def check_valid_point(point: np.ndarray, env_size: int) -> bool:
 
 
 def check_point_overlap(
-    obstacles: Obstacles,
+    obstacles: ObstacleSet,
     pos: Position[int],
     omit_first_four: bool = True,
 ) -> bool:
     """Check if the provided point is not overlapping with any of the obstacles
 
     Args:
-        obstacles (Obstacles): Obstacles in the environemnt. Those might include
+        obstacles (ObstacleSet): ObstacleSet in the environemnt. Those might include
         border obstacles.
         pos (Position[int]): Position of the object to be checked for overlapping
         omit_first_four (bool, optional): Whether to ignore the first 4 obstacles
@@ -47,17 +47,13 @@ def check_point_overlap(
     Returns:
         bool: Whether the provided point satisfies the overlapping contraints
     """
-    for idx, obstacle in enumerate(obstacles):
-        if idx < 4 and omit_first_four:
-            continue
-
-        if obstacle.overlap_point(pos):
-            return False
-    return True
+    first_obstacle = 4 if omit_first_four else 0
+    overlaps = obstacles.spatial_index().query_point(pos.to_list())
+    return all(idx < first_obstacle for idx in overlaps)
 
 
 def get_path_bfs(
-    obstacles: Obstacles,
+    obstacles: ObstacleSet,
     env_size: int,
     robot_pos: Position[int],
     goal_pos: Position[int],
@@ -66,7 +62,7 @@ def get_path_bfs(
     """Check if there is a valid path in the input segment
 
     Args:
-        obstacles (Obstacles): Obstacles in the environemnt
+        obstacles (ObstacleSet): ObstacleSet in the environemnt
         env_size (int): Environment size. Note that the environment is
         assumed to be a square here.
         robot_pos (List[int]): Robot position
@@ -87,7 +83,19 @@ def get_path_bfs(
     first_time = time.time()
     default_pos = Position[int](-1, -1)
     env_map = np.full((env_size + 1, env_size + 1), False)
-    
+
+    # Points of the map overlapping an obstacle, checked all at once
+    first_obstacle = 4 if omit_first_four else 0
+    grid_x, grid_y = np.meshgrid(
+        np.arange(env_size), np.arange(env_size), indexing="ij"
+    )
+    point_ids, obstacle_ids = obstacles.spatial_index().query_points(
+        np.stack([grid_x.ravel(), grid_y.ravel()], axis=1)
+    )
+    is_occupied = np.zeros((env_size * env_size,), dtype=bool)
+    is_occupied[point_ids[obstacle_ids >= first_obstacle]] = True
+    is_occupied = is_occupied.reshape(env_size, env_size)
+
     # Parent position stores the parent cell for each cell in the map
     # All of its values are initialized as (-1, -1) to ensure that each
     # point in the generated path MUST have a parent position.
@@ -119,7 +127,7 @@ def get_path_bfs(
             new_pos = Position[int](pos.x + delta_x[idx], pos.y + delta_y[idx])
             if (
                 check_valid_point(new_pos.get_coords(), env_size)
-                and check_point_overlap(obstacles, new_pos, omit_first_four)
+                and not is_occupied[new_pos.x, new_pos.y]
                 and not env_map[new_pos.x][new_pos.y]
             ):
                 # If the new point is inside the rectangle (between robot and goal),
@@ -208,7 +216,7 @@ def sample_line_points(
 
 
 def compute_difficulty(
-    obstacles: Obstacles,
+    obstacles: ObstacleSet,
     robot: Robot,
     width: int,
     _: int,
@@ -216,7 +224,7 @@ def compute_difficulty(
     """Calculate env complexity using convex_hull algorithm
 
     Args:
-        obstacles (Obstacles): env obstacles
+        obstacles (ObstacleSet): env obstacles
         robot (Robot): env robot
         width (int): env width
         height (int): env height
@@ -238,7 +246,7 @@ def compute_difficulty(
 
     # If there is no valid path, return infinite difficulty
     if not is_valid:
-        return INF, max(0, len(obstacles.obstacles_list) - 4)
+        return INF, max(0, len(obstacles) - 4)
 
     # Sample points on the line between the robot and the goal
     robot_to_goal_points = sample_line_points(rob_pos, goal_pos, step_size=1)
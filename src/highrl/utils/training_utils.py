@@ -1,6 +1,6 @@
 """Implementation of helper methods for training teacher and robot agents"""
-from typing import Union
-from dataclasses import dataclass
+from typing import Optional
+from dataclasses import dataclass, field
 from argparse import Namespace
 import logging
 from os import path
@@ -8,12 +8,25 @@ from time import time
 import pandas as pd
 from stable_baselines3.ppo.ppo import PPO
 from stable_baselines3.common.callbacks import CallbackList
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
 from torch.utils.tensorboard import SummaryWriter  # type: ignore
 
-from highrl.policy.feature_extractors import Robot1DFeatureExtractor
+from highrl.policy.feature_extractors import (
+    Robot1DFeatureExtractor,
+    Robot2DFeatureExtractor,
+)
+from highrl.policy.buffers import use_typed_rollout_buffer
 from highrl.callbacks import robot_callback
 from highrl.utils.general import TeacherConfigs
-from highrl.envs import env_encoders as env_enc
+from highrl.envs.robot_env import RobotEnv
+from highrl.envs.eval_env import RobotEvalEnv
+from highrl.obstacle.coalesce import CoalescingStats
+from highrl.obstacle.obstacles import SESSION_LAYER
+from highrl.envs.observation_pipeline import (
+    load_env_obs_stats,
+    obs_stats_path,
+    save_env_obs_stats,
+)
 
 _LOG = logging.getLogger(__name__)
 
@@ -35,8 +48,9 @@ class RobotMetrics:
 class TeacherMetrics:
     """Metrics for teacher training"""
 
-    robot_env: Union[env_enc.RobotEnv2DPlayer, env_enc.RobotEnv1DPlayer]
-    eval_env: Union[env_enc.EvalEnv1DPlayer, env_enc.EvalEnv2DPlayer]
+    robot_env: RobotEnv
+    eval_env: RobotEvalEnv
+    robot_vec_env: Optional[VecEnv] = None
     tb_writer: SummaryWriter = SummaryWriter("runs")
     reward: float = 0.0
     episodes: int = 0
@@ -46,6 +60,7 @@ class TeacherMetrics:
     time_steps: int = 0
     terminal_state_flag: bool = False
     residual_steps: int = 0
+    obstacles_stats: CoalescingStats = field(default_factory=CoalescingStats)
     session_statistics: pd.DataFrame = pd.DataFrame(
         columns=[
             "robot_id",
@@ -55,6 +70,8 @@ class TeacherMetrics:
             "current_difficulty_obst",
             "robot_level",
             "robot_num_successes",  # robot num_successes in this teacher session
+            "generated_obstacles",
+            "eliminated_obstacles",  # obstacles removed by the normalization
         ]
     )
 
@@ -78,6 +95,42 @@ class TeacherMetrics:
         return self.robot_env.results
 
 
+def sync_robot_vec_env(opt: TeacherMetrics) -> VecEnv:
+    """Copy the session prepared by the teacher on the robot env to the vectorized env
+
+    Args:
+        opt (TeacherMetrics): Teacher metrics holding both environments
+
+    Returns:
+        VecEnv: Vectorized environment ready for a new session
+    """
+    assert opt.robot_vec_env is not None, "Vectorized robot env is not initialized"
+    opt.robot_vec_env.env_method(
+        "load_session",
+        opt.robot_env.obstacles.layer(SESSION_LAYER),
+        opt.robot_env.opt.robot_init_pos,
+        opt.robot_env.opt.goal_init_pos,
+    )
+    return opt.robot_vec_env
+
+
+def collect_robot_vec_env_results(opt: TeacherMetrics) -> None:
+    """Copy the results of a vectorized session back to the robot env used by the teacher
+
+    Args:
+        opt (TeacherMetrics): Teacher metrics holding both environments
+    """
+    assert opt.robot_vec_env is not None, "Vectorized robot env is not initialized"
+    vec_env = opt.robot_vec_env
+    opt.robot_env.results = [
+        result for env_results in vec_env.get_attr("results") for result in env_results
+    ]
+    opt.robot_env.opt.num_successes = sum(vec_env.get_attr("num_successes"))
+    opt.robot_env.opt.total_steps = sum(vec_env.get_attr("total_steps"))
+    episode_rewards = vec_env.get_attr("episode_reward")
+    opt.robot_env.opt.episode_reward = sum(episode_rewards) / len(episode_rewards)
+
+
 def start_robot_session(
     args: Namespace,
     cfg: TeacherConfigs,
@@ -85,7 +138,15 @@ def start_robot_session(
     opt: TeacherMetrics,
 ) -> None:
     """Start training the robot for a session"""
-    policy_kwargs = {"features_extractor_class": Robot1DFeatureExtractor}
+    policy_kwargs = {
+        "features_extractor_class": (
+            Robot2DFeatureExtractor
+            if len(opt.robot_env.observation_space["lidar"].shape) == 3
+            else Robot1DFeatureExtractor
+        ),
+        "features_extractor_kwargs": {"lidar_scale": opt.robot_env.encoder.lidar_scale},
+    }
+    train_env = opt.robot_env if opt.robot_vec_env is None else sync_robot_vec_env(opt)
 
     if robot_metrics.level == 0:
         robot_metrics.iid += 1
@@ -93,7 +154,7 @@ def start_robot_session(
         _LOG.info("Initiating model ...")
         model = PPO(
             "MultiInputPolicy",
-            opt.robot_env,
+            train_env,
             policy_kwargs=policy_kwargs,
             verbose=2,
             device=args.device,
@@ -102,9 +163,14 @@ def start_robot_session(
         _LOG.info("Loading model ...")
         model = PPO.load(
             robot_metrics.previous_save_path,
-            opt.robot_env,
+            train_env,
             device=args.device,
         )
+        load_env_obs_stats(
+            train_env, obs_stats_path(robot_metrics.previous_save_path)
+        )
+    # Keeps float16 and uint8 lidar observations small in the rollout buffer
+    use_typed_rollout_buffer(model)
 
     robot_logpath = path.join(args.robot_logs_path, "robot_logs.csv")
     eval_logpath = path.join(args.robot_logs_path, "robot_eval_logs.csv")
@@ -112,7 +178,7 @@ def start_robot_session(
         args.robot_models_path, "test/best_tested_robot_model"
     )
     log_callback = robot_callback.RobotLogCallback(
-        train_env=opt.robot_env,
+        train_env=train_env,
         logpath=robot_logpath,
         eval_frequency=cfg.robot_log_eval_freq,
         verbose=0,
@@ -138,6 +204,8 @@ def start_robot_session(
     )
 
     model.learn(total_timesteps=int(1e9), reset_num_timesteps=False, callback=callback)
+    if opt.robot_vec_env is not None:
+        collect_robot_vec_env_results(opt)
 
     _LOG.info("Saving model ...")
     model_save_path = path.join(
@@ -147,3 +215,4 @@ def start_robot_session(
     _LOG.debug("Model saved to %s", model_save_path)
     robot_metrics.previous_save_path = model_save_path
     model.save(model_save_path)
+    save_env_obs_stats(train_env, obs_stats_path(model_save_path))
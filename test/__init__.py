@@ -0,0 +1,47 @@
+"""Helpers shared by the tests"""
+import unittest
+import tempfile
+from os import path
+from unittest import mock
+from configparser import RawConfigParser
+
+from highrl.configs import robot_config_str
+from highrl.utils.robot_utils import RobotOpt
+
+
+def make_robot_config(**sections: dict) -> RawConfigParser:
+    """Create a robot config that does not render nor collect statistics
+
+    Args:
+        **sections (dict): options overriding the robot config, by section,
+        e.g. ``timesteps={"max_episode_steps": 30}``
+
+    Returns:
+        RawConfigParser: robot config
+    """
+    config = RawConfigParser()
+    config.read_string(robot_config_str)
+    config.set("render", "render_each", "1000000")
+    config.set("statistics", "collect_statistics", "False")
+    for section, options in sections.items():
+        for option, value in options.items():
+            config.set(section, option, str(value))
+    return config
+
+
+def use_temp_tensorboard_dir(test_case: unittest.TestCase) -> None:
+    """Write the tensorboard events of the robot envs created by a test into
+    a temporary directory, removed after the test"""
+    tb_dir = tempfile.TemporaryDirectory()
+    # Cleanups run last in, first out, the directory is removed last
+    test_case.addCleanup(tb_dir.cleanup)
+    set_tb_writer = RobotOpt.set_tb_writer
+
+    def set_temp_tb_writer(opt: RobotOpt, path_to_events: str) -> None:
+        set_tb_writer(opt, path.join(tb_dir.name, path_to_events))
+        # Writers flush from a thread, they are closed before the directory
+        test_case.addCleanup(opt.tb_writer.close)
+
+    patcher = mock.patch.object(RobotOpt, "set_tb_writer", set_temp_tb_writer)
+    patcher.start()
+    test_case.addCleanup(patcher.stop)
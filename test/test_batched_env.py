@@ -0,0 +1,93 @@
+"""Tests for the batched robot environment"""
+import unittest
+import argparse
+import numpy as np
+
+from highrl.envs.robot_env import RobotEnv
+from highrl.envs.batched_env import BatchedRobotEnv
+from highrl.obstacle.single_obstacle import SingleObstacle
+from highrl.utils import Position
+from test import make_robot_config, use_temp_tensorboard_dir
+
+
+class BatchedRobotEnvTest(unittest.TestCase):
+    """Testing batched robot environment against the scalar one"""
+
+    robot_positions = [(10, 10), (100, 120), (30, 200), (240, 30)]
+    goal_positions = [(14, 14), (200, 200), (30, 220), (60, 60)]
+    obstacles = [(40, 190, 20, 20), (100, 100, 30, 10), (230, 40, 10, 50)]
+
+    def setUp(self) -> None:
+        use_temp_tensorboard_dir(self)
+
+    def _make_envs(self):
+        config = make_robot_config(
+            timesteps={"delta_t": 2.0, "max_episode_steps": 40}
+        )
+        args = argparse.Namespace(env_render_path="")
+        n_envs = len(self.robot_positions)
+        batched_env = BatchedRobotEnv(config, args, n_envs=n_envs)
+        batched_env.obstacles.add_obstacles(
+            [SingleObstacle(*obstacle) for obstacle in self.obstacles]
+        )
+        batched_env.set_robot_position(
+            np.array(self.robot_positions), np.array(self.goal_positions)
+        )
+        scalar_envs = []
+        for robot_pos, goal_pos in zip(self.robot_positions, self.goal_positions):
+            env = RobotEnv(config, args)
+            env.obstacles.add_obstacles(
+                [SingleObstacle(*obstacle) for obstacle in self.obstacles]
+            )
+            env.set_robot_position(Position[int](*robot_pos), Position[int](*goal_pos))
+            scalar_envs.append(env)
+        return batched_env, scalar_envs
+
+    def test_matches_scalar_env(self) -> None:
+        """Testing that stepping the batch matches stepping scalar envs bit-for-bit"""
+        batched_env, scalar_envs = self._make_envs()
+        rng = np.random.default_rng(seed=0)
+
+        batched_obs = batched_env.reset()
+        scalar_obs = [env.reset() for env in scalar_envs]
+        n_dones = 0
+        for _ in range(120):
+            actions = rng.uniform(-1, 1, size=(len(scalar_envs), 2)).astype(np.float32)
+            batched_obs, rewards, dones, _ = batched_env.step(actions)
+            for idx, env in enumerate(scalar_envs):
+                obs, reward, done, _ = env.step(actions[idx])
+                scalar_obs[idx] = obs
+                self.assertEqual(reward, rewards[idx])
+                self.assertEqual(done, dones[idx])
+                self.assertTrue(np.array_equal(obs["lidar"], batched_obs["lidar"][idx]))
+                self.assertTrue(
+                    np.array_equal(
+                        obs["robot"].astype(np.float32), batched_obs["robot"][idx]
+                    )
+                )
+                if done:
+                    n_dones += 1
+                    scalar_obs[idx] = env.reset()
+            if dones.any():
+                batched_obs = batched_env.reset(np.flatnonzero(dones))
+                for idx, env in enumerate(scalar_envs):
+                    self.assertTrue(
+                        np.array_equal(
+                            scalar_obs[idx]["lidar"], batched_obs["lidar"][idx]
+                        )
+                    )
+
+        self.assertGreater(n_dones, 0, msg="Episodes should end during the test")
+        for idx, env in enumerate(scalar_envs):
+            self.assertListEqual(env.results, batched_env.results[idx])
+
+    def test_collision_detection(self) -> None:
+        """Testing that only robots overlapping obstacles are flagged"""
+        batched_env, _ = self._make_envs()
+        batched_env.reset()
+        batched_env.set_robot_position(
+            np.array([[45, 195], [10, 10], [0, 100], [150, 150]]),
+            np.array(self.goal_positions),
+        )
+        expected = [True, False, True, False]
+        self.assertListEqual(expected, batched_env.detect_collison().tolist())
@@ -0,0 +1,89 @@
+"""Tests for the normalization of the obstacles generated by the teacher"""
+import unittest
+from typing import List
+import numpy as np
+
+from highrl.obstacle.coalesce import coalesce_obstacles
+from highrl.obstacle.single_obstacle import SingleObstacle
+
+
+def union_mask(obstacles: List[SingleObstacle], points: np.ndarray) -> np.ndarray:
+    """Compute which points are inside the closed obstacles with an area"""
+    mask = np.zeros(len(points), dtype=bool)
+    for obstacle in obstacles:
+        if obstacle.width <= 0 or obstacle.height <= 0:
+            continue
+        corner = obstacle.box[:2]
+        mask |= np.all((corner <= points) & (points <= corner + obstacle.box[2:]), 1)
+    return mask
+
+
+class CoalesceObstaclesTest(unittest.TestCase):
+    """Testing that normalized obstacles cover the area of the generated obstacles"""
+
+    def test_simple_cases(self) -> None:
+        """Testing degenerate, contained, equal and adjacent obstacles"""
+        obstacles, stats = coalesce_obstacles(
+            [
+                SingleObstacle(0, 0, 10, 4),
+                SingleObstacle(5, 5, 0, 3),
+                SingleObstacle(2, 1, 3, 2),
+                SingleObstacle(0, 0, 10, 4),
+                SingleObstacle(10, 0, 5, 4),
+            ]
+        )
+        self.assertListEqual([[0, 0, 15, 4]], [obs.box.tolist() for obs in obstacles])
+        self.assertEqual(5, stats.n_obstacles)
+        self.assertEqual(1, stats.n_degenerate)
+        self.assertEqual(2, stats.n_contained)
+        self.assertEqual(1, stats.n_merged)
+        self.assertEqual(0, stats.n_covered + stats.n_decomposed)
+        self.assertEqual(4, stats.n_eliminated)
+
+        # Two merged obstacles cover a third one
+        obstacles, stats = coalesce_obstacles(
+            [
+                SingleObstacle(0, 0, 4, 4),
+                SingleObstacle(4, 0, 4, 4),
+                SingleObstacle(2, 1, 4, 2),
+            ]
+        )
+        self.assertListEqual([[0, 0, 8, 4]], [obs.box.tolist() for obs in obstacles])
+        self.assertEqual(
+            (1, 1, 0), (stats.n_merged, stats.n_covered, stats.n_decomposed)
+        )
+
+        # Overlapping obstacles whose union is a rectangle but no pair can merge
+        obstacles, stats = coalesce_obstacles(
+            [
+                SingleObstacle(0, 0, 2, 2),
+                SingleObstacle(1, 0, 2, 1),
+                SingleObstacle(2, 1, 1, 1),
+            ]
+        )
+        self.assertListEqual([[0, 0, 3, 2]], [obs.box.tolist() for obs in obstacles])
+        self.assertEqual(
+            (0, 0, 2), (stats.n_merged, stats.n_covered, stats.n_decomposed)
+        )
+        self.assertEqual(2, stats.n_eliminated)
+
+        obstacles, stats = coalesce_obstacles([])
+        self.assertListEqual([], obstacles)
+        self.assertEqual(0, stats.n_eliminated)
+
+    def test_random_obstacles(self) -> None:
+        """Testing that the union is kept with fewer obstacles"""
+        rng = np.random.default_rng(seed=0)
+        grid = np.arange(-1, 30, 0.5)
+        points = np.stack(np.meshgrid(grid, grid), axis=2).reshape(-1, 2)
+        for _ in range(100):
+            boxes = rng.integers(0, 20, size=(rng.integers(1, 15), 4))
+            boxes[:, 2:] = rng.integers(0, 8, size=(len(boxes), 2))
+            generated = [SingleObstacle(*box) for box in boxes.tolist()]
+            obstacles, stats = coalesce_obstacles(generated)
+            self.assertEqual(len(generated), stats.n_obstacles)
+            self.assertEqual(len(generated) - stats.n_eliminated, len(obstacles))
+            self.assertTrue(all(obs.width > 0 and obs.height > 0 for obs in obstacles))
+            np.testing.assert_array_equal(
+                union_mask(generated, points), union_mask(obstacles, points)
+            )
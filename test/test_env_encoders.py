@@ -0,0 +1,268 @@
+"""Tests for the lidar observations encoders"""
+import importlib
+import sys
+import unittest
+from unittest import mock
+import argparse
+from configparser import RawConfigParser
+import numpy as np
+from stable_baselines3.ppo.ppo import PPO
+
+from highrl.configs import robot_config_str
+from highrl.envs.env_encoders import FlatLidarEncoder, RingsLidarEncoder
+from highrl.envs.vec_env import RobotVecEnv
+from highrl.lidar_setup import rings as rings_module
+from highrl.lidar_setup.rings import (
+    generate_downsampling_map,
+    get_downsampling_map,
+    numpy_lidar_to_rings,
+)
+from highrl.obstacle.single_obstacle import SingleObstacle
+from highrl.policy.buffers import use_typed_rollout_buffer
+from highrl.policy.feature_extractors import (
+    Robot1DFeatureExtractor,
+    Robot2DFeatureExtractor,
+)
+from test import use_temp_tensorboard_dir
+
+
+class FlatLidarEncoderTest(unittest.TestCase):
+    """Testing downsampled and quantized flat lidar observations"""
+
+    def setUp(self) -> None:
+        use_temp_tensorboard_dir(self)
+        self.rng = np.random.default_rng(seed=0)
+
+    def test_min_pooling(self) -> None:
+        """Testing that sectors keep the closest range of their rays"""
+        encoder = FlatLidarEncoder(10, n_sectors=4)
+        scans = self.rng.uniform(0, 25, size=(3, 10)).astype(np.float32)
+        lidar = encoder.encode_obs({"lidar": scans})["lidar"]
+        self.assertEqual((3, 4), lidar.shape)
+        for sector, rays in enumerate([[0, 1, 2], [3, 4], [5, 6, 7], [8, 9]]):
+            np.testing.assert_array_equal(scans[:, rays].min(axis=1), lidar[:, sector])
+
+    def test_quantization(self) -> None:
+        """Testing that quantized ranges never exceed the actual ranges"""
+        scan = self.rng.uniform(0, 25, size=(1080,)).astype(np.float32)
+        scan[0], scan[4:8] = 0.0, 25.0
+        for dtype, max_error in [("float16", 0.02), ("uint8", 25 / 255)]:
+            encoder = FlatLidarEncoder(1080, n_sectors=270, dtype=dtype)
+            lidar = encoder.encode_obs({"lidar": scan})["lidar"]
+            self.assertEqual(np.dtype(dtype), lidar.dtype)
+            self.assertTrue(encoder.observation_space["lidar"].contains(lidar))
+            expected = np.minimum.reduceat(scan, np.arange(0, 1080, 4))
+            error = expected - lidar.astype(np.float32) * encoder.lidar_scale
+            self.assertLessEqual(np.abs(error).max(), max_error)
+            if dtype == "uint8":
+                self.assertGreaterEqual(error.min(), 0.0)
+                self.assertEqual([0, 255], lidar[:2].tolist())
+        with self.assertRaises(ValueError):
+            FlatLidarEncoder(1080, dtype="int8")
+
+    def test_ppo_with_quantized_lidar(self) -> None:
+        """Testing that PPO trains on uint8 lidar sectors kept in uint8"""
+        config = RawConfigParser()
+        config.read_string(robot_config_str)
+        config.set("render", "render_each", "1000000")
+        config.set("statistics", "collect_statistics", "False")
+        config.set("lidar", "lidar_sectors", "135")
+        config.set("lidar", "lidar_dtype", "uint8")
+        vec_env = RobotVecEnv(config, argparse.Namespace(env_render_path=""), n_envs=2)
+        vec_env.env.obstacles.add_obstacles([SingleObstacle(20, 20, 10, 10)])
+        vec_env.env.set_robot_position(
+            np.array([[10, 10], [60, 60]]), np.array([[200, 200], [100, 100]])
+        )
+        model = PPO(
+            "MultiInputPolicy",
+            vec_env,
+            policy_kwargs={
+                "features_extractor_class": Robot1DFeatureExtractor,
+                "features_extractor_kwargs": {
+                    "lidar_scale": vec_env.encoder.lidar_scale
+                },
+            },
+            n_steps=8,
+            batch_size=8,
+            n_epochs=1,
+            device="cpu",
+        )
+        use_typed_rollout_buffer(model)
+        model.learn(total_timesteps=32)
+        lidar_buffer = model.rollout_buffer.observations["lidar"]
+        self.assertEqual(np.uint8, lidar_buffer.dtype)
+        self.assertEqual(135, lidar_buffer.shape[-1])
+
+
+def reference_rings(scans: np.ndarray, rings_def: dict) -> np.ndarray:
+    """Compute float rings of shape (n_scans, 1, 64, 64) cell by cell"""
+    mins, maxs = rings_def["range_level_mins"], rings_def["range_level_maxs"]
+    _, j_to_ii = generate_downsampling_map(scans.shape[1], 64)
+    rings = np.zeros((len(scans), 64, 64))
+    for j, ii in enumerate(j_to_ii):
+        rays = np.where(scans[:, ii] == 0, np.inf, scans[:, ii])[:, :, None]
+        is_short = np.any(rays < mins, axis=1)
+        is_hit = np.any((mins <= rays) & (rays < maxs), axis=1)
+        rings[:, j] = np.maximum(is_short * 0.5, is_hit * 1.0)
+    return rings.reshape(len(scans), 1, 64, 64)
+
+
+class RingsLidarEncoderTest(unittest.TestCase):
+    """Testing rings lidar observations written into reused buffers"""
+
+    def setUp(self) -> None:
+        use_temp_tensorboard_dir(self)
+        rng = np.random.default_rng(seed=0)
+        self.scans = rng.uniform(0, 30, size=(3, 1080)).astype(np.float32)
+        self.scans[:, :10] = 0.0
+
+    def test_rings_values(self) -> None:
+        """Testing that float32 and uint8 rings match the reference rings"""
+        float_encoder = RingsLidarEncoder("float32")
+        expected = reference_rings(self.scans, float_encoder.rings_def)
+        rings = float_encoder.encode_obs({"lidar": self.scans})["lidar"]
+        self.assertEqual(np.float32, rings.dtype)
+        np.testing.assert_array_equal(expected, rings)
+
+        uint8_encoder = RingsLidarEncoder("uint8")
+        rings = uint8_encoder.encode_obs({"lidar": self.scans[0]})["lidar"]
+        self.assertEqual((1, 64, 64), rings.shape)
+        self.assertTrue(uint8_encoder.observation_space["lidar"].contains(rings))
+        np.testing.assert_array_equal(expected[0], rings * uint8_encoder.lidar_scale)
+        with self.assertRaises(ValueError):
+            RingsLidarEncoder("float16")
+
+    def test_out_buffer(self) -> None:
+        """Testing that rings are written into the given buffer"""
+        encoder = RingsLidarEncoder("uint8")
+        out = np.full((3, encoder.ring_dim), 7, dtype=np.uint8)
+        rings = encoder.encode_obs({"lidar": self.scans}, out=out)["lidar"]
+        self.assertIs(out, rings)
+        self.assertLessEqual(out.max(), 2)
+
+    @unittest.skipUnless(
+        rings_module.RINGS_BACKEND == "cython", "lidar2d_fast is not built"
+    )
+    def test_strided_out_buffer(self) -> None:
+        """Testing that the Cython rings reject non contiguous buffers"""
+        encoder = RingsLidarEncoder("uint8")
+        with self.assertRaises(ValueError):
+            encoder.encode_obs(
+                {"lidar": self.scans}, out=np.zeros((3, 8192), np.uint8)[:, ::2]
+            )
+
+    def test_batched_rings(self) -> None:
+        """Testing that batched rings match the rings of each scan"""
+        encoder = RingsLidarEncoder("uint8")
+        scans = np.concatenate([self.scans, np.full((1, 1080), np.inf, np.float32)])
+        rings = encoder.encode_obs({"lidar": scans})["lidar"]
+        for scan, scan_rings in zip(scans, rings):
+            np.testing.assert_array_equal(
+                encoder.encode_obs({"lidar": scan})["lidar"], scan_rings
+            )
+        self.assertFalse(rings[-1].any())
+        with self.assertRaises(ValueError):
+            encoder.rings_def["lidar_to_rings"](
+                scans, np.zeros((len(scans) + 1, 64, 64, 1), np.uint8)
+            )
+
+    def test_numpy_rings(self) -> None:
+        """Testing that the NumPy rings match the Cython rings"""
+        encoder = RingsLidarEncoder("float32")
+        rings_def = encoder.rings_def
+        scans = np.concatenate([self.scans, np.full((1, 1080), np.nan, np.float32)])
+        scans[1, : 63 * 16 : 16] = rings_def["range_level_mins"][1:]
+        rings = numpy_lidar_to_rings(
+            scans, 64, 64, rings_def["range_level_mins"], rings_def["range_level_maxs"]
+        )
+        np.testing.assert_array_equal(rings_def["lidar_to_rings"](scans), rings)
+        out = np.empty((len(scans), encoder.ring_dim), np.float32)
+        np.testing.assert_array_equal(
+            encoder.encode_obs({"lidar": scans})["lidar"],
+            numpy_lidar_to_rings(
+                scans,
+                64,
+                64,
+                rings_def["range_level_mins"],
+                rings_def["range_level_maxs"],
+                out.reshape(len(scans), 64, 64, 1),
+                0.5,
+            ).reshape(len(scans), 1, 64, 64),
+        )
+
+    def test_numpy_backend_selection(self) -> None:
+        """Testing that the NumPy rings are used without the Cython extension"""
+        try:
+            with mock.patch.dict(sys.modules, {"lidar2d_fast": None}):
+                importlib.reload(rings_module)
+            rings_def = rings_module.generate_rings()
+            self.assertEqual("numpy", rings_def["backend"])
+            rings = rings_def["lidar_to_rings"](self.scans)
+        finally:
+            importlib.reload(rings_module)
+        expected = numpy_lidar_to_rings(
+            self.scans,
+            64,
+            64,
+            rings_def["range_level_mins"],
+            rings_def["range_level_maxs"],
+        )
+        np.testing.assert_array_equal(expected, rings)
+
+    def test_rings_to_lidar(self) -> None:
+        """Testing that decoded rays are the nearest level of their sector"""
+        encoder = RingsLidarEncoder("uint8")
+        rings_def = encoder.rings_def
+        i_to_j, _ = generate_downsampling_map(1080, 64)
+        levels = rings_def["range_level_mins"][1:-1]
+        scans = np.stack([levels[i_to_j % 62] + 0.001, levels[i_to_j % 31]])
+        scans[1, 1::2] += 1.0
+        rings = encoder.encode_obs({"lidar": scans})["lidar"]
+        decoded = rings_def["rings_to_lidar"](rings)
+        np.testing.assert_array_equal(levels[i_to_j % 62], decoded[0])
+        np.testing.assert_array_equal(levels[i_to_j % 31], decoded[1])
+        out = np.empty((2, 1080), np.float32)
+        rings = rings.reshape(2, 64, 64, 1) / 2.0
+        self.assertIs(out, rings_def["rings_to_lidar"](rings, out=out))
+        np.testing.assert_array_equal(decoded, out)
+
+    def test_shared_rings_def(self) -> None:
+        """Testing that encoders share read-only rings definitions"""
+        encoder = RingsLidarEncoder("float32")
+        self.assertIs(encoder.rings_def, RingsLidarEncoder("uint8", 25).rings_def)
+        self.assertIsNot(encoder.rings_def, RingsLidarEncoder(max_range=10.0).rings_def)
+        with self.assertRaises(ValueError):
+            encoder.rings_def["range_level_mins"][0] = 1.0
+        i_to_j, j_to_ii = get_downsampling_map(1080, 64)
+        self.assertIs(i_to_j, get_downsampling_map(1080.0, 64)[0])
+        self.assertFalse(j_to_ii[0].flags.writeable)
+
+    def test_ppo_with_rings(self) -> None:
+        """Testing that PPO trains a 2D CNN on uint8 rings kept in uint8"""
+        config = RawConfigParser()
+        config.read_string(robot_config_str)
+        config.set("render", "render_each", "1000000")
+        config.set("statistics", "collect_statistics", "False")
+        encoder = RingsLidarEncoder("uint8")
+        vec_env = RobotVecEnv(
+            config, argparse.Namespace(env_render_path=""), n_envs=2, encoder=encoder
+        )
+        vec_env.env.obstacles.add_obstacles([SingleObstacle(20, 20, 10, 10)])
+        model = PPO(
+            "MultiInputPolicy",
+            vec_env,
+            policy_kwargs={
+                "features_extractor_class": Robot2DFeatureExtractor,
+                "features_extractor_kwargs": {"lidar_scale": encoder.lidar_scale},
+            },
+            n_steps=8,
+            batch_size=8,
+            n_epochs=1,
+            device="cpu",
+        )
+        use_typed_rollout_buffer(model)
+        model.learn(total_timesteps=32)
+        lidar_buffer = model.rollout_buffer.observations["lidar"]
+        self.assertEqual(np.uint8, lidar_buffer.dtype)
+        self.assertEqual((1, 64, 64), lidar_buffer.shape[-3:])
+        self.assertLessEqual(lidar_buffer.max(), 2)
@@ -0,0 +1,114 @@
+"""Tests for the LiDAR sensor"""
+import unittest
+import argparse
+from unittest import mock
+from configparser import RawConfigParser
+import numpy as np
+import torch as th
+
+from highrl.configs import robot_config_str
+from highrl.envs.robot_env import RobotEnv
+from highrl.envs.vec_env import RobotVecEnv
+from highrl.lidar_setup import raycast
+from highrl.lidar_setup.rings import get_rings
+from highrl.lidar_setup.sensor import LidarSensor
+from highrl.obstacle.single_obstacle import SingleObstacle
+from highrl.policy.feature_extractors import Robot1DFeatureExtractor
+from highrl.utils.general import configure_robot
+from test import make_robot_config, use_temp_tensorboard_dir
+
+
+def make_lidar_config(n_angles: int, backend: str = "cmap2d") -> RawConfigParser:
+    """Create a robot config with the given lidar"""
+    return make_robot_config(
+        lidar={
+            "n_angles": n_angles,
+            "lidar_angle_increment": 2 * np.pi / n_angles,
+            "lidar_backend": backend,
+        }
+    )
+
+
+class LidarSensorTest(unittest.TestCase):
+    """Testing LiDAR sensor built from the lidar config"""
+
+    def setUp(self) -> None:
+        use_temp_tensorboard_dir(self)
+        self.args = argparse.Namespace(env_render_path="")
+        self.obstacles = [SingleObstacle(40, 40, 10, 20), SingleObstacle(0, 0, 5, 5)]
+
+    def test_rays_cover_full_turn(self) -> None:
+        """Testing that default rays are spread uniformly over a full turn"""
+        config = RawConfigParser()
+        config.read_string(robot_config_str)
+        lidar = LidarSensor(configure_robot(config, ""))
+        self.assertEqual((1080,), lidar.observation_shape)
+        np.testing.assert_allclose(np.diff(lidar.angles), 2 * np.pi / 1080, rtol=1e-4)
+        self.assertEqual(0.0, lidar.angles[0])
+
+    def test_scan_matches_scan_batch(self) -> None:
+        """Testing that single and batched scans agree for all backends"""
+        poses = np.array([[30, 30, 0.3], [60, 45, -2.0]], dtype=np.float32)
+        backends = ["cmap2d", "aabb", "grid"]
+        if raycast.cast_rays_batch is not None:
+            backends.append("openmp")
+        for backend in backends:
+            lidar = LidarSensor(configure_robot(make_lidar_config(90, backend), ""))
+            lidar.set_obstacles(self.obstacles)
+            scans = lidar.scan_batch(poses)
+            self.assertEqual((2, 90), scans.shape)
+            for pose, scan in zip(poses, scans):
+                np.testing.assert_allclose(scan, lidar.scan(pose), atol=1e-4)
+            self.assertLess(scans[0].min(), lidar.max_range)
+
+    def test_n_angles_shrinks_observations(self) -> None:
+        """Testing that fewer rays shrink observations and feature extractor input"""
+        env = RobotEnv(make_lidar_config(360), self.args)
+        self.assertEqual((360,), env.observation_space["lidar"].shape)
+        self.assertEqual((360,), env.reset()["lidar"].shape)
+
+        vec_env = RobotVecEnv(make_lidar_config(360), self.args, n_envs=2)
+        obs = vec_env.reset()
+        self.assertEqual((2, 360), obs["lidar"].shape)
+
+        extractor = Robot1DFeatureExtractor(vec_env.observation_space)
+        features = extractor({key: th.as_tensor(value) for key, value in obs.items()})
+        self.assertEqual((2, 37), tuple(features.shape))
+
+    def test_rasterized_rings_match_scanned_rings(self) -> None:
+        """Testing that rings rasterized from the obstacles match rings of scans"""
+        backend = "aabb" if raycast.cast_rings_batch is None else "openmp"
+        lidar = LidarSensor(configure_robot(make_lidar_config(1080, backend), ""))
+        lidar.set_obstacles(self.obstacles)
+        rings_def = get_rings()
+        poses = np.array(
+            [[30, 30, 0.3], [60, 45, -2.0], [45, 50, 1.0]], dtype=np.float32
+        )
+        expected = rings_def["lidar_to_rings"](lidar.scan_batch(poses))
+        rings = lidar.rasterize_rings(poses, rings_def)
+        np.testing.assert_array_equal(expected.reshape(3, 64, 64), rings)
+
+        out = np.empty((3, 1, 64, 64), dtype=np.float32)
+        rings = lidar.rasterize_rings(poses, rings_def, out, rays_per_sector=4)
+        self.assertEqual(256, len(lidar.rings_rays(64, 4)[0]))
+        self.assertGreater(np.mean(expected.reshape(out.shape) == 2 * out), 0.95)
+        with self.assertRaises(ValueError):
+            lidar.rasterize_rings(poses, rings_def, out[:2])
+
+    def test_rasterized_rings_without_extension(self) -> None:
+        """Testing that rings are rasterized from scans without lidar2d_batch"""
+        lidar = LidarSensor(configure_robot(make_lidar_config(1080, "aabb"), ""))
+        lidar.set_obstacles(self.obstacles)
+        rings_def = get_rings()
+        poses = np.array([[30, 30, 0.3], [60, 45, -2.0]], dtype=np.float32)
+        expected = rings_def["lidar_to_rings"](lidar.scan_batch(poses))
+        out = np.empty((2, 1, 64, 64), dtype=np.float32)
+        with mock.patch.object(raycast, "cast_rings_batch", None):
+            np.testing.assert_array_equal(
+                expected.reshape(2, 64, 64), lidar.rasterize_rings(poses, rings_def)
+            )
+            rings = lidar.rasterize_rings(poses, rings_def, out)
+            with self.assertRaises(ValueError):
+                lidar.rasterize_rings(poses, rings_def, out[:1])
+        self.assertTrue(np.shares_memory(out, rings))
+        np.testing.assert_array_equal(expected.reshape(out.shape), 2 * out)
@@ -0,0 +1,278 @@
+"""Tests for the observation pipeline of the robot environments"""
+import itertools
+import unittest
+import argparse
+import tempfile
+from os import path
+from configparser import RawConfigParser
+import numpy as np
+from stable_baselines3.ppo.ppo import PPO
+
+from highrl.envs.env_encoders import FlatLidarEncoder, RingsLidarEncoder
+from highrl.envs.eval_env import RobotEvalEnv
+from highrl.envs.observation_pipeline import (
+    FrameStackStage,
+    NormalizeStage,
+    ObservationPipeline,
+    QuantizeStage,
+    RingsStage,
+    get_env_obs_stats,
+    load_env_obs_stats,
+)
+from highrl.envs.robot_env import RobotEnv
+from highrl.envs.vec_env import RobotVecEnv
+from highrl.obstacle.single_obstacle import SingleObstacle
+from highrl.policy.buffers import use_typed_rollout_buffer
+from highrl.policy.feature_extractors import Robot1DFeatureExtractor
+from highrl.utils import Position
+from test import make_robot_config, use_temp_tensorboard_dir
+
+
+def make_pipeline_config(
+    stages: str, sectors: int = 0, dtype: str = "float32", history_len: int = 1
+) -> RawConfigParser:
+    """Create a robot config encoding observations with the given stages"""
+    return make_robot_config(
+        lidar={
+            "observation_stages": stages,
+            "lidar_sectors": sectors,
+            "lidar_dtype": dtype,
+            "history_len": history_len,
+        }
+    )
+
+
+class ObservationPipelineTest(unittest.TestCase):
+    """Testing observation stages declared in the robot config"""
+
+    def setUp(self) -> None:
+        use_temp_tensorboard_dir(self)
+        self.args = argparse.Namespace(env_render_path="")
+        rng = np.random.default_rng(seed=0)
+        self.scans = rng.uniform(0, 30, size=(3, 1080)).astype(np.float32)
+
+    def _make_env(self, config: RawConfigParser) -> RobotEnv:
+        env = RobotEnv(config, self.args)
+        env.obstacles.add_obstacles([SingleObstacle(150, 150, 20, 20)])
+        env.set_robot_position(Position[float](100, 100), Position[float](200, 200))
+        return env
+
+    def test_flat_stages(self) -> None:
+        """Testing that the env lidar is downsampled and quantized in buffers"""
+        env = self._make_env(make_pipeline_config("downsample, quantize", 270, "uint8"))
+        self.assertEqual((270,), env.observation_space["lidar"].shape)
+        self.assertAlmostEqual(25.0 / 255, env.encoder.lidar_scale)
+        first, second, third = (env.reset()["lidar"] for _ in range(3))
+        self.assertEqual(np.uint8, first.dtype)
+        self.assertIsNot(first, second)
+        self.assertIs(first, third)
+        encoder = FlatLidarEncoder(1080, 270, "uint8")
+        expected = encoder.encode_obs({"lidar": env.opt.lidar_scan})["lidar"]
+        np.testing.assert_array_equal(expected, third)
+
+    def test_idle_stages(self) -> None:
+        """Testing that stages without effect are left out of the pipeline"""
+        env = self._make_env(make_pipeline_config("downsample, quantize"))
+        self.assertEqual([], env.encoder.stages)
+        obs = env.reset()
+        self.assertIs(env.opt.lidar_scan, obs["lidar"])
+
+    def test_obs_outlive_all_envs_restarting(self) -> None:
+        """Testing that observations outlive the next step when all envs restart"""
+        stages = [
+            ("quantize", "uint8"),
+            ("normalize", "float32"),
+            ("rings", "float32"),
+            ("quantize, stack", "uint8"),
+        ]
+        for (stage_names, dtype), n_envs in itertools.product(stages, [1, 2]):
+            config = make_pipeline_config(stage_names, dtype=dtype, history_len=3)
+            config.set("timesteps", "delta_t", "2.0")
+            config.set("timesteps", "max_episode_steps", "4")
+            vec_env = RobotVecEnv(config, self.args, n_envs=n_envs)
+            vec_env.env.obstacles.add_obstacles(
+                [SingleObstacle(105, 125, 5, 5), SingleObstacle(160, 65, 5, 5)]
+            )
+            vec_env.env.set_robot_position(
+                np.array([(100, 120), (150, 60)][:n_envs]),
+                np.array([(200, 200), (220, 200)][:n_envs]),
+            )
+            rng = np.random.default_rng(seed=0)
+            obs = vec_env.reset()
+            n_restarts = 0
+            for _ in range(12):
+                # PPO stores the previous observations after the next step
+                previous, expected = obs, {key: obs[key].copy() for key in obs}
+                actions = rng.uniform(-1, 1, size=(n_envs, 2)).astype(np.float32)
+                obs, _, dones, _ = vec_env.step(actions)
+                n_restarts += dones.all()
+                for key in ["lidar", "robot"]:
+                    np.testing.assert_array_equal(
+                        expected[key], previous[key], f"{stage_names} {n_envs}"
+                    )
+            self.assertGreater(n_restarts, 0, msg="All envs should restart together")
+
+    def test_rings_stage(self) -> None:
+        """Testing that single and vectorized envs share the rings stage"""
+        config = make_pipeline_config("rings")
+        env = self._make_env(config)
+        obs = env.reset()
+        self.assertEqual((1, 64, 64), obs["lidar"].shape)
+        expected = RingsLidarEncoder().encode_obs({"lidar": env.opt.lidar_scan})
+        np.testing.assert_array_equal(expected["lidar"], obs["lidar"])
+
+        vec_env = RobotVecEnv(config, self.args, n_envs=2)
+        self.assertEqual(env.observation_space, vec_env.observation_space)
+        self.assertEqual((2, 1, 64, 64), vec_env.reset()["lidar"].shape)
+
+    def test_batched_obs(self) -> None:
+        """Testing that batched observations match the single observations"""
+        pipeline = FlatLidarEncoder(1080, 100, "float16")
+        obs = {"lidar": self.scans, "robot": np.zeros((3, 5), np.float32)}
+        lidar = pipeline.encode_obs(obs)["lidar"]
+        self.assertEqual((3, 100), lidar.shape)
+        for scan, encoded in zip(self.scans, lidar):
+            np.testing.assert_array_equal(
+                pipeline.encode_obs({"lidar": scan})["lidar"], encoded
+            )
+
+    def test_invalid_stages(self) -> None:
+        """Testing that unknown or misordered stages are rejected"""
+        with self.assertRaises(ValueError):
+            self._make_env(make_pipeline_config("downsample, crop"))
+        space = FlatLidarEncoder(1080).observation_space
+        with self.assertRaises(ValueError):
+            ObservationPipeline(space, [QuantizeStage("uint8"), RingsStage()])
+
+
+class FrameStackStageTest(unittest.TestCase):
+    """Testing lidar frames stacked as views of per env histories"""
+
+    def setUp(self) -> None:
+        use_temp_tensorboard_dir(self)
+        self.space = FlatLidarEncoder(4).observation_space
+        self.frames = np.arange(80, dtype=np.float32).reshape(20, 4)
+
+    def test_single_env(self) -> None:
+        """Testing that stacked frames are views which outlive the next step"""
+        stage = FrameStackStage(3)
+        pipeline = ObservationPipeline(self.space, [stage])
+        self.assertEqual((3, 4), pipeline.observation_space["lidar"].shape)
+        previous = None
+        for step, frame in enumerate(self.frames):
+            stacked = pipeline.encode_obs({"lidar": frame})["lidar"]
+            self.assertTrue(np.shares_memory(stacked, stage._history))
+            expected = self.frames[[max(step - 2, 0), max(step - 1, 0), step]]
+            np.testing.assert_array_equal(expected, stacked)
+            if previous is not None:
+                np.testing.assert_array_equal(previous[1], previous[0])
+            previous = (stacked, stacked.copy())
+        pipeline.reset()
+        stacked = pipeline.encode_obs({"lidar": self.frames[0]})["lidar"]
+        np.testing.assert_array_equal(np.repeat(self.frames[:1], 3, axis=0), stacked)
+        np.testing.assert_array_equal(previous[1], previous[0])
+
+    def test_batched_envs(self) -> None:
+        """Testing that envs restarting an episode only refill their history"""
+        pipeline = ObservationPipeline(self.space, [FrameStackStage(2)])
+        for frame in self.frames[:6]:
+            stacked = pipeline.encode_obs({"lidar": np.stack([frame, -frame])})["lidar"]
+        self.assertEqual((2, 2, 4), stacked.shape)
+        previous = stacked.copy()
+        restarted = pipeline.restart_obs({"lidar": self.frames[9:10]}, np.array([1]))
+        np.testing.assert_array_equal(previous, stacked)
+        np.testing.assert_array_equal(self.frames[4:6], restarted["lidar"][0])
+        np.testing.assert_array_equal(self.frames[[9, 9]], restarted["lidar"][1])
+
+        # Only the history of the restarted env is filled, the others stay put
+        next_stacked = pipeline.encode_obs({"lidar": self.frames[[6, 10]]})["lidar"]
+        self.assertTrue(np.shares_memory(stacked, next_stacked))
+        np.testing.assert_array_equal(self.frames[5:7], next_stacked[0])
+        np.testing.assert_array_equal(self.frames[[9, 10]], next_stacked[1])
+
+        pipeline.reset([0])
+        stacked = pipeline.encode_obs({"lidar": self.frames[:2]})["lidar"]
+        np.testing.assert_array_equal(self.frames[[0, 0]], stacked[0])
+        np.testing.assert_array_equal(self.frames[[10, 1]], stacked[1])
+
+    def test_ppo_with_stacked_lidar(self) -> None:
+        """Testing that PPO trains on stacked uint8 lidar sectors"""
+        config = make_pipeline_config("downsample, quantize, stack", 135, "uint8", 3)
+        config.set("timesteps", "max_episode_steps", "5")
+        vec_env = RobotVecEnv(config, argparse.Namespace(env_render_path=""), n_envs=2)
+        self.assertEqual((3, 135), vec_env.observation_space["lidar"].shape)
+        model = PPO(
+            "MultiInputPolicy",
+            vec_env,
+            policy_kwargs={
+                "features_extractor_class": Robot1DFeatureExtractor,
+                "features_extractor_kwargs": {
+                    "lidar_scale": vec_env.encoder.lidar_scale
+                },
+            },
+            n_steps=8,
+            batch_size=8,
+            n_epochs=1,
+            device="cpu",
+        )
+        use_typed_rollout_buffer(model)
+        model.learn(total_timesteps=32)
+        lidar_buffer = model.rollout_buffer.observations["lidar"]
+        self.assertEqual(np.uint8, lidar_buffer.dtype)
+        self.assertEqual((3, 135), lidar_buffer.shape[-2:])
+
+
+class NormalizeStageTest(unittest.TestCase):
+    """Testing observations standardized with running statistics"""
+
+    def setUp(self) -> None:
+        use_temp_tensorboard_dir(self)
+        rng = np.random.default_rng(seed=0)
+        self.lidar = rng.uniform(0, 25, size=(4, 8, 16)).astype(np.float32)
+        self.robot = rng.normal(100, 50, size=(4, 8, 5)).astype(np.float32)
+        self.space = FlatLidarEncoder(16).observation_space
+
+    def test_running_statistics(self) -> None:
+        """Testing that batched updates match the statistics of all steps"""
+        stage = NormalizeStage(clip=3.0)
+        pipeline = ObservationPipeline(self.space, [QuantizeStage("uint8"), stage])
+        self.assertEqual(1.0, pipeline.lidar_scale)
+        for lidar, robot in zip(self.lidar, self.robot):
+            obs = pipeline.encode_obs({"lidar": lidar, "robot": robot})
+        quantized = np.floor(self.lidar.reshape(-1, 16) * 255 / 25)
+        np.testing.assert_allclose(quantized.mean(axis=0), stage.mean["lidar"], 1e-5)
+        np.testing.assert_allclose(quantized.var(axis=0), stage.var["lidar"], 1e-4)
+        robot = self.robot.reshape(-1, 5)
+        np.testing.assert_allclose(robot.mean(axis=0), stage.mean["robot"], 1e-5)
+        np.testing.assert_allclose(robot.var(axis=0), stage.var["robot"], 1e-4)
+        self.assertEqual(32, stage.count)
+
+        expected = (self.robot[-1] - robot.mean(axis=0)) / robot.std(axis=0)
+        self.assertEqual(np.float32, obs["robot"].dtype)
+        np.testing.assert_allclose(np.clip(expected, -3, 3), obs["robot"], atol=1e-4)
+        self.assertLessEqual(np.abs(obs["lidar"]).max(), 3.0)
+
+    def test_frozen_statistics(self) -> None:
+        """Testing that frozen statistics are saved and loaded as they are"""
+        space = FlatLidarEncoder(1080).observation_space
+        pipeline = ObservationPipeline(space, [NormalizeStage()])
+        lidar = np.tile(self.lidar, (1, 1, 1080 // 16 + 1))[:, :, :1080]
+        pipeline.encode_obs({"lidar": lidar[0], "robot": self.robot[0]})
+        pipeline.train(False)
+        state = pipeline.state_dict()
+        pipeline.encode_obs({"lidar": lidar[1], "robot": self.robot[1]})
+        for name, value in pipeline.state_dict().items():
+            np.testing.assert_array_equal(state[name], value)
+
+        config = make_pipeline_config("normalize")
+        env = RobotEvalEnv(config, argparse.Namespace(env_render_path=""))
+        self.assertFalse(env.encoder.stages[0].training)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            load_env_obs_stats(env, path.join(tmp_dir, "missing.npz"))
+            self.assertEqual(0.0, env.encoder.stages[0].count)
+            stats_path = path.join(tmp_dir, "model_obs_stats.npz")
+            pipeline.save(stats_path)
+            load_env_obs_stats(env, stats_path)
+        env.reset()
+        for name, value in get_env_obs_stats(env).items():
+            np.testing.assert_array_equal(state[name], value)
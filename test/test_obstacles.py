@@ -1,9 +1,22 @@
 """Tests for obstacles module"""
 import unittest
+import argparse
+from configparser import RawConfigParser
 import numpy as np
 
-from highrl.obstacle.obstacles import Obstacles
+from highrl.configs import robot_config_str
+from highrl.envs.robot_env import RobotEnv
+from highrl.obstacle.obstacles import (
+    BORDER_LAYER,
+    EVAL_LAYER,
+    SESSION_LAYER,
+    LayeredObstacleSet,
+    ObstacleSet,
+    Obstacles,
+)
 from highrl.obstacle.single_obstacle import SingleObstacle
+from highrl.utils import Position
+from test import use_temp_tensorboard_dir
 
 
 class ObstaclesTest(unittest.TestCase):
@@ -58,3 +71,115 @@ class ObstaclesTest(unittest.TestCase):
             value.tolist(),
             msg=f"Expected: {expected}, Found: {value}",
         )
+
+    def test_reentrant_iteration(self) -> None:
+        """Testing that obstacles are iterated again and viewed in the set"""
+        obstacles = ObstacleSet([SingleObstacle(0, 0, 10, 10)])
+        obstacles += SingleObstacle(5, 10, 25, 30)
+        self.assertEqual(2, len(obstacles))
+        for _ in range(2):
+            self.assertEqual(
+                [[0, 0], [5, 10]], [obstacle.get_position() for obstacle in obstacles]
+            )
+        obstacles[1].width = 15
+        self.assertEqual([5, 10, 15, 30], obstacles.boxes[1].tolist())
+        np.testing.assert_array_equal(
+            [[0, 0, 10, 10], [5, 10, 20, 40]], obstacles.get_bounding_boxes()
+        )
+        self.assertEqual(0, len(ObstacleSet()))
+
+    def test_vectorized_geometry(self) -> None:
+        """Testing that vectorized contours and grid points match each obstacle"""
+        rng = np.random.default_rng(seed=0)
+        boxes = rng.integers(0, 20, size=(50, 4))
+        boxes[0, 2:] = 0
+        obstacles = ObstacleSet.from_boxes(boxes)
+        self.assertEqual(np.float32, obstacles.boxes.dtype)
+        flat_contours, contours = obstacles.get_flatten_contours()
+        self.assertEqual((250, 3), flat_contours.shape)
+        self.assertEqual(np.float32, flat_contours.dtype)
+        for idx, obstacle in enumerate(obstacles):
+            points = obstacle.get_points()
+            self.assertListEqual(list(map(list, points)), contours[idx].tolist())
+            expected = [[idx, *point] for point in points + points[:1]]
+            value = flat_contours[5 * idx : 5 * idx + 5].tolist()
+            self.assertListEqual(expected, value)
+        np.testing.assert_array_equal(
+            np.concatenate([obstacle.get_grid_points() for obstacle in obstacles]),
+            obstacles.get_grid_points(),
+        )
+
+
+class LayeredObstacleSetTest(unittest.TestCase):
+    """Testing obstacles split into border, eval and session layers"""
+
+    def setUp(self) -> None:
+        use_temp_tensorboard_dir(self)
+
+    def test_layers(self) -> None:
+        """Testing that layers are ordered and replaced at once"""
+        obstacles = LayeredObstacleSet()
+        obstacles.add_obstacles([SingleObstacle(5, 10, 25, 30)])
+        obstacles.set_layer(BORDER_LAYER, [SingleObstacle(0, 0, 1, 1)] * 4)
+        obstacles.set_layer(EVAL_LAYER, ObstacleSet([SingleObstacle(2, 2, 3, 3)]))
+        self.assertEqual(6, len(obstacles))
+        self.assertEqual([5, 10], obstacles[-1].get_position())
+        self.assertEqual([2, 2], obstacles[4].get_position())
+        np.testing.assert_array_equal(
+            [[0, 0, 1, 1]] * 4 + [[2, 2, 5, 5], [5, 10, 30, 40]],
+            obstacles.get_bounding_boxes(),
+        )
+        for _ in range(3):
+            obstacles.set_layer(SESSION_LAYER, [SingleObstacle(1, 1, 2, 2)] * 2)
+        self.assertEqual(7, len(obstacles))
+        obstacles.clear_layer(EVAL_LAYER)
+        self.assertEqual([1, 1], obstacles[4].get_position())
+        with self.assertRaises(ValueError):
+            obstacles.set_layer("walls", [])
+
+    def test_robot_sessions(self) -> None:
+        """Testing that loading sessions keeps the borders of the robot env"""
+        config = RawConfigParser()
+        config.read_string(robot_config_str)
+        env = RobotEnv(config, argparse.Namespace(env_render_path=""))
+        borders = env.obstacles.get_bounding_boxes()
+        self.assertEqual(4, len(borders))
+        for _ in range(3):
+            session = ObstacleSet([SingleObstacle(40, 190, 20, 20)])
+            env.load_session(session, Position[int](10, 10), Position[int](14, 14))
+            self.assertEqual(5, len(env.obstacles))
+        np.testing.assert_array_equal(borders, env.obstacles.get_bounding_boxes()[:4])
+
+    def test_cached_geometry(self) -> None:
+        """Testing that geometry is only derived again after obstacles change"""
+        obstacles = LayeredObstacleSet([SingleObstacle(5, 10, 25, 30)])
+        version = obstacles.version
+        contours = obstacles.get_flatten_contours()
+        hits, misses = obstacles.cache_hits, obstacles.cache_misses
+        self.assertIs(contours, obstacles.get_flatten_contours())
+        self.assertEqual(hits + 1, obstacles.cache_hits)
+        self.assertEqual(misses, obstacles.cache_misses)
+        obstacles.set_layer(SESSION_LAYER, [SingleObstacle(5, 10, 25, 30)])
+        self.assertGreater(obstacles.version, version)
+        self.assertIsNot(contours, obstacles.get_flatten_contours())
+        obstacles[0].px = 0
+        obstacles.touch()
+        self.assertEqual([0, 10, 25, 40], obstacles.get_bounding_boxes()[0].tolist())
+
+        config = RawConfigParser()
+        config.read_string(robot_config_str)
+        config.set("lidar", "lidar_backend", "grid")
+        env = RobotEnv(config, argparse.Namespace(env_render_path=""))
+        session = ObstacleSet([SingleObstacle(40, 190, 20, 20)])
+        env.load_session(session, Position[int](10, 10), Position[int](14, 14))
+        env.reset()
+        misses = env.obstacles.cache_misses
+        grid = env.lidar.grid
+        for _ in range(3):
+            env.done = True
+            env.reset()
+        self.assertEqual(misses, env.obstacles.cache_misses)
+        self.assertIs(grid, env.lidar.grid)
+        env.load_session(session, Position[int](10, 10), Position[int](14, 14))
+        env.reset()
+        self.assertIsNot(grid, env.lidar.grid)
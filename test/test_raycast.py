@@ -0,0 +1,156 @@
+"""Tests for the LiDAR ray casting backends"""
+import unittest
+import tempfile
+from os import listdir
+from unittest import mock
+import numpy as np
+from CMap2D import render_contours_in_lidar  # pylint: disable=no-name-in-module
+
+from highrl.lidar_setup.grid import OccupancyGrid, cast_rays_grid
+from highrl.lidar_setup import raycast
+from highrl.lidar_setup.lookup import LidarLookupTable
+from highrl.lidar_setup.raycast import (
+    cast_rays_aabb,
+    cast_rays_openmp,
+    obstacles_to_boxes,
+)
+from highrl.obstacle.obstacles import Obstacles
+from highrl.obstacle.single_obstacle import SingleObstacle
+
+
+class RayCastTest(unittest.TestCase):
+    """Testing ray casting against CMap2D"""
+
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(seed=0)
+        self.obstacles = [
+            SingleObstacle(*self.rng.integers(0, 100, size=2).tolist(), 8, 12)
+            for _ in range(15)
+        ]
+        self.obstacles += [
+            SingleObstacle(-1, 0, 1, 100),
+            SingleObstacle(0, -1, 100, 1),
+            SingleObstacle(100, 0, 1, 100),
+            SingleObstacle(0, 100, 100, 1),
+        ]
+        self.angles = np.linspace(0, 2 * np.pi, 360, endpoint=False)
+
+    def _cmap2d_scans(self, poses: np.ndarray) -> np.ndarray:
+        flat_contours, _ = Obstacles(list(self.obstacles)).get_flatten_contours()
+        scans = np.full((len(poses), len(self.angles)), 25.0, dtype=np.float32)
+        for scan, pose in zip(scans, poses):
+            render_contours_in_lidar(
+                scan, self.angles + pose[2], flat_contours, pose[:2]
+            )
+        return scans
+
+    def test_aabb_matches_cmap2d(self) -> None:
+        """Testing that ray/box intersections match CMap2D polygons rendering"""
+        poses = np.column_stack(
+            [
+                self.rng.uniform(0, 100, size=(40, 2)),
+                self.rng.uniform(0, 2 * np.pi, size=40),
+            ]
+        ).astype(np.float32)
+        # One robot inside an obstacle sees the obstacle boundary
+        obstacle = self.obstacles[0]
+        poses[0, :2] = [obstacle.px + 2, obstacle.py + 3]
+
+        scans = cast_rays_aabb(poses, self.angles, obstacles_to_boxes(self.obstacles))
+        np.testing.assert_allclose(self._cmap2d_scans(poses), scans, atol=1e-4)
+        self.assertLess(scans[0].max(), 12)
+
+    @unittest.skipUnless(raycast.cast_rays_batch, "lidar2d_batch is not built")
+    def test_openmp_matches_aabb(self) -> None:
+        """Testing that the OpenMP kernel fills the output like the NumPy caster"""
+        poses = np.column_stack(
+            [
+                self.rng.uniform(-10, 110, size=(64, 2)),
+                self.rng.uniform(0, 2 * np.pi, size=64),
+            ]
+        ).astype(np.float32)
+        boxes = obstacles_to_boxes(self.obstacles)
+        out = np.zeros((64, len(self.angles)), dtype=np.float32)
+
+        scans = cast_rays_openmp(poses, self.angles, boxes, out=out)
+        self.assertIs(out, scans)
+        np.testing.assert_allclose(
+            cast_rays_aabb(poses, self.angles, boxes), scans, atol=1e-4
+        )
+        with self.assertRaises(ValueError):
+            cast_rays_openmp(poses, self.angles, boxes, out=out[:, :10])
+
+    def test_grid_matches_cmap2d(self) -> None:
+        """Testing that grid ray marching matches CMap2D outside obstacles"""
+        boxes = obstacles_to_boxes(self.obstacles)
+        positions = self.rng.uniform(0, 100, size=(200, 2))
+        is_free = np.all(
+            (positions[:, None, 0] < boxes[None, :, 0])
+            | (positions[:, None, 0] > boxes[None, :, 2])
+            | (positions[:, None, 1] < boxes[None, :, 1])
+            | (positions[:, None, 1] > boxes[None, :, 3]),
+            axis=1,
+        )
+        positions = positions[is_free][:40]
+        poses = np.column_stack(
+            [positions, self.rng.uniform(0, 2 * np.pi, size=len(positions))]
+        ).astype(np.float32)
+
+        scans = cast_rays_grid(poses, self.angles, OccupancyGrid(boxes))
+        np.testing.assert_allclose(self._cmap2d_scans(poses), scans, atol=1e-4)
+
+    def test_grid_occupancy(self) -> None:
+        """Testing that the cells overlapping a box, and only them, are occupied"""
+        boxes = self.rng.uniform(-20, 20, size=(30, 4))
+        boxes[:, 2:] = boxes[:, :2] + self.rng.uniform(0, 6, size=(30, 2))
+        boxes[0, 2:] = boxes[0, :2]
+        grid = OccupancyGrid(boxes, 0.5)
+        expected = np.zeros(grid.shape, dtype=bool)
+        for box in boxes:
+            x_min, y_min = grid.to_cells(box[:2])
+            x_max, y_max = np.ceil((box[2:] - grid.origin) / 0.5).astype(int)
+            expected[x_min : max(x_max, x_min + 1), y_min : max(y_max, y_min + 1)] = 1
+        np.testing.assert_array_equal(expected, grid.occupancy)
+        self.assertEqual(0, OccupancyGrid(np.zeros((0, 4))).occupancy.size)
+
+    def test_lookup_table(self) -> None:
+        """Testing lookup table scans on and between its positions"""
+        boxes = obstacles_to_boxes(self.obstacles)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            table = LidarLookupTable.load_or_build(
+                boxes, 100, 100, 2.0, len(self.angles), cache_dir=cache_dir
+            )
+            self.assertEqual(["lidar_lut_" + table.key + ".npy"], listdir(cache_dir))
+            cached_table = LidarLookupTable.load_or_build(
+                boxes, 100, 100, 2.0, len(self.angles), cache_dir=cache_dir
+            )
+        self.assertEqual(table.key, cached_table.key)
+        self.assertTrue(np.array_equal(table.scans, cached_table.scans))
+
+        # Tables failing to save leave nothing in the cache
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with mock.patch.object(np, "save", side_effect=OSError("disk full")):
+                with self.assertRaises(OSError):
+                    LidarLookupTable.load_or_build(
+                        boxes, 100, 100, 2.0, len(self.angles), cache_dir=cache_dir
+                    )
+            self.assertEqual([], listdir(cache_dir))
+
+        # Headings multiple of the rays increment only shift the rays
+        heading = 7 * 2 * np.pi / len(self.angles)
+        poses = np.array([[20, 30, heading], [51, 47, 0]], dtype=np.float32)
+        scans = table.scan(poses, self.angles)
+        expected = cast_rays_aabb(poses, self.angles, boxes)
+        np.testing.assert_allclose(expected[0], scans[0], atol=1e-3)
+        # Between positions scans are interpolated
+        self.assertLess(np.median(np.abs(expected[1] - scans[1])), 0.5)
+
+    def test_no_obstacles(self) -> None:
+        """Testing that rays hitting nothing return the max range"""
+        scans = cast_rays_aabb(
+            np.zeros((2, 3), dtype=np.float32),
+            self.angles,
+            np.zeros((0, 4), dtype=np.float32),
+            max_range=10.0,
+        )
+        self.assertTrue(np.all(scans == 10.0))
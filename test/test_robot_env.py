@@ -0,0 +1,97 @@
+"""Tests for the robot environment"""
+import unittest
+import argparse
+import tracemalloc
+import numpy as np
+
+from highrl.envs.robot_env import RobotEnv
+from highrl.obstacle.single_obstacle import SingleObstacle
+from highrl.utils import Position
+from test import make_robot_config, use_temp_tensorboard_dir
+
+
+class RobotEnvObsBuffersTest(unittest.TestCase):
+    """Testing observations written into preallocated buffers"""
+
+    def setUp(self) -> None:
+        use_temp_tensorboard_dir(self)
+
+    def _make_env(self, reuse_obs_buffers: bool) -> RobotEnv:
+        env = RobotEnv(
+            make_robot_config(
+                timesteps={"max_episode_steps": 1000000},
+                env={"reuse_obs_buffers": reuse_obs_buffers},
+            ),
+            argparse.Namespace(env_render_path=""),
+        )
+        env.obstacles.add_obstacles([SingleObstacle(150, 150, 20, 20)])
+        env.set_robot_position(Position[float](100, 100), Position[float](200, 200))
+        return env
+
+    def _steady_step(self, env: RobotEnv, n_steps: int) -> list:
+        """Take small steps back and forth so the robot never ends its episode"""
+        observations = []
+        for step in range(n_steps):
+            action = np.array([0.1, 0.0] if step % 2 else [-0.1, 0.0], dtype=np.float32)
+            obs, _, _, _ = env.step(action)
+            observations.append(obs)
+        return observations
+
+    def test_matches_allocating_obs(self) -> None:
+        """Testing that buffered observations match newly allocated ones"""
+        env = self._make_env(reuse_obs_buffers=True)
+        expected_env = self._make_env(reuse_obs_buffers=False)
+        rng = np.random.default_rng(seed=3)
+        obs = env.reset()
+        expected_obs = expected_env.reset()
+        for _ in range(20):
+            self.assertTrue(np.array_equal(expected_obs["lidar"], obs["lidar"]))
+            np.testing.assert_allclose(expected_obs["robot"], obs["robot"], rtol=1e-6)
+            action = rng.uniform(-0.2, 0.2, size=(2,)).astype(np.float32)
+            obs, _, _, _ = env.step(action)
+            expected_obs, _, _, _ = expected_env.step(action)
+
+    def test_buffers_are_used_in_turn(self) -> None:
+        """Testing that observations alternate between two buffers"""
+        env = self._make_env(reuse_obs_buffers=True)
+        first_obs = env.reset()
+        second_obs, third_obs = self._steady_step(env, 2)
+        self.assertIsNot(first_obs["lidar"], second_obs["lidar"])
+        self.assertIs(first_obs["lidar"], third_obs["lidar"])
+        self.assertIs(first_obs["robot"], third_obs["robot"])
+
+    def test_observation_stages_override(self) -> None:
+        """Testing that overridden observation stages leave the config as is"""
+        config = make_robot_config()
+        config_stages = config.get("lidar", "observation_stages")
+        env = RobotEnv(
+            config, argparse.Namespace(env_render_path=""), observation_stages=[]
+        )
+        self.assertEqual([], env.cfg.observation_stages)
+        self.assertEqual(config.get("lidar", "observation_stages"), config_stages)
+        self.assertEqual(env.lidar.observation_space, env.observation_space["lidar"])
+
+    def test_steady_step_does_not_allocate(self) -> None:
+        """Testing that steady state steps allocate no observation arrays"""
+        for reuse_obs_buffers in [False, True]:
+            env = self._make_env(reuse_obs_buffers)
+            env.reset()
+            self._steady_step(env, 4)
+
+            peaks = []
+            for _ in range(10):
+                tracemalloc.start()
+                try:
+                    self._steady_step(env, 1)
+                    peaks.append(tracemalloc.get_traced_memory()[1])
+                finally:
+                    tracemalloc.stop()
+            # CMap2D keeps one scratch row of the scan while rendering, and the
+            # step itself makes a few small Python objects
+            scan_bytes = env.lidar.n_angles * np.dtype(np.float32).itemsize
+            max_peak = scan_bytes + 2048
+            if reuse_obs_buffers:
+                self.assertLessEqual(max(peaks), max_peak)
+            else:
+                # Sanity check that the allocating path is measured
+                self.assertGreater(min(peaks), max_peak)
@@ -0,0 +1,111 @@
+"""Tests for the spatial hash index of the obstacles"""
+import unittest
+import argparse
+from configparser import RawConfigParser
+import numpy as np
+
+from highrl.configs import robot_config_str
+from highrl.envs.robot_env import RobotEnv
+from highrl.obstacle.obstacles import EVAL_LAYER, SESSION_LAYER, LayeredObstacleSet
+from highrl.obstacle.single_obstacle import SingleObstacle
+from highrl.obstacle.spatial_index import SpatialHashIndex
+from highrl.utils import Position
+from test import use_temp_tensorboard_dir
+
+
+def brute_force_pairs(queries: np.ndarray, boxes: np.ndarray) -> list:
+    """Compute the (query id, box id) pairs of overlapping closed boxes"""
+    is_overlap = np.all(
+        (queries[:, None, :2] <= boxes[None, :, 2:])
+        & (boxes[None, :, :2] <= queries[:, None, 2:]),
+        axis=2,
+    )
+    return np.argwhere(is_overlap).tolist()
+
+
+class SpatialHashIndexTest(unittest.TestCase):
+    """Testing point, box and circle queries against all the boxes"""
+
+    def setUp(self) -> None:
+        use_temp_tensorboard_dir(self)
+        rng = np.random.default_rng(seed=0)
+        corners = rng.uniform(-10, 100, size=(200, 2))
+        self.boxes = np.concatenate(
+            [corners, corners + rng.uniform(0, 30, size=(200, 2))], axis=1
+        )
+        self.boxes[0, 2:] = self.boxes[0, :2]
+        self.points = rng.uniform(-20, 130, size=(300, 2))
+        self.points[0] = self.boxes[1, 2:]
+
+    def test_incremental_boxes(self) -> None:
+        """Testing that truncated and added boxes answer as a new index"""
+        index = SpatialHashIndex(cell_size=7.0)
+        index.add_boxes(self.boxes[:150])
+        index.truncate(100)
+        index.add_boxes(self.boxes[100:])
+        self.assertEqual(200, len(index))
+        queries = np.concatenate([self.points, self.points], axis=1)
+        expected = brute_force_pairs(queries, self.boxes)
+        pairs = np.stack(index.query_points(self.points), axis=1)
+        self.assertListEqual(expected, pairs.tolist())
+        for idx, point in enumerate(self.points):
+            overlaps = [box_id for query_id, box_id in expected if query_id == idx]
+            self.assertListEqual(overlaps, index.query_point(point))
+
+    def test_box_and_circle_queries(self) -> None:
+        """Testing that single and bulk queries find the same boxes"""
+        index = SpatialHashIndex(cell_size=5.0)
+        index.add_boxes(self.boxes)
+        queries = np.concatenate([self.points, self.points + 12.0], axis=1)
+        expected = brute_force_pairs(queries, self.boxes)
+        self.assertListEqual(expected, np.stack(index.query_boxes(queries), 1).tolist())
+        for idx, query in enumerate(queries):
+            overlaps = [box_id for query_id, box_id in expected if query_id == idx]
+            self.assertListEqual(overlaps, index.query_box(query))
+
+        deltas = np.maximum(
+            np.maximum(self.boxes[None, :, :2] - self.points[:, None], 0),
+            self.points[:, None] - self.boxes[None, :, 2:],
+        )
+        expected = np.argwhere(np.sum(deltas**2, axis=2) <= 36.0).tolist()
+        self.assertListEqual(
+            expected, np.stack(index.query_circles(self.points, 6.0), 1).tolist()
+        )
+        for idx, point in enumerate(self.points):
+            overlaps = [box_id for query_id, box_id in expected if query_id == idx]
+            self.assertListEqual(overlaps, index.query_circle(point, 6.0))
+        with self.assertRaises(ValueError):
+            SpatialHashIndex(cell_size=0.0)
+
+    def test_obstacles_index(self) -> None:
+        """Testing that the obstacles index follows the changes of the layers"""
+        obstacles = LayeredObstacleSet([SingleObstacle(0, 0, 10, 10)])
+        index = obstacles.spatial_index()
+        obstacles.set_layer(EVAL_LAYER, [SingleObstacle(20, 20, 5, 5)])
+        obstacles.add_obstacles([SingleObstacle(5, 5, 10, 10)])
+        self.assertIs(index, obstacles.spatial_index())
+        self.assertListEqual([1, 2], index.query_point([10, 10]))
+        self.assertListEqual([0], index.query_point([22, 22]))
+        obstacles.set_layer(SESSION_LAYER, [SingleObstacle(21, 21, 1, 1)])
+        self.assertIs(index, obstacles.spatial_index())
+        self.assertListEqual([], index.query_point([10, 10]))
+        self.assertListEqual([0, 1], index.query_point([22, 22]))
+        obstacles.layer(EVAL_LAYER).add_obstacles([SingleObstacle(9, 9, 1, 1)])
+        self.assertIsNot(index, obstacles.spatial_index())
+        self.assertListEqual([1], obstacles.spatial_index().query_point([10, 10]))
+
+    def test_robot_collisions(self) -> None:
+        """Testing that indexed collisions match the collisions of all obstacles"""
+        config = RawConfigParser()
+        config.read_string(robot_config_str)
+        env = RobotEnv(config, argparse.Namespace(env_render_path=""))
+        env.obstacles.add_obstacles(
+            [SingleObstacle(40.5, 190, 20, 20), SingleObstacle(100, 100, 30, 10.7)]
+        )
+        rng = np.random.default_rng(seed=1)
+        for pos in rng.uniform(-5, 260, size=(300, 2)):
+            env.robot.set_position(Position[float](*pos))
+            expected = any(
+                env.robot.is_overlapped(obstacle=obstacle) for obstacle in env.obstacles
+            )
+            self.assertEqual(expected, env.detect_collison())
@@ -0,0 +1,147 @@
+"""Tests for the shared memory process pool of robot environments"""
+import unittest
+import tempfile
+from os import path
+import argparse
+from functools import partial
+import numpy as np
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+from highrl.envs.observation_pipeline import (
+    get_env_obs_stats,
+    load_env_obs_stats,
+    save_env_obs_stats,
+)
+from highrl.envs.robot_env import RobotEnv
+from highrl.envs.subproc_env import SharedMemoryVecEnv
+from highrl.obstacle.obstacles import Obstacles
+from highrl.obstacle.single_obstacle import SingleObstacle
+from highrl.utils import Position
+from test import make_robot_config, use_temp_tensorboard_dir
+
+
+class SharedMemoryVecEnvTest(unittest.TestCase):
+    """Testing shared memory process pool of robot environments"""
+
+    obstacles = [(40, 190, 20, 20), (100, 100, 30, 10)]
+
+    def setUp(self) -> None:
+        use_temp_tensorboard_dir(self)
+        self.config = make_robot_config(
+            timesteps={"delta_t": 2.0, "max_episode_steps": 30}
+        )
+        self.args = argparse.Namespace(env_render_path="")
+        self.n_envs = 2
+
+    def _load_session(self, vec_env) -> None:
+        obstacles = Obstacles(
+            [SingleObstacle(*obstacle) for obstacle in self.obstacles]
+        )
+        vec_env.env_method(
+            "load_session", obstacles, Position[int](10, 10), Position[int](14, 14)
+        )
+
+    def test_matches_dummy_vec_env(self) -> None:
+        """Testing that the process pool matches SB3 DummyVecEnv"""
+        env_fn = partial(RobotEnv, config=self.config, args=self.args)
+        pool_env = SharedMemoryVecEnv([env_fn] * self.n_envs, start_method="fork")
+        self.addCleanup(pool_env.close)
+        dummy_env = DummyVecEnv([env_fn] * self.n_envs)
+        self._load_session(pool_env)
+        self._load_session(dummy_env)
+
+        rng = np.random.default_rng(seed=2)
+        obs = pool_env.reset()
+        expected_obs = dummy_env.reset()
+        n_dones = 0
+        for _ in range(40):
+            for key in ["lidar", "robot"]:
+                self.assertTrue(np.array_equal(expected_obs[key], obs[key]))
+            actions = rng.uniform(-1, 1, size=(self.n_envs, 2)).astype(np.float32)
+            obs, rewards, dones, infos = pool_env.step(actions)
+            (
+                expected_obs,
+                expected_rewards,
+                expected_dones,
+                expected_infos,
+            ) = dummy_env.step(actions)
+            self.assertTrue(np.array_equal(expected_rewards, rewards))
+            self.assertTrue(np.array_equal(expected_dones, dones))
+            for env_idx in np.flatnonzero(dones):
+                n_dones += 1
+                self.assertTrue(
+                    np.array_equal(
+                        expected_infos[env_idx]["terminal_observation"]["lidar"],
+                        infos[env_idx]["terminal_observation"]["lidar"],
+                    )
+                )
+        self.assertGreater(n_dones, 0, msg="Episodes should end during the test")
+        self.assertListEqual(
+            dummy_env.get_attr("results"), pool_env.get_attr("results")
+        )
+        self.assertListEqual([40, 40], pool_env.get_attr("total_steps"))
+
+    def test_observations_use_shared_buffers(self) -> None:
+        """Testing that observations are written into the same two shared buffers"""
+        env_fn = partial(RobotEnv, config=self.config, args=self.args)
+        pool_env = SharedMemoryVecEnv([env_fn] * self.n_envs, start_method="fork")
+        self.addCleanup(pool_env.close)
+        self._load_session(pool_env)
+        first_obs = pool_env.reset()
+        actions = np.zeros((self.n_envs, 2), dtype=np.float32)
+        second_obs, _, _, _ = pool_env.step(actions)
+        third_obs, _, _, _ = pool_env.step(actions)
+        self.assertFalse(np.shares_memory(first_obs["lidar"], second_obs["lidar"]))
+        self.assertTrue(np.shares_memory(first_obs["lidar"], third_obs["lidar"]))
+
+    def test_worker_exceptions_are_raised(self) -> None:
+        """Testing that exceptions of the workers are raised by the pool"""
+        config = make_robot_config(lidar={"observation_stages": "rings"})
+        env_fn = partial(RobotEnv, config=config, args=self.args)
+        pool_env = SharedMemoryVecEnv([env_fn] * self.n_envs, start_method="fork")
+        self.addCleanup(pool_env.close)
+        with self.assertRaises(AttributeError) as context:
+            pool_env.get_attr("missing", indices=1)
+        self.assertIn("missing", str(context.exception.__cause__))
+        # Rings definitions hold closures, which cannot be pickled
+        with self.assertRaises(Exception):
+            pool_env.get_attr("encoder")
+        self.assertListEqual([0, 0], pool_env.get_attr("total_steps"))
+
+    def test_normalized_workers_are_rejected(self) -> None:
+        """Testing that the statistics of the first worker only are not returned"""
+        config = make_robot_config(lidar={"observation_stages": "normalize"})
+        env_fn = partial(RobotEnv, config=config, args=self.args)
+        pool_env = SharedMemoryVecEnv([env_fn] * self.n_envs, start_method="fork")
+        self.addCleanup(pool_env.close)
+        with self.assertRaises(ValueError):
+            get_env_obs_stats(pool_env)
+
+        pool_env = SharedMemoryVecEnv([env_fn], start_method="fork")
+        self.addCleanup(pool_env.close)
+        self.assertIn("stage0_count", get_env_obs_stats(pool_env))
+
+    def test_rings_workers_statistics(self) -> None:
+        """Testing that statistics of rings workers go through the pipes"""
+        config = make_robot_config(lidar={"observation_stages": "rings"})
+        env_fn = partial(RobotEnv, config=config, args=self.args)
+        pool_env = SharedMemoryVecEnv([env_fn] * self.n_envs, start_method="fork")
+        self.addCleanup(pool_env.close)
+        self._load_session(pool_env)
+        pool_env.reset()
+        self.assertDictEqual({}, get_env_obs_stats(pool_env))
+
+        config = make_robot_config(lidar={"observation_stages": "rings, normalize"})
+        env_fn = partial(RobotEnv, config=config, args=self.args)
+        pool_env = SharedMemoryVecEnv([env_fn], start_method="fork")
+        self.addCleanup(pool_env.close)
+        self._load_session(pool_env)
+        pool_env.reset()
+        state = get_env_obs_stats(pool_env)
+        self.assertEqual(1.0, state["stage1_count"])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            stats_path = path.join(tmp_dir, "model_obs_stats.npz")
+            save_env_obs_stats(pool_env, stats_path)
+            pool_env.reset()
+            load_env_obs_stats(pool_env, stats_path)
+        self.assertEqual(1.0, get_env_obs_stats(pool_env)["stage1_count"])
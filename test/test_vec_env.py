@@ -0,0 +1,144 @@
+"""Tests for the vectorized robot environment"""
+import itertools
+import unittest
+import argparse
+import numpy as np
+from stable_baselines3.common.vec_env import DummyVecEnv
+from stable_baselines3.ppo.ppo import PPO
+
+from highrl.envs.robot_env import RobotEnv
+from highrl.envs.vec_env import RobotVecEnv
+from highrl.obstacle.single_obstacle import SingleObstacle
+from highrl.policy.feature_extractors import Robot1DFeatureExtractor
+from highrl.utils import Position
+from test import make_robot_config, use_temp_tensorboard_dir
+
+
+class RobotVecEnvTest(unittest.TestCase):
+    """Testing vectorized robot environment"""
+
+    robot_positions = [(10, 10), (100, 120), (30, 200)]
+    goal_positions = [(14, 14), (200, 200), (30, 220)]
+    obstacles = [(40, 190, 20, 20), (100, 100, 30, 10)]
+
+    def setUp(self) -> None:
+        use_temp_tensorboard_dir(self)
+        self.config = make_robot_config(
+            timesteps={"delta_t": 2.0, "max_episode_steps": 30}
+        )
+        self.args = argparse.Namespace(env_render_path="")
+
+    def _make_vec_env(self, n_envs: int = 3) -> RobotVecEnv:
+        vec_env = RobotVecEnv(self.config, self.args, n_envs=n_envs)
+        vec_env.env.obstacles.add_obstacles(
+            [SingleObstacle(*obstacle) for obstacle in self.obstacles]
+        )
+        vec_env.env.set_robot_position(
+            np.array(self.robot_positions[:n_envs]),
+            np.array(self.goal_positions[:n_envs]),
+        )
+        return vec_env
+
+    def _make_scalar_env(self, env_idx: int) -> RobotEnv:
+        env = RobotEnv(self.config, self.args)
+        env.obstacles.add_obstacles(
+            [SingleObstacle(*obstacle) for obstacle in self.obstacles]
+        )
+        env.set_robot_position(
+            Position[int](*self.robot_positions[env_idx]),
+            Position[int](*self.goal_positions[env_idx]),
+        )
+        return env
+
+    def test_matches_dummy_vec_env(self) -> None:
+        """Testing that the vectorized env matches SB3 DummyVecEnv over scalar envs"""
+        for lidar_dtype, n_envs in itertools.product(["float32", "uint8"], [1, 3]):
+            with self.subTest(lidar_dtype=lidar_dtype, n_envs=n_envs):
+                self.config.set("lidar", "lidar_dtype", lidar_dtype)
+                self._check_matches_dummy_vec_env(n_envs)
+
+    def _check_matches_dummy_vec_env(self, n_envs: int) -> None:
+        vec_env = self._make_vec_env(n_envs)
+        dummy_env = DummyVecEnv(
+            [
+                lambda idx=idx: self._make_scalar_env(idx)  # type: ignore
+                for idx in range(n_envs)
+            ]
+        )
+        rng = np.random.default_rng(seed=1)
+        obs = vec_env.reset()
+        expected_obs = dummy_env.reset()
+        n_dones = 0
+        for _ in range(70):
+            for key in ["lidar", "robot"]:
+                self.assertTrue(np.array_equal(expected_obs[key], obs[key]))
+            actions = rng.uniform(-1, 1, size=(vec_env.num_envs, 2)).astype(np.float32)
+            obs, rewards, dones, infos = vec_env.step(actions)
+            (
+                expected_obs,
+                expected_rewards,
+                expected_dones,
+                expected_infos,
+            ) = dummy_env.step(actions)
+            self.assertTrue(np.array_equal(expected_rewards, rewards))
+            self.assertTrue(np.array_equal(expected_dones, dones))
+            for env_idx in np.flatnonzero(dones):
+                n_dones += 1
+                terminal_obs = infos[env_idx]["terminal_observation"]
+                expected_terminal_obs = expected_infos[env_idx]["terminal_observation"]
+                self.assertTrue(
+                    np.array_equal(
+                        expected_terminal_obs["lidar"], terminal_obs["lidar"]
+                    )
+                )
+                # Scalar envs keep float64 robot states, vectorized envs float32
+                np.testing.assert_allclose(
+                    expected_terminal_obs["robot"], terminal_obs["robot"], rtol=1e-6
+                )
+        self.assertGreater(n_dones, 0, msg="Episodes should end during the test")
+
+    def test_observations_use_preallocated_buffers(self) -> None:
+        """Testing that observations are written into the same two buffers"""
+        vec_env = self._make_vec_env()
+        first_obs = vec_env.reset()
+        actions = np.zeros((vec_env.num_envs, 2), dtype=np.float32)
+        second_obs, _, _, _ = vec_env.step(actions)
+        third_obs, _, _, _ = vec_env.step(actions)
+        self.assertIsNot(first_obs["lidar"], second_obs["lidar"])
+        self.assertIs(first_obs["lidar"], third_obs["lidar"])
+
+    def test_attributes_access(self) -> None:
+        """Testing attributes and methods access through the SB3 interface"""
+        vec_env = self._make_vec_env()
+        vec_env.reset()
+        steps = vec_env.get_attr("episode_steps", indices=[0, 2])
+        self.assertListEqual([0, 0], steps)
+        opts = vec_env.get_attr("opt")
+        self.assertIs(opts[0], opts[1])
+        vec_env.env_method(
+            "set_robot_position",
+            np.array([50, 50]),
+            np.array([60, 60]),
+            indices=[1],
+        )
+        self.assertListEqual(
+            [50.0, 50.0], vec_env.get_attr("pos", indices=1)[0].tolist()
+        )
+        self.assertListEqual(
+            [10.0, 10.0], vec_env.get_attr("pos", indices=0)[0].tolist()
+        )
+
+    def test_ppo_rollout(self) -> None:
+        """Testing that PPO can collect rollouts and train on the vectorized env"""
+        vec_env = self._make_vec_env()
+        model = PPO(
+            "MultiInputPolicy",
+            vec_env,
+            policy_kwargs={"features_extractor_class": Robot1DFeatureExtractor},
+            n_steps=8,
+            batch_size=12,
+            n_epochs=1,
+            device="cpu",
+        )
+        model.learn(total_timesteps=48)
+        self.assertGreaterEqual(model.num_timesteps, 48)